@@ -16,6 +16,7 @@ def bulk_excel_insert(data):
         "user_id": data["user_id"],
         "account_id": data["account_id"],
         "board_id": data.get("board_id"),
+        "idempotency_key": data.get("idempotency_key"),
         "task_type": "bulk_excel_insert",
         "callback_url": _callback_url("/internal/jobs/bulk_excel_insert"),
         "max_retries": 3,
@@ -30,6 +31,7 @@ def delayed_archive(data):
         "user_id": data["user_id"],
         "account_id": data["account_id"],
         "board_id": data.get("board_id"),
+        "idempotency_key": data.get("idempotency_key"),
         "task_type": "delayed_archive",
         "callback_url": _callback_url("/internal/jobs/delayed_archive"),
         "max_retries": 2,
@@ -57,6 +59,7 @@ def scheduled_cron_task(data):
         "user_id": data["user_id"],
         "account_id": data["account_id"],
         "board_id": data.get("board_id"),
+        "idempotency_key": data.get("idempotency_key"),
         "task_type": "scheduled_cron_task",
         "callback_url": _callback_url("/internal/jobs/scheduled_cron_task"),
         "max_retries": 2,
@@ -74,6 +77,7 @@ def polling_task(data):
         "user_id": data["user_id"],
         "account_id": data["account_id"],
         "board_id": data.get("board_id"),
+        "idempotency_key": data.get("idempotency_key"),
         "task_type": "polling_task",
         "callback_url": _callback_url("/internal/jobs/polling_task"),
         "max_retries": 2,
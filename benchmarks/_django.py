@@ -0,0 +1,24 @@
+"""
+Bootstraps Django for offline benchmarks: throwaway SQLite file, in-memory broker. Redis is
+REDIS_HOST; callers switch off the Redis-backed features or swap in fakeredis themselves.
+"""
+import os
+import tempfile
+
+
+def setup():
+    tmp_dir = tempfile.mkdtemp(prefix="jobserver-bench-")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    os.environ["SQLITE_PATH"] = os.path.join(tmp_dir, "db.sqlite3")
+    os.environ["CELERY_BROKER_URL"] = "memory://"
+    os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+    os.environ["ALLOWED_HOSTS"] = "testserver,localhost"
+    os.environ["INTERNAL_API_SECRET"] = ""
+    os.environ.setdefault("NODE_SERVER_URL", "http://127.0.0.1:3000")
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0, interactive=False)
+    return tmp_dir
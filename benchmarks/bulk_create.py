@@ -0,0 +1,67 @@
+"""
+Throughput of POST /api/jobs/bulk versus the same number of POST /api/jobs/create calls.
+
+    python -m benchmarks.bulk_create --jobs 2000 --users 50
+
+Measures the API and the database only: the Redis-backed features are switched off.
+"""
+import argparse
+import os
+import time
+
+from benchmarks._django import setup
+
+
+def _items(n, users, prefix):
+    return [
+        {
+            "app_name": "app_a",
+            "user_id": f"{prefix}-user-{i % users}",
+            "account_id": f"{prefix}-acc-{i % users}",
+            "board_id": f"board-{i}",
+            "task_type": "bulk_excel_insert",
+            "schedule": {"type": "immediate"},
+            "data": {"row": i},
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["PUBLISH_JOB_UPDATES"] = "0"
+    os.environ["FAIR_DISPATCH_ENABLED"] = "0"
+    os.environ["DELAYED_STORE_ENABLED"] = "0"
+    os.environ["STATUS_CACHE_ENABLED"] = "0"
+    setup()
+    from django.test import Client
+    from common.models import Job
+
+    client = Client()
+
+    single_items = _items(args.jobs, args.users, "single")
+    start = time.perf_counter()
+    for item in single_items:
+        resp = client.post("/api/jobs/create", item, content_type="application/json")
+        assert resp.status_code == 201, resp.content
+    single_elapsed = time.perf_counter() - start
+
+    bulk_items = _items(args.jobs, args.users, "bulk")
+    start = time.perf_counter()
+    resp = client.post("/api/jobs/bulk", bulk_items, content_type="application/json")
+    bulk_elapsed = time.perf_counter() - start
+    assert resp.status_code == 201 and resp.json()["failed"] == 0, resp.content
+
+    assert Job.objects.count() == 2 * args.jobs
+    print(f"jobs per run:      {args.jobs}")
+    print(f"single creates:    {single_elapsed:8.3f}s  {args.jobs / single_elapsed:10.1f} jobs/s")
+    print(f"bulk create:       {bulk_elapsed:8.3f}s  {args.jobs / bulk_elapsed:10.1f} jobs/s")
+    print(f"speedup:           {single_elapsed / bulk_elapsed:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
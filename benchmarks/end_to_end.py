@@ -0,0 +1,440 @@
+"""
+End-to-end throughput and latency: create -> run_job -> callback, per schedule type.
+
+Runs offline: throwaway SQLite, fakeredis (or REDIS_HOST with --redis), a local callback
+stub, and an in-process stand-in for the broker. run_job messages (first runs, retries,
+polling cycles, cron runs) go into a heap ordered by their countdown/eta, scaled by
+--time-scale, and --workers threads run them with run_job.apply(). Phases:
+
+  create     POST /api/jobs/create for --jobs jobs of each schedule type, while workers run
+  execute    create-to-first-callback latency and DB queries per run, per schedule type
+  cron_tick  enqueue_due_cron_jobs over all cron jobs made due at once
+  rate_limit check_rate_limit() calls across --accounts accounts at the configured limits
+
+Prints a summary and, with --output, writes the results as JSON; --compare prints the
+change against an earlier results file.
+
+    python -m benchmarks.end_to_end --jobs 500 --workers 4 --output results.json
+    python -m benchmarks.end_to_end --jobs 500 --compare results.json
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from benchmarks._django import setup
+
+SCHEDULE_TYPES = ("immediate", "run_at", "delay_from_now", "polling", "cron")
+TASK_TYPES = {
+    "immediate": "bulk_excel_insert",
+    "run_at": "delayed_archive",
+    "delay_from_now": "delayed_archive",
+    "polling": "polling_task",
+    "cron": "scheduled_cron_task",
+}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(latencies, elapsed=None):
+    """count, throughput and p50/p95/p99 (ms) for a list of latencies in seconds."""
+    out = {"count": len(latencies)}
+    if elapsed:
+        out["per_second"] = round(len(latencies) / elapsed, 1)
+    for p in (50, 95, 99):
+        value = percentile(latencies, p)
+        out[f"p{p}_ms"] = None if value is None else round(value * 1000, 2)
+    return out
+
+
+class QueryCounter:
+    """connection.execute_wrapper counting the queries of the current thread."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class CallbackStub:
+    """Threaded local callback server: records the first callback per job, injects latency and 500s."""
+
+    def __init__(self, latency, error_rate, seed):
+        self.first_seen = {}
+        self.calls = 0
+        lock = threading.Lock()
+        rng = random.Random(seed)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                now = time.perf_counter()
+                job_id = body["idempotency_key"].rsplit("_", 1)[0]
+                with lock:
+                    stub.calls += 1
+                    stub.first_seen.setdefault(job_id, now)
+                    fail = rng.random() < error_rate
+                if latency:
+                    time.sleep(latency)
+                n = (body.get("polling_state") or {}).get("n", 0)
+                out = json.dumps({"polling_state": {"n": n + 1}, "done": n >= 1}).encode()
+                self.send_response(500 if fail else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+class Broker:
+    """Stand-in for the broker: run_job messages in a heap by (scaled) ready time."""
+
+    def __init__(self, time_scale):
+        self.time_scale = time_scale
+        self.cond = threading.Condition()
+        self.heap = []
+        self.seq = itertools.count()
+        self.busy = 0
+        self.published = 0
+        self.closed = False
+
+    def publish(self, args=None, kwargs=None, countdown=None, eta=None, retries=0, **options):
+        delay = countdown or 0
+        if eta is not None:
+            delay = (eta - datetime.now(dt_timezone.utc)).total_seconds()
+        ready = time.monotonic() + max(0.0, delay) * self.time_scale
+        with self.cond:
+            heapq.heappush(self.heap, (ready, next(self.seq), args[0], kwargs or {}, retries))
+            self.published += 1
+            self.cond.notify()
+
+    def get(self):
+        """Next due message, or None once closed."""
+        with self.cond:
+            while not self.closed:
+                wait = self.heap[0][0] - time.monotonic() if self.heap else None
+                if wait is not None and wait <= 0:
+                    self.busy += 1
+                    return heapq.heappop(self.heap)[2:]
+                self.cond.wait(wait)
+            return None
+
+    def done(self):
+        with self.cond:
+            self.busy -= 1
+            self.cond.notify_all()
+
+    def join(self):
+        with self.cond:
+            while self.heap or self.busy:
+                self.cond.wait(0.1)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def worker(broker, run_job, kinds, stats, lock):
+    from django.db import connection
+    from common import joblog_sink
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        while True:
+            message = broker.get()
+            if message is None:
+                break
+            job_id, kwargs, retries = message
+            before = counter.count
+            try:
+                run_job.apply(args=[job_id], kwargs=kwargs, retries=retries)
+            finally:
+                with lock:
+                    stat = stats.setdefault(kinds.get(job_id, "other"), {"runs": 0, "queries": 0})
+                    stat["runs"] += 1
+                    stat["queries"] += counter.count - before
+                broker.done()
+        joblog_sink.flush()
+    connection.close()
+
+
+def item(schedule_type, i, accounts):
+    schedule = {
+        "immediate": {"type": "immediate"},
+        "run_at": {"type": "run_at", "timestamp": datetime.now(dt_timezone.utc).isoformat()},
+        "delay_from_now": {"type": "delay_from_now", "duration_seconds": 0},
+        "polling": {"type": "polling", "interval_seconds": 1},
+        "cron": {"type": "cron", "expression": "* * * * *"},
+    }[schedule_type]
+    return {
+        "app_name": "app_a",
+        "user_id": f"user-{i % accounts}",
+        "account_id": f"acc-{i % accounts}",
+        "task_type": TASK_TYPES[schedule_type],
+        "schedule": schedule,
+        "data": {"row": i},
+    }
+
+
+def run(args):
+    from django.db import connection
+    from django.test import Client
+    from common.models import Job, ScheduleType
+    from common.tasks import enqueue_due_cron_jobs, run_job
+
+    stub = CallbackStub(args.callback_latency / 1000, args.error_rate, args.seed)
+    os.environ["NODE_SERVER_URL"] = stub.url
+    broker = Broker(args.time_scale)
+
+    def retry(kwargs=None, countdown=None, max_retries=None, **options):
+        from celery.exceptions import Retry
+
+        request = run_job.request
+        broker.publish(args=request.args, kwargs=kwargs, countdown=countdown, retries=request.retries + 1)
+        raise Retry()
+
+    results = {"create": {}, "execute": {}}
+    kinds, created_at, run_stats, lock = {}, {}, {}, threading.Lock()
+    client = Client()
+    with mock.patch.object(run_job, "apply_async", broker.publish), mock.patch.object(run_job, "retry", retry):
+        threads = [
+            threading.Thread(target=worker, args=(broker, run_job, kinds, run_stats, lock), daemon=True)
+            for _ in range(args.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # create: all schedule types interleaved, so workers see a realistic mix
+        create_latency = {t: [] for t in SCHEDULE_TYPES}
+        create_queries = {t: 0 for t in SCHEDULE_TYPES}
+        counter = QueryCounter()
+        order = [t for i in range(args.jobs) for t in SCHEDULE_TYPES]
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for i, schedule_type in enumerate(order):
+                body = item(schedule_type, i, args.accounts)
+                before, t0 = counter.count, time.perf_counter()
+                resp = client.post("/api/jobs/create", body, content_type="application/json")
+                done = time.perf_counter()
+                assert resp.status_code == 201, resp.content
+                job_id = resp.json()["id"]
+                with lock:
+                    kinds[job_id] = schedule_type
+                created_at[job_id] = t0
+                create_latency[schedule_type].append(done - t0)
+                create_queries[schedule_type] += counter.count - before
+        create_elapsed = time.perf_counter() - start
+        for schedule_type in SCHEDULE_TYPES:
+            results["create"][schedule_type] = {
+                **summarize(create_latency[schedule_type]),
+                "queries_per_job": round(create_queries[schedule_type] / args.jobs, 2),
+            }
+        results["create"]["all"] = summarize([l for v in create_latency.values() for l in v], create_elapsed)
+
+        # cron_tick: make every cron job due and enqueue them in one beat tick
+        cron_ids = [job_id for job_id, kind in kinds.items() if kind == "cron"]
+        Job.objects.filter(id__in=cron_ids).update(scheduled_at=datetime.now(dt_timezone.utc))
+        counter = QueryCounter()
+        tick_start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            enqueue_due_cron_jobs()
+        tick_elapsed = time.perf_counter() - tick_start
+        for job_id in cron_ids:
+            created_at[job_id] = tick_start  # a cron run's latency counts from the tick
+        results["cron_tick"] = {
+            "jobs": len(cron_ids),
+            "seconds": round(tick_elapsed, 4),
+            "jobs_per_second": round(len(cron_ids) / tick_elapsed, 1) if tick_elapsed else None,
+            "queries": counter.count,
+        }
+
+        broker.join()
+        execute_elapsed = time.perf_counter() - start
+        broker.close()
+        for thread in threads:
+            thread.join()
+
+    for schedule_type in SCHEDULE_TYPES:
+        latencies = [
+            stub.first_seen[job_id] - created_at[job_id]
+            for job_id, kind in kinds.items()
+            if kind == schedule_type and job_id in stub.first_seen
+        ]
+        stat = run_stats.get(schedule_type, {"runs": 0, "queries": 0})
+        results["execute"][schedule_type] = {
+            **summarize(latencies),
+            "runs": stat["runs"],
+            "queries_per_run": round(stat["queries"] / stat["runs"], 2) if stat["runs"] else None,
+        }
+    statuses = Counter(Job.objects.exclude(schedule_type=ScheduleType.CRON).values_list("status", flat=True))
+    results["execute"]["all"] = {
+        "seconds": round(execute_elapsed, 3),
+        "runs": sum(s["runs"] for s in run_stats.values()),
+        "runs_per_second": round(sum(s["runs"] for s in run_stats.values()) / execute_elapsed, 1),
+        "callbacks": stub.calls,
+        "final_statuses": dict(statuses),
+    }
+    stub.server.shutdown()
+    return results
+
+
+def rate_limit(args):
+    """check_rate_limit() on its own, at the configured RATE_LIMIT_* limits."""
+    from django.conf import settings
+    from common import rate_limiter
+
+    latencies, allowed = [], 0
+    start = time.perf_counter()
+    for i in range(args.rate_checks):
+        t0 = time.perf_counter()
+        allowed += rate_limiter.check_rate_limit(f"rate-acc-{i % args.accounts}", "bulk_excel_insert")["allowed"]
+        latencies.append(time.perf_counter() - t0)
+    return {
+        **summarize(latencies, time.perf_counter() - start),
+        "allowed": allowed,
+        "limit": settings.RATE_LIMIT_DEFAULT,
+    }
+
+
+def compare(results, baseline, path=()):
+    """Yields (metric path, baseline, current) for every numeric metric in both."""
+    for key, value in results.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            yield from compare(value, old or {}, path + (key,))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and not isinstance(value, bool):
+            yield ".".join(path + (key,)), old, value
+
+
+def report(results):
+    print(f"{'phase':10} {'schedule':15} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for phase, per_job in (("create", "queries_per_job"), ("execute", "queries_per_run")):
+        for schedule_type in SCHEDULE_TYPES:
+            r = results[phase][schedule_type]
+            print(
+                f"{phase:10} {schedule_type:15} {r['count']:7d} {r['p50_ms'] or 0:9.2f} "
+                f"{r['p95_ms'] or 0:9.2f} {r['p99_ms'] or 0:9.2f} {r[per_job] or 0:8.2f}"
+            )
+    print(f"create throughput    {results['create']['all']['per_second']:10.1f} jobs/s")
+    ex = results["execute"]["all"]
+    print(f"run_job throughput   {ex['runs_per_second']:10.1f} runs/s  ({ex['runs']} runs, {ex['callbacks']} callbacks)")
+    print(f"final statuses       {ex['final_statuses']}")
+    tick = results["cron_tick"]
+    print(f"cron tick            {tick['jobs']} jobs in {tick['seconds']:.3f}s, {tick['queries']} queries")
+    rl = results["rate_limit"]
+    print(f"rate limiter         {rl['per_second']:10.1f} checks/s  p99 {rl['p99_ms']:.3f}ms  {rl['allowed']}/{rl['count']} allowed")
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=200, help="jobs per schedule type")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4, help="threads running run_job")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="factor applied to countdowns/etas")
+    parser.add_argument("--callback-latency", type=float, default=0.0, help="callback stub latency (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of callbacks answered with 500")
+    parser.add_argument("--rate-capacity", type=int, default=None,
+                        help="RATE_LIMIT_CAPACITY for the whole run (default: jobs run unthrottled)")
+    parser.add_argument("--rate-per-seconds", type=float, default=60.0)
+    parser.add_argument("--rate-checks", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--redis", action="store_true", help="use REDIS_HOST instead of fakeredis")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    os.environ["PUBLISH_JOB_UPDATES"] = "0"  # no channel layer offline
+    os.environ["FAIR_DISPATCH_ENABLED"] = "0"  # dispatch order is measured by benchmarks.fair_share
+    os.environ["DELAYED_STORE_ENABLED"] = "0"  # the stand-in broker replays countdowns (scaled) itself
+    os.environ["ASYNC_CALLBACK_TASK_TYPES"] = ""  # callbacks run on the worker threads
+    if args.rate_capacity is not None:
+        os.environ["RATE_LIMIT_CAPACITY"] = str(args.rate_capacity)
+        os.environ["RATE_LIMIT_PER_SECONDS"] = str(args.rate_per_seconds)
+    setup()
+    from django.conf import settings
+    from django.db import connections
+
+    # Several worker threads write to one SQLite file: take the write lock when a transaction
+    # starts (instead of failing to upgrade a read lock) and wait for it.
+    connections.settings["default"]["OPTIONS"].update(
+        transaction_mode="IMMEDIATE", timeout=30, init_command="PRAGMA journal_mode=WAL"
+    )
+    connections.close_all()
+
+    if not args.redis:
+        try:
+            import fakeredis
+        except ImportError:
+            parser.error("fakeredis is not installed; install it or pass --redis")
+        import common.redis_client
+        common.redis_client.redis_client = common.redis_client.fast_redis_client = fakeredis.FakeRedis()
+    if args.rate_capacity is None:
+        # Jobs run unthrottled; the rate_limit phase still uses the configured limits.
+        unlimited = {"capacity": 10 ** 9, "per_seconds": 60, "burst": 10 ** 6}
+        with mock.patch.object(settings, "RATE_LIMIT_DEFAULT", unlimited):
+            results = run(args)
+    else:
+        results = run(args)
+    results["rate_limit"] = rate_limit(args)
+
+    document = {
+        "benchmark": "end_to_end",
+        "created_at": datetime.now(dt_timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2, default=str)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.compare} ({baseline.get('git_revision')}):")
+        for name, old, new in compare(results, baseline.get("results", {})):
+            change = f"{(new - old) / old * 100:+7.1f}%" if old else "      -"
+            print(f"  {name:45} {old:>12} -> {new:>12}  {change}")
+
+
+if __name__ == "__main__":
+    main()
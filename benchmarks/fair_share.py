@@ -0,0 +1,117 @@
+"""
+Per-account latency under skewed load: FIFO broker queue versus fair-share dispatch.
+
+Simulates one account dumping --heavy-jobs jobs at t=0 while --light-accounts other
+accounts submit --light-jobs each, spread over --light-spread seconds, onto --workers
+workers. The fair run drives the real common.fair_queue Lua scripts (on fakeredis, or on
+REDIS_HOST with --redis) with a dispatcher tick every --dispatch-interval seconds.
+
+    python -m benchmarks.fair_share --heavy-jobs 20000 --workers 16
+"""
+import argparse
+import heapq
+import random
+from collections import deque
+
+from benchmarks._django import setup
+
+QUEUE = "jobs.bench"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def arrivals(args):
+    rng = random.Random(args.seed)
+    out = [(0.0, "heavy", f"heavy-{i}") for i in range(args.heavy_jobs)]
+    for a in range(args.light_accounts):
+        for i in range(args.light_jobs):
+            out.append((rng.uniform(0, args.light_spread), f"light-{a}", f"light-{a}-{i}"))
+    out.sort()
+    return out
+
+
+def simulate(args, fair_queue=None):
+    """Returns {account: [latency seconds]}."""
+    rng = random.Random(args.seed + 1)
+    pending = deque(arrivals(args))
+    submitted = {}
+    broker = deque()  # job ids, FIFO
+    busy = []  # heap of (finish time, job id)
+    latencies = {}
+    now, next_dispatch = 0.0, 0.0
+    step = args.service / 10
+
+    while pending or broker or busy or (fair_queue and fair_queue.has_pending(QUEUE)):
+        while pending and pending[0][0] <= now:
+            _, account, job_id = pending.popleft()
+            submitted[job_id] = (now, account)
+            if fair_queue:
+                fair_queue.hold([(job_id, "bench", account, {"queue": QUEUE})])
+            else:
+                broker.append(job_id)
+        if fair_queue and now >= next_dispatch:
+            budget = args.target_depth - len(broker)
+            broker.extend(job_id for job_id, _ in fair_queue.pop(QUEUE, budget))
+            next_dispatch = now + args.dispatch_interval
+        while busy and busy[0][0] <= now:
+            _, job_id = heapq.heappop(busy)
+            started_at, account = submitted.pop(job_id)
+            latencies.setdefault(account, []).append(now - started_at)
+        while broker and len(busy) < args.workers:
+            service = rng.expovariate(1 / args.service)
+            heapq.heappush(busy, (now + service, broker.popleft()))
+        now += step
+    return latencies
+
+
+def report(name, latencies):
+    light = [l for account, values in latencies.items() if account != "heavy" for l in values]
+    worst = max(percentile(v, 99) for a, v in latencies.items() if a != "heavy")
+    heavy = latencies["heavy"]
+    print(f"{name}")
+    print(f"  heavy account      p50 {percentile(heavy, 50):8.2f}s  p99 {percentile(heavy, 99):8.2f}s")
+    print(f"  light accounts     p50 {percentile(light, 50):8.2f}s  p99 {percentile(light, 99):8.2f}s")
+    print(f"  worst light p99                     {worst:8.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--heavy-jobs", type=int, default=20000)
+    parser.add_argument("--light-accounts", type=int, default=20)
+    parser.add_argument("--light-jobs", type=int, default=50)
+    parser.add_argument("--light-spread", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--service", type=float, default=0.05, help="mean job duration (s)")
+    parser.add_argument("--target-depth", type=int, default=100)
+    parser.add_argument("--quantum", type=int, default=10)
+    parser.add_argument("--dispatch-interval", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--redis", action="store_true", help="use REDIS_HOST instead of fakeredis")
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+
+    if not args.redis:
+        try:
+            import fakeredis
+        except ImportError:
+            parser.error("fakeredis is not installed; install it or pass --redis")
+        import common.redis_client
+        common.redis_client.redis_client = common.redis_client.fast_redis_client = fakeredis.FakeRedis()
+    from common import fair_queue
+
+    settings.FAIR_QUANTUM = args.quantum
+    settings.FAIR_APP_WEIGHTS = {}
+
+    print(f"{args.heavy_jobs} heavy jobs, {args.light_accounts}x{args.light_jobs} light jobs, "
+          f"{args.workers} workers, mean service {args.service * 1000:.0f}ms")
+    report("FIFO broker queue", simulate(args))
+    report("fair-share dispatch", simulate(args, fair_queue))
+
+
+if __name__ == "__main__":
+    main()
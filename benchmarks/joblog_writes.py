@@ -0,0 +1,66 @@
+"""
+JobLog events/sec: one get_or_create per event (old run_job path) versus the buffered sink.
+
+    python -m benchmarks.joblog_writes --events 20000 --buffer-size 200
+"""
+import argparse
+import time
+
+from benchmarks._django import setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--buffer-size", type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    from common.joblog_sink import JobLogBuffer
+    from common.models import AppUser, Job, JobLog, JobStatus, ScheduleType
+
+    user = AppUser.objects.create(app_name="bench", monday_user_id="bench")
+    jobs = Job.objects.bulk_create([
+        Job(
+            app_name="bench",
+            user=user,
+            account_id="bench",
+            task_type="bench",
+            status=JobStatus.QUEUED,
+            schedule_type=ScheduleType.IMMEDIATE,
+        )
+        for _ in range(args.jobs)
+    ])
+
+    def events(tag):
+        for i in range(args.events):
+            job = jobs[i % len(jobs)]
+            yield job, {
+                "event_type": "execution_started",
+                "idempotency_key": f"{job.id}::{tag}::{i}",
+                "attempt_number": 1,
+            }
+
+    start = time.perf_counter()
+    for job, fields in events("sync"):
+        key = fields.pop("idempotency_key")
+        JobLog.objects.get_or_create(idempotency_key=key, defaults={"job": job, **fields})
+    sync_elapsed = time.perf_counter() - start
+
+    sink = JobLogBuffer(max_size=args.buffer_size, max_delay=3600, enabled=True)
+    start = time.perf_counter()
+    for job, fields in events("buffered"):
+        sink.record(job.id, **fields)
+    sink.flush()
+    buffered_elapsed = time.perf_counter() - start
+
+    assert JobLog.objects.count() == 2 * args.events
+    print(f"events per run:    {args.events}")
+    print(f"get_or_create:     {sync_elapsed:8.3f}s  {args.events / sync_elapsed:10.1f} events/s")
+    print(f"buffered sink:     {buffered_elapsed:8.3f}s  {args.events / buffered_elapsed:10.1f} events/s")
+    print(f"speedup:           {sync_elapsed / buffered_elapsed:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Hot/cold archival of finished jobs.
+
+archive_terminal_jobs() (Celery beat, every JOB_ARCHIVE_INTERVAL seconds) moves jobs that
+have been completed, failed or cancelled for more than JOB_ARCHIVE_AFTER_DAYS days, with
+their logs and log summary, from jobs / job_logs into jobs_archive / job_logs_archive. Each
+batch of JOB_ARCHIVE_BATCH_SIZE jobs is copied and deleted in one transaction; a run stops
+after JOB_ARCHIVE_MAX_BATCHES. The status endpoints fall back to the archive on a miss.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.models import ArchivedJob, ArchivedJobLog, Job, JobLog, JobLogSummary, JobStatus
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+JOB_FIELDS = [f.attname for f in Job._meta.concrete_fields if f.attname not in ("claim_token", "idempotency_key")]
+LOG_FIELDS = [f.attname for f in JobLog._meta.concrete_fields]
+
+
+def archive_terminal_jobs(now=None, batch_size=None, max_batches=None):
+    """Move finished jobs older than JOB_ARCHIVE_AFTER_DAYS to the archive. Returns how many moved."""
+    days = settings.JOB_ARCHIVE_AFTER_DAYS
+    if days <= 0:
+        return 0
+    now = now or timezone.now()
+    batch_size = batch_size or settings.JOB_ARCHIVE_BATCH_SIZE
+    max_batches = max_batches or settings.JOB_ARCHIVE_MAX_BATCHES
+    expired = Job.objects.filter(status__in=TERMINAL_STATUSES, updated_at__lt=now - timedelta(days=days))
+
+    moved = 0
+    for _ in range(max_batches):
+        count = _archive_batch(expired, batch_size)
+        moved += count
+        if count < batch_size:
+            break
+    if moved:
+        logger.info("archive_terminal_jobs: archived %d jobs", moved)
+    return moved
+
+
+def _archive_batch(expired, batch_size):
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            expired = expired.select_for_update(skip_locked=True)
+        jobs = list(expired.values(*JOB_FIELDS)[:batch_size])
+        if not jobs:
+            return 0
+        ids = [job["id"] for job in jobs]
+        summaries = {
+            s["job_id"]: s
+            for s in JobLogSummary.objects.filter(job_id__in=ids).values(
+                "job_id", "event_counts", "first_at", "last_at", "last_error"
+            )
+        }
+        ArchivedJob.objects.bulk_create(
+            [
+                ArchivedJob(**job, log_summary=_summary_json(summaries.get(job["id"])))
+                for job in jobs
+            ],
+            batch_size=500,
+        )
+        ArchivedJobLog.objects.bulk_create(
+            [ArchivedJobLog(**log) for log in JobLog.objects.filter(job_id__in=ids).values(*LOG_FIELDS)],
+            batch_size=500,
+        )
+        JobLog.objects.filter(job_id__in=ids).delete()
+        JobLogSummary.objects.filter(job_id__in=ids).delete()
+        Job.objects.filter(id__in=ids).delete()
+    return len(jobs)
+
+
+def _summary_json(summary):
+    if summary is None:
+        return None
+    return {
+        "event_counts": summary["event_counts"],
+        "first_at": summary["first_at"].isoformat(),
+        "last_at": summary["last_at"].isoformat(),
+        "last_error": summary["last_error"],
+    }
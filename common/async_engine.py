@@ -0,0 +1,254 @@
+"""
+Asyncio execution engine for the callback phase of run_job.
+
+Task types listed in ASYNC_CALLBACK_TASK_TYPES hand their HTTP callback to one event loop
+per worker process (running in a daemon thread), so a slow callback holds a coroutine
+instead of a Celery worker thread. Up to ASYNC_CALLBACK_MAX_IN_FLIGHT callbacks are on the
+engine at once: run_job reserves a Slot before it claims the job, waiting up to
+ASYNC_CALLBACK_SUBMIT_TIMEOUT seconds for one, so a full engine holds the worker thread
+(and, with prefetch 1, the next message) instead of piling up RUNNING jobs. The slot is
+freed once the callback's handling is done. Completion and failure handling (ORM writes,
+retries) run off the loop via database_sync_to_async in executor threads
+(thread_sensitive=False), so handlers for different jobs run in parallel.
+
+A run_job message is acked when the hand-off returns, before the callback finishes; if the
+worker dies meanwhile, common.tasks.recover_stuck_jobs retries the job.
+
+Uses aiohttp when it is installed. Without it the loop still owns scheduling and the
+in-flight limit, but each request runs through common.http_client in an executor thread.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+
+import requests
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from common import http_client
+
+logger = logging.getLogger(__name__)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+_lock = threading.Lock()
+_loop = None
+_pid = None
+_slots = None  # threading.BoundedSemaphore of ASYNC_CALLBACK_MAX_IN_FLIGHT
+_session = None
+_pending = set()  # concurrent.futures.Future for every submitted callback
+
+
+def handles(task_type):
+    """True if task_type is configured to run its callback on the async engine."""
+    return task_type in settings.ASYNC_CALLBACK_TASK_TYPES
+
+
+def get_loop():
+    """The worker process's engine loop, started on first use (and again after fork)."""
+    global _loop, _pid, _slots, _session
+    if _loop is not None and _pid == os.getpid():
+        return _loop
+    with _lock:
+        if _loop is None or _pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            if aiohttp is None:
+                _loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_CALLBACK_MAX_IN_FLIGHT,
+                    thread_name_prefix="async-callback-http",
+                ))
+            _pid = os.getpid()
+            _slots = threading.BoundedSemaphore(settings.ASYNC_CALLBACK_MAX_IN_FLIGHT)
+            _session = None
+            _pending.clear()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="async-callback-engine",
+                daemon=True,
+            ).start()
+    return _loop
+
+
+class Slot:
+    """A place on the engine, held from reserve() until the callback's handling is done."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._released = False
+        self.submitted = False  # handed to submit_callback, which releases it
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._semaphore.release()
+
+
+def reserve(timeout):
+    """A Slot on this process's engine, waiting up to timeout seconds for one; None if it stays full."""
+    get_loop()
+    semaphore = _slots
+    if not semaphore.acquire(timeout=timeout):
+        return None
+    return Slot(semaphore)
+
+
+def submit_callback(url, body, parse_json, on_response, on_error, slot):
+    """
+    POST body (a JSON dict, or a streamed common.payload_store.CallbackBody) to url on the
+    engine loop and return immediately. slot (from reserve()) is released when done.
+
+    on_response(result_data) is called with the parsed JSON response when parse_json is true
+    (an empty dict if it does not parse), otherwise with None. on_error(exc) is called with a
+    requests.RequestException for HTTP/transport failures, or the original exception.
+    Both run in a thread with a usable Django DB connection.
+    """
+    slot.submitted = True
+    future = asyncio.run_coroutine_threadsafe(
+        _run_callback(url, body, parse_json, on_response, on_error),
+        get_loop(),
+    )
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    future.add_done_callback(lambda _: slot.release())
+    return future
+
+
+def in_flight():
+    """Number of submitted callbacks whose handling has not finished yet."""
+    return len(_pending)
+
+
+def drain(timeout=None):
+    """Wait for submitted callbacks to finish (worker shutdown). Returns how many are left."""
+    for future in list(_pending):
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass  # logged by _run_callback
+    return len(_pending)
+
+
+def shutdown(timeout=None):
+    """Drain in-flight callbacks, close the aiohttp session and stop the loop. Returns how many were left."""
+    global _loop, _session
+    left = drain(timeout)
+    with _lock:
+        loop, session = _loop, _session
+        _loop = _session = None
+    if loop is None or _pid != os.getpid():
+        return left
+    if session is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+        except Exception:
+            pass
+    loop.call_soon_threadsafe(loop.stop)
+    return left
+
+
+async def _run_callback(url, body, parse_json, on_response, on_error):
+    try:
+        try:
+            result_data = await _post(url, body, parse_json)
+        except Exception as e:
+            await database_sync_to_async(on_error, thread_sensitive=False)(e)
+            return
+        await database_sync_to_async(on_response, thread_sensitive=False)(result_data)
+    except Exception:
+        # Celery's Retry from a sync handler, or a bug in one: nothing above us to catch it.
+        logger.exception("async callback handling failed for %s", url)
+
+
+async def _post(url, body, parse_json):
+    if aiohttp is None:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, _post_blocking, url, body, parse_json
+        )
+    connect, read = http_client.get_timeout(url)
+    timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+    try:
+        if isinstance(body, dict):
+            request = {"json": body}
+        else:
+            request = {"data": _aiter(body), "headers": {"Content-Type": "application/json"}}
+        async with _get_session().post(url, timeout=timeout, **request) as resp:
+            if resp.status >= 400:
+                raise _http_error(resp.status, resp.reason, url)
+            if not parse_json:
+                await _discard_body(resp, url)
+                return None
+            raw = await asyncio.wait_for(_read_body(resp, url), settings.CALLBACK_PARSE_TIMEOUT)
+    except asyncio.TimeoutError as e:
+        raise requests.Timeout(str(e) or f"callback to {url} timed out")
+    except aiohttp.ClientError as e:
+        raise requests.ConnectionError(str(e))
+    return http_client.loads(raw)
+
+
+async def _discard_body(resp, url):
+    """Drain a body nobody needs so the connection can be reused; never raises."""
+    try:
+        await asyncio.wait_for(_read_body(resp, url), settings.CALLBACK_PARSE_TIMEOUT)
+    except (http_client.ResponseTooLarge, asyncio.TimeoutError, aiohttp.ClientError):
+        pass  # connection closed; the callback itself already succeeded
+
+
+async def _read_body(resp, url):
+    """Same limit as http_client.read_body, read from the aiohttp stream."""
+    limit = settings.CALLBACK_MAX_RESPONSE_BYTES
+    if resp.content_length is not None and resp.content_length > limit:
+        raise http_client.ResponseTooLarge(url, limit)
+    chunks, size = [], 0
+    async for chunk in resp.content.iter_chunked(http_client.CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            raise http_client.ResponseTooLarge(url, limit)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _aiter(chunks):
+    # Streamed bodies (common.payload_store) read from a local memory map: cheap enough for the loop.
+    for chunk in chunks:
+        yield chunk
+
+
+def _post_blocking(url, body, parse_json):
+    with http_client.post(
+        url,
+        headers={"Content-Type": "application/json"},
+        stream=True,
+        **http_client.body_kwargs(body),
+    ) as resp:
+        resp.raise_for_status()
+        if not parse_json:
+            http_client.discard_body(resp)
+            return None
+        return http_client.loads(http_client.read_body(resp))
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        connector = aiohttp.TCPConnector(
+            limit=settings.ASYNC_CALLBACK_MAX_IN_FLIGHT,
+            limit_per_host=settings.ASYNC_CALLBACK_MAX_IN_FLIGHT,
+            force_close=not settings.CALLBACK_KEEP_ALIVE,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+
+def _http_error(status_code, reason, url):
+    """requests.HTTPError carrying status_code, so run_job classifies it like a sync failure."""
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = reason
+    response.url = url
+    return requests.HTTPError(f"{status_code} Error: {reason} for url: {url}", response=response)
+
@@ -1,13 +1,179 @@
-def publish_job_update(job_id, status=None, log=None):
-    """Send job_update to channel group job_{job_id} so WebSocket clients get it."""
+"""
+Coalescing, presence-aware job_update publisher.
+
+publish_job_update() only records the update in memory. Within PUBLISH_COALESCE_WINDOW
+seconds all updates for the same job are merged (latest status, every log in order) and
+sent as one message from the worker's event loop (common.async_engine), which keeps the
+channel layer's Redis connection open between sends. Before sending, one MGET of the
+presence counters maintained by the consumers drops groups nobody is watching.
+
+Each job's update goes to job_{id} as a job_update message, and the updates of the whole
+window are sent to every watched account_{id} / board_{id} group as one job_updates message.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+
+import redis.asyncio
+from django.conf import settings
+
+from common import async_engine, metrics
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = "ws_presence:{group}"
+PRESENCE_TTL = 24 * 3600  # bounds counts leaked by a consumer process that died
+
+_lock = threading.Lock()
+_pending = {}  # job_id -> {"status": ..., "logs": [...]}
+_flush_scheduled = False
+_presence_clients = {}  # event loop -> redis.asyncio.Redis (clients are bound to their loop)
+
+
+def group_name(job_id):
+    return f"job_{job_id}"
+
+
+def account_group_name(account_id):
+    return f"account_{account_id}"
+
+
+def board_group_name(board_id):
+    return f"board_{board_id}"
+
+
+def presence_key(group):
+    return PRESENCE_KEY.format(group=group)
+
+
+def publish_job_update(job_id, status=None, log=None, account_id=None, board_id=None):
+    """Send job_update to channel group job_{job_id} (and the job's account/board streams) so WebSocket clients get it."""
+    global _flush_scheduled
+    if not settings.PUBLISH_JOB_UPDATES:
+        return
+    with _lock:
+        update = _pending.setdefault(str(job_id), {"status": None, "logs": []})
+        if account_id:
+            update["account_id"] = account_id
+        if board_id:
+            update["board_id"] = board_id
+        if status is not None:
+            update["status"] = status
+        if log is not None:
+            update["logs"].append(log)
+        if _flush_scheduled:
+            return
+        _flush_scheduled = True
+    try:
+        loop = async_engine.get_loop()
+        loop.call_soon_threadsafe(loop.call_later, settings.PUBLISH_COALESCE_WINDOW, _start_flush)
+    except Exception:
+        with _lock:
+            _flush_scheduled = False
+
+
+def flush(timeout=5):
+    """Send everything pending now (worker shutdown)."""
+    try:
+        asyncio.run_coroutine_threadsafe(_flush(), async_engine.get_loop()).result(timeout=timeout)
+    except Exception:
+        logger.exception("job update flush failed")
+
+
+async def mark_presence(groups, delta):
+    """Called by consumers on connect (+1) / disconnect (-1) for each group they joined."""
+    if not settings.PUBLISH_PRESENCE_CHECK:
+        return
+    client = _get_presence_client()
+    try:
+        for group in groups:
+            key = presence_key(group)
+            count = await client.incrby(key, delta)
+            if count <= 0:
+                await client.delete(key)
+            else:
+                await client.expire(key, PRESENCE_TTL)
+    except Exception:
+        logger.warning("could not update WebSocket presence for %s", groups)
+
+
+def _start_flush():
+    asyncio.ensure_future(_flush())
+
+
+def _take_pending():
+    global _pending, _flush_scheduled
+    with _lock:
+        pending, _pending = _pending, {}
+        _flush_scheduled = False
+    return pending
+
+
+async def _flush():
+    pending = _take_pending()
+    if not pending:
+        return
+    metrics.JOB_UPDATES_PUBLISHED.inc(len(pending))
+    with metrics.timed(metrics.JOB_UPDATE_PUBLISH):
+        await _send(pending)
+
+
+async def _send(pending):
     try:
-        from asgiref.sync import async_to_sync
         from channels.layers import get_channel_layer
         channel_layer = get_channel_layer()
         if not channel_layer:
             return
-        group_name = f"job_{job_id}"
-        message = {"type": "job_update", "status": status, "log": log}
-        async_to_sync(channel_layer.group_send)(group_name, message)
+
+        job_messages = {}  # group -> job_update message
+        streams = {}  # account/board group -> [update, ...]
+        for job_id, update in pending.items():
+            logs = update["logs"]
+            message = {
+                "update_id": uuid.uuid4().hex,  # lets a socket on several of these groups drop repeats
+                "job_id": job_id,
+                "status": update["status"],
+                "log": logs[-1] if logs else None,
+                "logs": logs,
+            }
+            job_messages[group_name(job_id)] = message
+            if update.get("account_id"):
+                streams.setdefault(account_group_name(update["account_id"]), []).append(message)
+            if update.get("board_id"):
+                streams.setdefault(board_group_name(update["board_id"]), []).append(message)
+
+        watched = await _watched_groups(list(job_messages) + list(streams))
+        for group, message in job_messages.items():
+            if group in watched:
+                await channel_layer.group_send(group, {"type": "job_update", **message})
+        for group, updates in streams.items():
+            if group in watched:
+                await channel_layer.group_send(group, {"type": "job_updates", "updates": updates})
+    except Exception:
+        pass  # channel layer not configured or Redis down
+
+
+async def _watched_groups(groups):
+    """Subset of groups with at least one connected consumer. All of them if presence is unknown."""
+    if not settings.PUBLISH_PRESENCE_CHECK:
+        return set(groups)
+    try:
+        counts = await _get_presence_client().mget([presence_key(g) for g in groups])
     except Exception:
-        pass  # channel layer not configured or Redis down
\ No newline at end of file
+        return set(groups)
+    return {g for g, count in zip(groups, counts) if count is not None and int(count) > 0}
+
+
+def _get_presence_client():
+    loop = asyncio.get_running_loop()
+    client = _presence_clients.get(loop)
+    if client is None:
+        for stale in [l for l in _presence_clients if l.is_closed()]:
+            del _presence_clients[stale]
+        client = _presence_clients[loop] = redis.asyncio.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+        )
+    return client
@@ -0,0 +1,237 @@
+"""
+Per-host circuit breaker and adaptive concurrency limit for job callbacks.
+
+Every callback host (scheme://host:port, see http_client.host_key) has one breaker, shared
+by all workers in Redis:
+
+- cb:<host> (hash): state (closed, open, half_open), the current fixed failure window
+  (window_start, calls, failures), open_until, half-open probes handed out, and the
+  concurrency limit with the time it was last cut.
+- cb_inflight:<host> (sorted set): one lease per callback in flight, scored by the time it
+  expires. A lease whose worker died is dropped once it expires, so it cannot hold a slot
+  for ever.
+
+acquire() takes a lease before the callback and release() returns it with the outcome, one
+EVALSHA each. A closed breaker opens when at least CIRCUIT_BREAKER_MIN_CALLS calls in the
+current CIRCUIT_BREAKER_WINDOW seconds finished and CIRCUIT_BREAKER_FAILURE_RATIO of them
+failed. It then refuses calls for CIRCUIT_BREAKER_OPEN_SECONDS, after which it lets
+CIRCUIT_BREAKER_HALF_OPEN_PROBES calls through: the first to succeed closes it, the first
+to fail opens it again.
+
+While closed, at most `limit` callbacks are in flight per host. The limit follows AIMD: each
+success adds CALLBACK_CONCURRENCY_INCREASE / limit (so about CALLBACK_CONCURRENCY_INCREASE
+per full round of calls) up to CALLBACK_CONCURRENCY_MAX, and a failure multiplies it by
+CALLBACK_CONCURRENCY_DECREASE down to CALLBACK_CONCURRENCY_MIN. Calls that were already in
+flight when the limit was cut do not cut it again, so one burst of errors halves it once.
+A host starts at CALLBACK_CONCURRENCY_MAX.
+
+Only transient failures count (connection errors, timeouts, 5xx, 408 and 429); other 4xx
+answers mean the host is up. run_job defers a refused job without using a retry attempt.
+If Redis is unavailable every call is allowed, as if the breaker were off.
+"""
+import logging
+import math
+import uuid
+
+import redis
+from django.conf import settings
+
+from common import http_client
+from common.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_MARGIN_SECONDS = 5  # added to the host's timeouts for a lease's lifetime
+STATE_TTL_SECONDS = 3600  # an idle host's breaker is forgotten (closed, full limit) after this
+
+# KEYS[1] breaker hash, KEYS[2] lease set. ARGV: lease token, lease seconds, half-open
+# probes, initial limit, state TTL. Returns {allowed (0/1), state, seconds to wait when refused}:
+# until the breaker half-opens, until unanswered probes are replaced, or until the oldest lease
+# in flight expires (a slot frees then at the latest).
+ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local lease_seconds = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+
+local b = redis.call('HMGET', KEYS[1], 'state', 'open_until', 'probes', 'half_open_at', 'limit')
+local state = b[1] or 'closed'
+if state == 'open' then
+    local open_until = tonumber(b[2]) or 0
+    if now < open_until then
+        return {0, state, tostring(open_until - now)}
+    end
+    state = 'half_open'
+    redis.call('HSET', KEYS[1], 'state', state, 'probes', 0, 'half_open_at', tostring(now))
+    b[3] = '0'
+    b[4] = tostring(now)
+end
+
+if state == 'half_open' then
+    local probes = tonumber(b[3]) or 0
+    if probes >= tonumber(ARGV[3]) then
+        local reprobe_at = (tonumber(b[4]) or now) + lease_seconds
+        if now < reprobe_at then
+            return {0, state, tostring(reprobe_at - now)}
+        end
+        -- none of the probes reported back (their workers died): hand out new ones
+        probes = 0
+        redis.call('HSET', KEYS[1], 'half_open_at', tostring(now))
+    end
+    redis.call('HSET', KEYS[1], 'probes', probes + 1)
+else
+    local limit = tonumber(b[5]) or tonumber(ARGV[4])
+    if redis.call('ZCARD', KEYS[2]) >= math.max(1, math.floor(limit)) then
+        local oldest = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+        return {0, 'limited', tostring(tonumber(oldest[2]) - now)}
+    end
+end
+
+redis.call('ZADD', KEYS[2], now + lease_seconds, ARGV[1])
+redis.call('EXPIRE', KEYS[2], math.ceil(lease_seconds) + 60)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+return {1, state, '0'}
+"""
+
+# KEYS as above. ARGV: lease token, succeeded (1/0), lease seconds, window seconds, min
+# calls, failure ratio, open seconds, min limit, max limit, increase, decrease, state TTL.
+# Returns 1 if this call opened the breaker, else 0.
+RELEASE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local ok = ARGV[2] == '1'
+local expires = tonumber(redis.call('ZSCORE', KEYS[2], ARGV[1]))
+redis.call('ZREM', KEYS[2], ARGV[1])
+
+local b = redis.call('HMGET', KEYS[1], 'state', 'window_start', 'calls', 'failures', 'limit', 'cut_at')
+local state = b[1] or 'closed'
+local opened = 0
+local limit = tonumber(b[5]) or tonumber(ARGV[9])
+local cut_at = tonumber(b[6]) or 0
+if ok then
+    limit = math.min(tonumber(ARGV[9]), limit + tonumber(ARGV[10]) / limit)
+elseif expires and expires - tonumber(ARGV[3]) >= cut_at then
+    -- only calls started after the last cut may cut again
+    limit = math.max(tonumber(ARGV[8]), limit * tonumber(ARGV[11]))
+    cut_at = now
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit), 'cut_at', tostring(cut_at))
+
+if state == 'half_open' then
+    if ok then
+        state = 'closed'
+        redis.call('HSET', KEYS[1], 'state', state, 'window_start', tostring(now), 'calls', 0, 'failures', 0)
+    else
+        state, opened = 'open', 1
+        redis.call('HSET', KEYS[1], 'state', state, 'open_until', tostring(now + tonumber(ARGV[7])))
+    end
+elseif state == 'closed' then
+    local window_start = tonumber(b[2]) or now
+    local calls = tonumber(b[3]) or 0
+    local failures = tonumber(b[4]) or 0
+    if now - window_start >= tonumber(ARGV[4]) then
+        window_start, calls, failures = now, 0, 0
+    end
+    calls = calls + 1
+    if not ok then
+        failures = failures + 1
+    end
+    if not ok and calls >= tonumber(ARGV[5]) and failures / calls >= tonumber(ARGV[6]) then
+        state, opened = 'open', 1
+        redis.call('HSET', KEYS[1], 'state', state, 'open_until', tostring(now + tonumber(ARGV[7])),
+            'window_start', tostring(now), 'calls', 0, 'failures', 0)
+    else
+        redis.call('HSET', KEYS[1], 'window_start', tostring(window_start), 'calls', calls, 'failures', failures)
+    end
+end
+-- open: a call that started before the breaker opened; only the limit moves
+
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[12]))
+return opened
+"""
+
+_acquire = redis_client.register_script(ACQUIRE_LUA)
+_release = redis_client.register_script(RELEASE_LUA)
+
+
+def _keys(host):
+    return [f"cb:{host}", f"cb_inflight:{host}"]
+
+
+def _lease_seconds(url):
+    connect, read = http_client.get_timeout(url)
+    return connect + read + settings.CALLBACK_PARSE_TIMEOUT + LEASE_MARGIN_SECONDS
+
+
+def acquire(url):
+    """
+    Ask the breaker of url's host for a callback slot. Returns a lease dict: allowed, state
+    (closed, half_open, open, or limited when the concurrency limit is reached),
+    retry_after_seconds (how long to wait when refused) and, when allowed, the token
+    release() needs.
+    """
+    host = http_client.host_key(url)
+    lease = {"allowed": True, "state": "closed", "retry_after_seconds": 0, "host": host, "token": None}
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return lease
+    token = uuid.uuid4().hex
+    lease_seconds = _lease_seconds(url)
+    try:
+        allowed, state, wait = _acquire(
+            keys=_keys(host),
+            args=[
+                token,
+                lease_seconds,
+                settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+                settings.CALLBACK_CONCURRENCY_MAX,
+                STATE_TTL_SECONDS,
+            ],
+            client=redis_client,
+        )
+    except redis.RedisError:
+        logger.warning("circuit breaker unavailable; allowing callback to %s", host)
+        return lease
+    lease["state"] = state.decode()
+    if not allowed:
+        lease.update(allowed=False, retry_after_seconds=max(1, math.ceil(float(wait))))
+        return lease
+    lease.update(token=token, lease_seconds=lease_seconds)
+    return lease
+
+
+def release(lease, succeeded):
+    """Return an allowed lease with the callback's outcome (succeeded: the host answered normally)."""
+    if not lease.get("token"):
+        return
+    try:
+        opened = _release(
+            keys=_keys(lease["host"]),
+            args=[
+                lease["token"],
+                1 if succeeded else 0,
+                lease["lease_seconds"],
+                settings.CIRCUIT_BREAKER_WINDOW,
+                settings.CIRCUIT_BREAKER_MIN_CALLS,
+                settings.CIRCUIT_BREAKER_FAILURE_RATIO,
+                settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+                settings.CALLBACK_CONCURRENCY_MIN,
+                settings.CALLBACK_CONCURRENCY_MAX,
+                settings.CALLBACK_CONCURRENCY_INCREASE,
+                settings.CALLBACK_CONCURRENCY_DECREASE,
+                STATE_TTL_SECONDS,
+            ],
+            client=redis_client,
+        )
+    except redis.RedisError:
+        logger.warning("circuit breaker unavailable; lease for %s expires on its own", lease["host"])
+        return
+    lease["token"] = None
+    if opened:
+        logger.warning("circuit for %s is open for %ss", lease["host"], settings.CIRCUIT_BREAKER_OPEN_SECONDS)
+
+
+def snapshot(url):
+    """Breaker fields and callbacks in flight for url's host (for debugging)."""
+    breaker, in_flight = _keys(http_client.host_key(url))
+    fields = {k.decode(): v.decode() for k, v in redis_client.hgetall(breaker).items()}
+    return {**fields, "in_flight": redis_client.zcard(in_flight)}
@@ -1,5 +1,17 @@
+import asyncio
+import hmac
 import json
+import re
+import uuid
+from collections import deque
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.core import signing
+
+from common import stream_tokens
+from common.channel_utils import account_group_name, board_group_name, group_name, mark_presence
+
+_STREAM_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
 
 
 class JobStatusConsumer(AsyncWebsocketConsumer):
@@ -7,12 +19,14 @@ class JobStatusConsumer(AsyncWebsocketConsumer):
 
     async def connect(self):
         self.job_id = self.scope["url_route"]["kwargs"]["job_id"]
-        self.room_group_name = f"job_{self.job_id}"
+        self.room_group_name = group_name(self.job_id)
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await mark_presence([self.room_group_name], 1)
         await self.accept()
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        await mark_presence([self.room_group_name], -1)
 
     async def job_update(self, event):
         """Called when channel_layer.group_send(..., {'type': 'job_update', ...})."""
@@ -20,4 +34,145 @@ class JobStatusConsumer(AsyncWebsocketConsumer):
             "event": "job_update",
             "status": event.get("status"),
             "log": event.get("log"),
-        }))
\ No newline at end of file
+            "logs": event.get("logs") or [],
+        }))
+
+
+class JobStreamConsumer(AsyncWebsocketConsumer):
+    """
+    One socket, many subscriptions. The client sends
+    {"action": "subscribe" | "unsubscribe", "job_ids": [...], "account_id": ..., "board_id": ...}
+    and receives {"event": "job_updates", "updates": [...]} frames, batched every
+    WS_BATCH_WINDOW seconds with one entry per job (latest status, logs in order).
+    At most WS_MAX_SUBSCRIPTIONS groups per socket.
+
+    Subscribing to an account or board stream needs either the X-Internal-Secret header on
+    the handshake or a "token" from common.stream_tokens covering it; otherwise the whole
+    subscribe is refused with an error frame. With no INTERNAL_API_SECRET set (dev) anyone may.
+    """
+
+    async def connect(self):
+        self.internal = _has_internal_secret(self.scope)
+        self.subscriptions = set()
+        self.outbox = {}  # job_id -> merged update
+        self.flush_handle = None
+        # The same update arrives once per subscribed group it was sent to (job + account + board).
+        self.recent_update_ids = deque(maxlen=1000)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+        for group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        await mark_presence(self.subscriptions, -1)
+        self.subscriptions = set()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            command = json.loads(text_data or "")
+            if not isinstance(command, dict):
+                raise ValueError("expected a JSON object")
+            action = command.get("action")
+            if action not in ("subscribe", "unsubscribe"):
+                raise ValueError("action must be subscribe or unsubscribe")
+            groups = self._groups_for(command, authorize=action == "subscribe")
+        except ValueError as e:
+            await self._send_json({"event": "error", "error": str(e)})
+            return
+
+        if action == "subscribe":
+            new = groups - self.subscriptions
+            if len(self.subscriptions) + len(new) > settings.WS_MAX_SUBSCRIPTIONS:
+                await self._send_json({
+                    "event": "error",
+                    "error": f"at most {settings.WS_MAX_SUBSCRIPTIONS} subscriptions per connection",
+                })
+                return
+            for group in new:
+                await self.channel_layer.group_add(group, self.channel_name)
+            await mark_presence(new, 1)
+            self.subscriptions |= new
+        else:
+            gone = groups & self.subscriptions
+            for group in gone:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            await mark_presence(gone, -1)
+            self.subscriptions -= gone
+        await self._send_json({"event": f"{action}d", "subscriptions": sorted(self.subscriptions)})
+
+    async def job_update(self, event):
+        """A single job's update, from its job_{id} group."""
+        self._queue(event)
+
+    async def job_updates(self, event):
+        """A batch of updates from an account_{id} / board_{id} group."""
+        for update in event.get("updates") or []:
+            self._queue(update)
+
+    def _queue(self, update):
+        job_id = update.get("job_id")
+        if not job_id:
+            return
+        update_id = update.get("update_id")
+        if update_id:
+            if update_id in self.recent_update_ids:
+                return
+            self.recent_update_ids.append(update_id)
+        merged = self.outbox.setdefault(job_id, {"job_id": job_id, "status": None, "logs": []})
+        if update.get("status") is not None:
+            merged["status"] = update["status"]
+        merged["logs"].extend(update.get("logs") or ([update["log"]] if update.get("log") else []))
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                settings.WS_BATCH_WINDOW, lambda: asyncio.ensure_future(self._flush())
+            )
+
+    async def _flush(self):
+        self.flush_handle = None
+        updates, self.outbox = list(self.outbox.values()), {}
+        if updates:
+            await self._send_json({"event": "job_updates", "updates": updates})
+
+    async def _send_json(self, data):
+        await self.send(text_data=json.dumps(data))
+
+    def _groups_for(self, command, authorize):
+        groups = set()
+        job_ids = command.get("job_ids") or []
+        if not isinstance(job_ids, list):
+            raise ValueError("job_ids must be a list")
+        for job_id in job_ids:
+            try:
+                groups.add(group_name(uuid.UUID(str(job_id))))
+            except ValueError:
+                raise ValueError(f"invalid job id: {job_id!r}")
+        for field, name in (("account_id", account_group_name), ("board_id", board_group_name)):
+            value = command.get(field)
+            if value is None:
+                continue
+            if not _STREAM_ID_RE.match(str(value)):
+                raise ValueError(f"invalid {field}: {value!r}")
+            if authorize and not self._may_stream(field, str(value), command.get("token")):
+                raise ValueError(f"not authorized for {field} {value!r}")
+            groups.add(name(value))
+        if not groups:
+            raise ValueError("nothing to subscribe to: give job_ids, account_id or board_id")
+        return groups
+
+    def _may_stream(self, field, value, token):
+        if self.internal:
+            return True
+        try:
+            account_id, board_ids = stream_tokens.grants(token)
+        except signing.BadSignature:
+            return False
+        return value == account_id if field == "account_id" else value in board_ids
+
+
+def _has_internal_secret(scope):
+    secret = settings.INTERNAL_API_SECRET
+    if not secret:
+        return True  # no secret configured: allow (e.g. dev), as for /api/
+    provided = dict(scope.get("headers") or []).get(b"x-internal-secret", b"")
+    return hmac.compare_digest(provided, secret.encode())
@@ -0,0 +1,83 @@
+"""
+Compiled cron expression cache.
+
+Parsing a cron string is most of the cost of croniter, and most jobs share a handful of
+expressions, so each distinct expression is parsed once per process and kept in a bounded
+LRU (CRON_CACHE_SIZE). next_runs() computes the next fire time once per expression for a
+whole batch of jobs.
+
+croniter is required for cron schedules: without it every function here raises
+ImproperlyConfigured rather than leaving scheduled_at empty, which would stop the jobs.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+try:
+    from croniter import croniter
+except ImportError:
+    croniter = None
+
+_lock = threading.Lock()
+_compiled = OrderedDict()  # expression -> croniter (stateful: only use under _lock)
+
+
+def _require_croniter():
+    if croniter is None:
+        raise ImproperlyConfigured("croniter is not installed; cron schedules need it")
+
+
+def _compile(expression):
+    """Cached croniter for expression; raises ValueError if it does not parse. Call under _lock."""
+    it = _compiled.get(expression)
+    if it is not None:
+        _compiled.move_to_end(expression)
+        return it
+    it = croniter(expression, timezone.now())
+    _compiled[expression] = it
+    if len(_compiled) > settings.CRON_CACHE_SIZE:
+        _compiled.popitem(last=False)
+    return it
+
+
+def validate(expression):
+    """Raise ValueError if expression is not a valid cron expression."""
+    _require_croniter()
+    if not isinstance(expression, str):
+        raise ValueError("cron expression must be a string")
+    with _lock:
+        _compile(expression)
+
+
+def next_run(expression, base=None):
+    """Next fire time after base (default now) as an aware datetime."""
+    _require_croniter()
+    base = base or timezone.now()
+    with _lock:
+        it = _compile(expression)
+        it.set_current(base, force=True)
+        run = it.get_next(timezone.datetime)
+    return timezone.make_aware(run) if timezone.is_naive(run) else run
+
+
+def next_runs(expressions, base=None):
+    """
+    {expression: next fire time after base} for every distinct expression, each computed once.
+    Expressions that do not parse map to None.
+    """
+    _require_croniter()
+    base = base or timezone.now()
+    runs = {}
+    for expression in set(expressions):
+        try:
+            runs[expression] = next_run(expression, base)
+        except (ValueError, TypeError):
+            runs[expression] = None
+    return runs
+
+
+def cache_info():
+    return {"size": len(_compiled), "max_size": settings.CRON_CACHE_SIZE}
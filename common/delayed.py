@@ -0,0 +1,81 @@
+"""
+Delayed run_job messages, held in Redis until they are due.
+
+Celery hands a message with an eta/countdown to a worker straight away, and the worker
+keeps it in memory until it is due, outside the prefetch limit. Far-future runs therefore
+pile up in worker RAM and are all redelivered when a worker restarts. Instead, a run_job
+message due DELAYED_MIN_SECONDS or more in the future is kept in one Redis sorted set,
+scored by its due time. This covers run_at / delay_from_now first runs, polling cycles,
+retries and rate-limit requeues. dispatch_delayed_jobs (common.tasks, beat every
+DELAYED_DISPATCH_INTERVAL seconds) publishes the due ones in batches of
+DELAYED_DISPATCH_BATCH, so workers only ever receive runnable messages. A run can
+therefore start up to DELAYED_DISPATCH_INTERVAL seconds late. Shorter waits still use a
+broker countdown.
+
+The set is as durable as the Redis holding it (enable AOF), like parking and the fair
+queue. If Redis is unavailable, hold() returns False and the caller publishes with a
+countdown as before.
+"""
+import json
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+from common.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+DELAYED_KEY = "delayed_jobs"  # sorted set: [job_id, apply_async options] JSON -> due at (epoch seconds)
+
+# KEYS: delayed set; ARGV: now, max messages. Returns the due messages, removed from the set.
+POP_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+_pop_due = redis_client.register_script(POP_DUE_LUA)
+
+
+def wants(delay):
+    """Whether a run delay seconds from now should be held here rather than sent with a countdown."""
+    return settings.DELAYED_STORE_ENABLED and delay >= settings.DELAYED_MIN_SECONDS
+
+
+def hold(entries):
+    """
+    Keep run_job messages until they are due. entries: (job_id, due at in epoch seconds,
+    JSON-serializable apply_async options without eta/countdown). Returns False if Redis is
+    unavailable, in which case nothing was held.
+    """
+    mapping = {_message(job_id, options): due_at for job_id, due_at, options in entries}
+    try:
+        redis_client.zadd(DELAYED_KEY, mapping)
+    except redis.RedisError:
+        logger.warning("delayed job store unavailable; publishing %d runs with a countdown", len(entries))
+        return False
+    return True
+
+
+def pop_due(limit, now=None):
+    """Up to limit messages that are due, removed from the store: [(job_id, options)]."""
+    messages = _pop_due(keys=[DELAYED_KEY], args=[now or time.time(), limit], client=redis_client)
+    return [tuple(json.loads(m)) for m in messages]
+
+
+def restore(entries):
+    """Put popped messages back, due now (their publish failed)."""
+    now = time.time()
+    redis_client.zadd(DELAYED_KEY, {_message(job_id, options): now for job_id, options in entries})
+
+
+def pending():
+    return redis_client.zcard(DELAYED_KEY)
+
+
+def _message(job_id, options):
+    return json.dumps([str(job_id), options], sort_keys=True)
@@ -0,0 +1,177 @@
+"""
+Fair-share dispatch of new jobs across accounts.
+
+The broker queues are FIFO, so an account that submits 20k jobs at once would occupy every
+worker until they are done. Instead, a job's first run_job message is held in Redis, in one
+list per flow (job queue + app_name + account_id). dispatch_fair_queue (common.tasks) moves
+messages to the broker only while the broker queue holds fewer than FAIR_QUEUE_TARGET_DEPTH
+messages, and it picks them by deficit round-robin over the flows. Each time a flow comes
+up it is credited FAIR_QUANTUM × its app's weight (FAIR_APP_WEIGHTS, default 1) and sends
+that many jobs. A busy account therefore gets the same share as every other waiting
+account, and a newly arriving account waits at most one round.
+
+dispatch_fair_queue is kicked (at most once per FAIR_KICK_INTERVAL) when jobs are held and
+re-kicks itself while any are left, so queues are refilled about every FAIR_KICK_INTERVAL
+as workers drain them; FAIR_QUEUE_TARGET_DEPTH should cover what the workers of a queue
+finish in that time. Beat also runs it every FAIR_DISPATCH_INTERVAL seconds as a backstop.
+Retries, polling cycles, cron runs and jobs with an eta go to the broker (those due later
+through common.delayed).
+
+hold() runs on the create path, so it uses the fail-fast Redis client and, after a Redis
+error, skips Redis for FAIR_HOLD_BACKOFF_SECONDS: creates publish directly meanwhile.
+"""
+import json
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+from common.redis_client import fast_redis_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUES_KEY = "fair_queues"  # job queues that have held messages
+
+
+def _active_key(queue):
+    return f"fair_active:{queue}"  # list of flows with messages, in round-robin order
+
+
+def _deficit_key(queue):
+    return f"fair_deficit:{queue}"  # hash: flow -> unspent credit
+
+
+def flow_key(queue, app_name, account_id):
+    return f"fair_flow:{queue}:{app_name}:{account_id}"
+
+
+# KEYS: active list, deficit hash; ARGV: max messages, {app_name: credit per round} JSON,
+# default credit per round, max rounds per flow. Each flow's messages are in the list named
+# by the flow (so, like parking, this assumes a single Redis rather than a cluster).
+# Returns the popped messages in dispatch order.
+DRR_POP_LUA = """
+local budget = tonumber(ARGV[1])
+local quantum = cjson.decode(ARGV[2])  -- app_name -> credit per round
+local default_quantum = tonumber(ARGV[3])
+local out = {}
+local rounds = redis.call('LLEN', KEYS[1]) * tonumber(ARGV[4])
+while budget > 0 and rounds > 0 do
+    rounds = rounds - 1
+    local flow = redis.call('LPOP', KEYS[1])
+    if not flow then
+        break
+    end
+    local app = string.match(flow, '^fair_flow:[^:]*:([^:]*):')
+    local deficit = tonumber(redis.call('HGET', KEYS[2], flow) or '0') + (quantum[app] or default_quantum)
+    local take = math.min(math.floor(deficit), budget)
+    local sent = 0
+    while sent < take do
+        local message = redis.call('LPOP', flow)
+        if not message then
+            break
+        end
+        out[#out + 1] = message
+        sent = sent + 1
+    end
+    budget = budget - sent
+    if redis.call('LLEN', flow) == 0 then
+        redis.call('HDEL', KEYS[2], flow)  -- an idle flow keeps no credit
+    else
+        redis.call('HSET', KEYS[2], flow, tostring(deficit - sent))
+        redis.call('RPUSH', KEYS[1], flow)
+    end
+end
+return out
+"""
+
+# KEYS: flow list, active list, queues set; ARGV: queue, messages...
+PUSH_LUA = """
+if redis.call('LLEN', KEYS[1]) == 0 then
+    redis.call('RPUSH', KEYS[2], KEYS[1])
+end
+for i = 2, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+redis.call('SADD', KEYS[3], ARGV[1])
+return #ARGV - 1
+"""
+
+_pop = redis_client.register_script(DRR_POP_LUA)
+_push = redis_client.register_script(PUSH_LUA)
+
+
+_hold_skip_until = 0.0  # time.monotonic() before which hold() does not try Redis
+
+
+def enabled():
+    return settings.FAIR_DISPATCH_ENABLED
+
+
+def hold(entries):
+    """
+    Queue first-run messages for fair dispatch. entries: (job_id, app_name, account_id,
+    apply_async options with "queue"). Returns False if Redis is unavailable, in which case
+    the caller publishes them directly.
+    """
+    global _hold_skip_until
+    if time.monotonic() < _hold_skip_until:
+        return False
+    flows = {}
+    for job_id, app_name, account_id, options in entries:
+        key = flow_key(options["queue"], app_name, account_id)
+        flows.setdefault((options["queue"], key), []).append(json.dumps([str(job_id), options]))
+    try:
+        for (queue, key), messages in flows.items():
+            _push(keys=[key, _active_key(queue), QUEUES_KEY], args=[queue, *messages], client=fast_redis_client)
+    except redis.RedisError:
+        _hold_skip_until = time.monotonic() + settings.FAIR_HOLD_BACKOFF_SECONDS
+        logger.warning(
+            "fair queue unavailable; publishing %d jobs directly for the next %ss",
+            len(entries), settings.FAIR_HOLD_BACKOFF_SECONDS,
+        )
+        return False
+    return True
+
+
+def should_kick():
+    """True at most once per FAIR_KICK_INTERVAL: whether to publish dispatch_fair_queue now."""
+    try:
+        return bool(fast_redis_client.set("fair_kick", 1, nx=True, px=int(settings.FAIR_KICK_INTERVAL * 1000)))
+    except redis.RedisError:
+        return False
+
+
+def queues():
+    """Job queues that may have held messages."""
+    return sorted(q.decode() for q in redis_client.smembers(QUEUES_KEY))
+
+
+def pop(queue, budget):
+    """Up to budget held messages for queue in deficit round-robin order: [(job_id, options)]."""
+    if budget <= 0:
+        return []
+    messages = _pop(
+        keys=[_active_key(queue), _deficit_key(queue)],
+        args=[
+            budget,
+            json.dumps({app: settings.FAIR_QUANTUM * w for app, w in settings.FAIR_APP_WEIGHTS.items()}),
+            settings.FAIR_QUANTUM,
+            settings.FAIR_MAX_ROUNDS,
+        ],
+        client=redis_client,
+    )
+    return [tuple(json.loads(m)) for m in messages]
+
+
+def has_pending(queue):
+    return redis_client.llen(_active_key(queue)) > 0
+
+
+def pending(queue):
+    """{flow: held messages} for one job queue."""
+    flows = [f.decode() for f in redis_client.lrange(_active_key(queue), 0, -1)]
+    pipe = redis_client.pipeline(transaction=False)
+    for flow in flows:
+        pipe.llen(flow)
+    return dict(zip(flows, pipe.execute()))
@@ -0,0 +1,199 @@
+"""
+Pooled, keep-alive HTTP client for job callbacks.
+
+One requests.Session per callback host per worker process, so repeated callbacks to
+NODE_SERVER_URL reuse TCP/TLS connections instead of handshaking on every attempt.
+Sessions are shared between threads (-P threads); urllib3 pools are thread-safe.
+
+Callers post with stream=True and read the body through read_body(), which stops at
+CALLBACK_MAX_RESPONSE_BYTES and CALLBACK_PARSE_TIMEOUT instead of buffering whatever the
+endpoint sends; loads() uses ujson when it is installed.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+try:
+    import ujson as _json
+except ImportError:
+    import json as _json
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(requests.RequestException):
+    """The callback response body is larger than CALLBACK_MAX_RESPONSE_BYTES (a permanent failure)."""
+
+    def __init__(self, url, limit):
+        super().__init__(f"callback response from {url} is larger than {limit} bytes (CALLBACK_MAX_RESPONSE_BYTES)")
+
+_lock = threading.Lock()
+_sessions = {}  # host key -> Session
+_pid = None
+_timeouts = (None, {})  # (CALLBACK_HOST_TIMEOUTS it was built from, entries by host_key)
+
+
+def host_key(url):
+    """scheme://host:port of url: the key callback pools and circuit breakers are kept under."""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.CALLBACK_POOL_MAXSIZE,
+        pool_block=settings.CALLBACK_POOL_BLOCK,
+        max_retries=0,  # retries are run_job's job, with backoff and logging
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Connection"] = "keep-alive" if settings.CALLBACK_KEEP_ALIVE else "close"
+    return session
+
+
+def get_session(url):
+    """Return the pooled Session for url's host, creating it on first use in this process."""
+    global _pid
+    key = host_key(url)
+    session = _sessions.get(key)
+    if session is not None and _pid == os.getpid():
+        return session
+    with _lock:
+        if _pid != os.getpid():
+            # Forked (prefork pool): sockets inherited from the parent must not be shared.
+            _sessions.clear()
+            _pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session()
+    return session
+
+
+def get_timeout(url):
+    """(connect, read) timeout for url's host: CALLBACK_HOST_TIMEOUTS entry, else the defaults."""
+    override = _host_timeouts().get(host_key(url)) or {}
+    return (
+        override.get("connect", settings.CALLBACK_CONNECT_TIMEOUT),
+        override.get("read", settings.CALLBACK_READ_TIMEOUT),
+    )
+
+
+def _host_timeouts():
+    """
+    CALLBACK_HOST_TIMEOUTS keyed by host_key(). An entry may name a scheme
+    ("https://api.example.com", the port defaulting to the scheme's) or be a bare
+    "host[:port]", which covers http and https (each on its default port when none is given).
+    Entries with a scheme win over bare ones.
+    """
+    global _timeouts
+    configured = settings.CALLBACK_HOST_TIMEOUTS
+    if _timeouts[0] is not configured:
+        normalised = {}
+        for key in sorted(configured, key=lambda k: "://" in k):
+            if "://" in key:
+                normalised[host_key(key)] = configured[key]
+                continue
+            parts = urlsplit(f"//{key}")
+            for scheme in ("http", "https"):
+                normalised[host_key(f"{scheme}://{parts.netloc}")] = configured[key]
+        _timeouts = (configured, normalised)
+    return _timeouts[1]
+
+
+def post(url, **kwargs):
+    """requests.post through the host's pooled session, with the host's timeouts unless given."""
+    kwargs.setdefault("timeout", get_timeout(url))
+    return get_session(url).post(url, **kwargs)
+
+
+def body_kwargs(body):
+    """post() kwargs for a callback body: json= for a dict, data= (chunked) for a streamed body."""
+    if isinstance(body, dict):
+        return {"json": body}
+    return {"data": iter(body)}
+
+
+def read_body(resp):
+    """
+    The body of a stream=True response, read in chunks. Raises ResponseTooLarge past
+    CALLBACK_MAX_RESPONSE_BYTES and requests.Timeout past CALLBACK_PARSE_TIMEOUT.
+    """
+    limit = settings.CALLBACK_MAX_RESPONSE_BYTES
+    deadline = time.monotonic() + settings.CALLBACK_PARSE_TIMEOUT
+    length = resp.headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > limit:
+        resp.close()
+        raise ResponseTooLarge(resp.url, limit)
+    chunks, size = [], 0
+    for chunk in resp.iter_content(CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            resp.close()
+            raise ResponseTooLarge(resp.url, limit)
+        if time.monotonic() > deadline:
+            resp.close()
+            raise requests.Timeout(f"reading the callback response from {resp.url} took too long")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def discard_body(resp):
+    """Read and drop a body nobody needs (keeps the connection reusable); never raises."""
+    try:
+        read_body(resp)
+    except requests.RequestException:
+        pass  # connection closed; the callback itself already succeeded
+
+
+def dumps(value):
+    return _json.dumps(value)
+
+
+def loads(raw):
+    """Parsed JSON callback response, or {} if it does not parse (as before)."""
+    try:
+        return _json.loads(raw)
+    except ValueError:
+        return {}
+
+
+def pool_stats():
+    """
+    Per-host connection reuse for this process:
+    {host: {"requests": n, "connections": n, "reused": n}}.
+    """
+    stats = {}
+    with _lock:
+        sessions = list(_sessions.items())
+    for key, session in sessions:
+        adapter = session.get_adapter(key)
+        requests_made = connections = 0
+        for pool_key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(pool_key)
+            if pool is None:
+                continue
+            requests_made += pool.num_requests
+            connections += pool.num_connections
+        stats[key] = {
+            "requests": requests_made,
+            "connections": connections,
+            "reused": max(requests_made - connections, 0),
+        }
+    return stats
+
+
+def close_all():
+    """Close every pooled session (worker shutdown)."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
@@ -0,0 +1,95 @@
+"""
+Client idempotency keys for job creation.
+
+A create request may carry an Idempotency-Key header (or an "idempotency_key" field). The
+key is stored on the Job, unique per app_name, and a second request with the same key gets
+the original job id back instead of a new job. Lookups hit Redis first (idem:<app>:<key> ->
+job id, SET with the key's remaining lifetime), so a replay costs one GET and no DB insert;
+on a miss or a Redis error they fall back to the DB. lookup_many() does the same for a whole
+bulk request with one MGET and one query.
+
+Keys are honoured for IDEMPOTENCY_KEY_TTL seconds after the job was created. After that the
+Redis entry has expired, and the next lookup that finds the old job in the DB clears its key
+so the key can be used again.
+"""
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from common.models import Job
+from common.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateJob(Exception):
+    """The idempotency key of a new job already belongs to job_id."""
+
+    def __init__(self, job_id):
+        super().__init__(job_id)
+        self.job_id = job_id
+
+
+def _key(app_name, idempotency_key):
+    return f"idem:{app_name}:{idempotency_key}"
+
+
+def lookup(app_name, idempotency_key):
+    """Id of the live job holding this key for app_name, or None."""
+    return lookup_many([(app_name, idempotency_key)]).get((app_name, idempotency_key))
+
+
+def lookup_many(keys):
+    """{(app_name, idempotency_key): id of the live job holding it} for those of keys that are taken."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    try:
+        cached = redis_client.mget([_key(*key) for key in keys])
+    except redis.RedisError:
+        cached = [None] * len(keys)
+    found = {key: job_id.decode() for key, job_id in zip(keys, cached) if job_id is not None}
+    missing = {}
+    for app_name, idempotency_key in keys:
+        if (app_name, idempotency_key) not in found:
+            missing.setdefault(app_name, []).append(idempotency_key)
+    if not missing:
+        return found
+
+    query = Q()
+    for app_name, idempotency_keys in missing.items():
+        query |= Q(app_name=app_name, idempotency_key__in=idempotency_keys)
+    now = timezone.now()
+    live = []
+    for job_id, app_name, idempotency_key, created_at in Job.objects.filter(query).values_list(
+        "id", "app_name", "idempotency_key", "created_at"
+    ):
+        remaining = settings.IDEMPOTENCY_KEY_TTL - (now - created_at).total_seconds()
+        if remaining <= 0:
+            Job.objects.filter(id=job_id, idempotency_key=idempotency_key).update(idempotency_key=None)
+            continue
+        live.append((app_name, idempotency_key, job_id, remaining))
+        found[(app_name, idempotency_key)] = str(job_id)
+    if live:
+        _set(live)
+    return found
+
+
+def remember(jobs):
+    """Cache the keys of newly inserted jobs."""
+    ttl = settings.IDEMPOTENCY_KEY_TTL
+    _set((job.app_name, job.idempotency_key, job.id, ttl) for job in jobs if job.idempotency_key)
+
+
+def _set(entries):
+    pipe = redis_client.pipeline(transaction=False)
+    for app_name, idempotency_key, job_id, ttl in entries:
+        pipe.set(_key(app_name, idempotency_key), str(job_id), ex=max(1, int(ttl)))
+    try:
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("idempotency cache unavailable; replays will be answered from the DB")
+
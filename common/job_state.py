@@ -0,0 +1,101 @@
+"""
+Job state machine.
+
+Every status change goes through transition(): the allowed edges are checked up front, and
+the change is applied as a conditional UPDATE ... WHERE status IN (...). The event's JobLog
+row is recorded only if that UPDATE won, through common.joblog_sink, stamped with the
+transition's updated_at. With JOBLOG_BUFFER_ENABLED (the default) the row is handed to the
+buffer once the transaction commits (so a full buffer never flushes inside it), and a status
+change can outlive its log row if the worker dies before the buffer is flushed; with it off
+the row is written in the same transaction. If another writer (e.g. a second
+delivery of the same run_job message) moved the job first, nothing is written and
+transition() returns False.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from common import joblog_sink, status_cache
+from common.channel_utils import publish_job_update
+from common.models import Job, JobStatus
+
+ALLOWED_TRANSITIONS = {
+    JobStatus.PENDING: {JobStatus.QUEUED, JobStatus.CANCELLED},
+    JobStatus.QUEUED: {JobStatus.RUNNING, JobStatus.PAUSED_RATE_LIMITED, JobStatus.CANCELLED},
+    JobStatus.RUNNING: {
+        JobStatus.COMPLETED,
+        JobStatus.FAILED,
+        JobStatus.QUEUED,  # retry scheduled, polling/cron rescheduled
+        JobStatus.PAUSED_RATE_LIMITED,
+        JobStatus.CANCELLED,
+    },
+    JobStatus.PAUSED_RATE_LIMITED: {JobStatus.RUNNING, JobStatus.QUEUED, JobStatus.CANCELLED},
+    JobStatus.COMPLETED: set(),
+    JobStatus.FAILED: set(),
+    JobStatus.CANCELLED: set(),
+}
+
+# Statuses run_job may claim a job from. A job whose worker died while it was RUNNING is
+# moved back by common.tasks.recover_stuck_jobs.
+RUNNABLE_STATUSES = (JobStatus.QUEUED, JobStatus.PAUSED_RATE_LIMITED)
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def check_transition(from_status, to_status):
+    if to_status not in ALLOWED_TRANSITIONS.get(from_status, ()):
+        raise InvalidTransition(f"job cannot move from {from_status} to {to_status}")
+
+
+def transition(job, to_status, from_statuses=None, log=None, fields=None, publish=True, where=None):
+    """
+    Move job to to_status if its current DB status is one of from_statuses (default: job.status).
+
+    log: JobLog field values for the event (event_type, idempotency_key, attempt_number,
+    error_type, metadata), recorded via the JobLog sink; an existing row with the same
+    idempotency_key is left as is. A buffered row is not atomic with the UPDATE (see above).
+    fields: extra Job columns to write in the same UPDATE.
+    where: extra lookups the row must also match (e.g. {"updated_at__lt": cutoff}).
+    On success the in-memory job is updated, one job_update is published and True is returned.
+    """
+    from_statuses = tuple(from_statuses or (job.status,))
+    for from_status in from_statuses:
+        check_transition(from_status, to_status)
+
+    updates = {"status": to_status, "updated_at": timezone.now(), **(fields or {})}
+    with transaction.atomic():
+        changed = Job.objects.filter(id=job.id, status__in=from_statuses, **(where or {})).update(**updates)
+        if changed and log:
+            event = {**log, "created_at": updates["updated_at"]}
+            if settings.JOBLOG_BUFFER_ENABLED:
+                transaction.on_commit(lambda: joblog_sink.record(job.id, **event))
+            else:
+                joblog_sink.record(job.id, **event)
+    if not changed:
+        return False
+
+    for name, value in updates.items():
+        setattr(job, name, value)
+    status_cache.record_transition(job.id, to_status, log, created_at=updates["updated_at"])
+    if publish:
+        publish_job_update(
+            str(job.id),
+            status=to_status,
+            log=log_message(log, updates["updated_at"]),
+            account_id=job.account_id,
+            board_id=job.board_id,
+        )
+    return True
+
+
+def log_message(log, created_at=None):
+    """The job_update 'log' payload for a JobLog event, or None."""
+    if not log:
+        return None
+    return {
+        "event_type": log["event_type"],
+        "metadata": None,
+        "created_at": (created_at or timezone.now()).isoformat(),
+    }
@@ -0,0 +1,181 @@
+"""
+Buffered JobLog writer.
+
+Job events are collected per worker process and written with one bulk INSERT OR IGNORE
+instead of a SELECT + INSERT per event. The buffer is flushed when it holds
+JOBLOG_BUFFER_MAX_SIZE events, when its oldest event is JOBLOG_BUFFER_MAX_DELAY seconds
+old (checked by a background thread), after every Celery task and on worker shutdown. Each
+row carries the time record() was called, not the time it was flushed.
+
+A failed write puts its events back at the front of the buffer and the next flush retries
+them, no sooner than JOBLOG_BUFFER_RETRY_SECONDS later. While the database stays down the
+buffer keeps at most JOBLOG_BUFFER_MAX_PENDING events; the oldest beyond that are dropped
+(counted in jobserver_joblog_dropped).
+
+idempotency_key dedup is unchanged: duplicates inside the buffer keep the first event and
+duplicates of rows already in the DB are ignored by the unique index. Because the row is
+written after job_state.transition() commits, a status change and its JobLog row are not
+atomic: events buffered when a worker is killed outright, or dropped at the cap, are lost.
+Set JOBLOG_BUFFER_ENABLED=0 to write them in the transition's transaction instead.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+
+from common import metrics
+from common.models import Job, JobLog
+
+logger = logging.getLogger(__name__)
+
+
+class JobLogBuffer:
+    def __init__(self, max_size=None, max_delay=None, enabled=None, max_pending=None, retry_seconds=None):
+        self.max_size = max_size if max_size is not None else settings.JOBLOG_BUFFER_MAX_SIZE
+        self.max_delay = max_delay if max_delay is not None else settings.JOBLOG_BUFFER_MAX_DELAY
+        self.enabled = enabled if enabled is not None else settings.JOBLOG_BUFFER_ENABLED
+        self.max_pending = max_pending if max_pending is not None else settings.JOBLOG_BUFFER_MAX_PENDING
+        self.retry_seconds = retry_seconds if retry_seconds is not None else settings.JOBLOG_BUFFER_RETRY_SECONDS
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events = {}  # idempotency_key (or a unique placeholder) -> JobLog
+        self._first_at = None
+        self._retry_at = 0.0  # monotonic time before which a failed write is not retried
+        self._pid = None
+
+    def record(self, job_id, **fields):
+        """
+        Queue one JobLog row (job_id plus JobLog field values; created_at defaults to now).
+        May flush synchronously, so call it outside the caller's transaction.
+        """
+        fields.setdefault("created_at", timezone.now())
+        event = JobLog(job_id=job_id, **fields)
+        if not self.enabled:
+            self._write([event])
+            return
+        self._ensure_flusher()
+        with self._lock:
+            key = event.idempotency_key or object()
+            self._events.setdefault(key, event)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            full = len(self._events) >= self.max_size
+        if full and time.monotonic() >= self._retry_at:
+            try:
+                self.flush()
+            except Exception:
+                # The events are buffered again; the caller's transition already committed.
+                logger.exception("JobLog buffer flush failed")
+
+    def flush_if_due(self):
+        first_at = self._first_at
+        now = time.monotonic()
+        if first_at is not None and now - first_at >= self.max_delay and now >= self._retry_at:
+            self.flush()
+
+    def flush(self):
+        """
+        Write everything buffered so far. Returns the number of events handed to the DB.
+        If the write fails the events are put back for the next flush and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events.values())
+                first_at = self._first_at
+                self._events = {}
+                self._first_at = None
+            if not events:
+                return 0
+            try:
+                self._write(events)
+            except Exception:
+                self._requeue(events, first_at)
+                raise
+            self._retry_at = 0.0
+            return len(events)
+
+    def pending(self):
+        return len(self._events)
+
+    def _requeue(self, events, first_at):
+        with self._lock:
+            merged = {(e.idempotency_key or object()): e for e in events}
+            for key, event in self._events.items():  # recorded during the failed write
+                merged.setdefault(key, event)
+            dropped = len(merged) - self.max_pending
+            if dropped > 0:
+                for key in list(merged)[:dropped]:
+                    del merged[key]
+                metrics.JOBLOG_DROPPED.inc(dropped)
+                logger.error("JobLog buffer over %d events; dropped the %d oldest", self.max_pending, dropped)
+            self._events = merged
+            self._first_at = first_at if self._first_at is None else min(first_at, self._first_at)
+            self._retry_at = time.monotonic() + self.retry_seconds
+
+    def _write(self, events):
+        metrics.JOBLOG_ROWS.inc(len(events))
+        with metrics.timed(metrics.JOBLOG_WRITE):
+            self._bulk_create(events)
+
+    def _bulk_create(self, events):
+        try:
+            JobLog.objects.bulk_create(events, ignore_conflicts=True, batch_size=500)
+        except IntegrityError:
+            # A job was deleted while its events sat in the buffer; drop only those.
+            live = set(Job.objects.filter(id__in={e.job_id for e in events}).values_list("id", flat=True))
+            JobLog.objects.bulk_create(
+                [e for e in events if e.job_id in live],
+                ignore_conflicts=True,
+                batch_size=500,
+            )
+
+    def _ensure_flusher(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Inherited from a parent process (prefork): those events are the parent's to write.
+            self._events = {}
+            self._first_at = None
+            threading.Thread(target=self._run_flusher, name="joblog-flusher", daemon=True).start()
+
+    def _run_flusher(self):
+        interval = max(self.max_delay / 2, 0.05)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush_if_due()
+            except Exception:
+                logger.exception("JobLog buffer flush failed")
+            finally:
+                close_old_connections()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    """The process-wide JobLogBuffer."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = JobLogBuffer()
+    return _sink
+
+
+def record(job_id, **fields):
+    get_sink().record(job_id, **fields)
+
+
+def flush():
+    if _sink is not None:
+        return _sink.flush()
+    return 0
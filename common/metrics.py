@@ -0,0 +1,239 @@
+"""
+In-process counters and histograms, rendered in the Prometheus text format.
+
+Each process keeps its own values: the web process serves them on GET /metrics, and each
+Celery worker process serves its own on the first free port from METRICS_WORKER_PORT (see
+serve(), started from common.tasks). Recording is a perf_counter() pair, a bisect and a dict
+update under one lock; with METRICS_ENABLED off every recording call returns at once.
+
+Both endpoints only answer scrapers allowed by scrape_allowed() (METRICS_ALLOWED_IPS or the
+internal secret).
+
+run_job is timed per phase (load, claim, rate_limit, callback, complete, failure) and
+counted per outcome, labelled by app_name and task_type; cron ticks, JobLog writes,
+job_update publishing and API requests have their own metrics below.
+"""
+import bisect
+import hmac
+import ipaddress
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_registry = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # label values tuple -> value
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key, extra=""):
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield f"{self.name}_total{self._labels(key)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # one count per bucket (not cumulative) plus +Inf, then the sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        for key, counts in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = self._labels(key, 'le="%s"' % le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_number(counts[-1])}"
+            yield f"{self.name}_count{self._labels(key)} {cumulative}"
+
+
+RUN_JOB_PHASE = Histogram(
+    "jobserver_run_job_phase_seconds",
+    "Time spent in each phase of run_job.",
+    ["app_name", "task_type", "phase"],
+)
+RUN_JOB_OUTCOMES = Counter(
+    "jobserver_run_job",
+    "run_job executions by outcome.",
+    ["app_name", "task_type", "outcome"],
+)
+JOBS_CREATED = Counter(
+    "jobserver_jobs_created",
+    "Job create requests by outcome (created, replayed, rejected).",
+    ["app_name", "task_type", "outcome"],
+)
+HTTP_REQUESTS = Histogram(
+    "jobserver_http_request_seconds",
+    "API request duration.",
+    ["view", "method", "status"],
+)
+JOBLOG_WRITE = Histogram("jobserver_joblog_write_seconds", "Duration of one JobLog bulk write.")
+JOBLOG_ROWS = Counter("jobserver_joblog_rows", "JobLog rows handed to the database.")
+CRON_TICK = Histogram("jobserver_cron_tick_seconds", "Duration of one enqueue_due_cron_jobs tick.")
+CRON_ENQUEUED = Counter("jobserver_cron_enqueued", "Cron jobs enqueued by enqueue_due_cron_jobs.")
+CRON_UNSCHEDULED = Counter(
+    "jobserver_cron_unscheduled",
+    "Due cron jobs unscheduled because their expression has no next run.",
+)
+JOBLOG_DROPPED = Counter("jobserver_joblog_dropped", "Buffered JobLog rows dropped after failed writes.")
+JOB_UPDATE_PUBLISH = Histogram(
+    "jobserver_job_update_publish_seconds",
+    "Duration of one coalesced job_update flush to the channel layer.",
+)
+JOB_UPDATES_PUBLISHED = Counter("jobserver_job_updates_published", "Job updates flushed to the channel layer.")
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the duration of the block (also when it raises)."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def phase(job, name):
+    """Time a run_job phase for job."""
+    return timed(RUN_JOB_PHASE, app_name=job.app_name, task_type=job.task_type, phase=name)
+
+
+def observe_phase(job, name, started):
+    """Record a run_job phase that began at time.perf_counter() value started."""
+    RUN_JOB_PHASE.observe(time.perf_counter() - started, app_name=job.app_name, task_type=job.task_type, phase=name)
+
+
+def outcome(job, name):
+    RUN_JOB_OUTCOMES.inc(app_name=job.app_name, task_type=job.task_type, outcome=name)
+
+
+def render():
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def scrape_allowed(remote_addr, headers):
+    """
+    Whether a scrape from remote_addr with these request headers may read the metrics: its
+    address is in METRICS_ALLOWED_IPS or it sends INTERNAL_API_SECRET as X-Internal-Secret or
+    a bearer token. With neither setting configured everyone may, as for /api/.
+    """
+    secret = settings.INTERNAL_API_SECRET
+    networks = settings.METRICS_ALLOWED_IPS
+    if not secret and not networks:
+        return True
+    if secret:
+        provided = headers.get("X-Internal-Secret") or ""
+        authorization = headers.get("Authorization") or ""
+        if not provided and authorization.startswith("Bearer "):
+            provided = authorization[len("Bearer "):]
+        if hmac.compare_digest(provided.encode(), secret.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(remote_addr or "")
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in networks)
+
+
+def serve(port, attempts=64):
+    """
+    Serve render() over HTTP from a daemon thread on the first free port in
+    [port, port + attempts) (one per worker process). Returns the port, or None.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not scrape_allowed(self.client_address[0], self.headers):
+                self.send_error(403)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    for candidate in range(port, port + attempts):
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", candidate), Handler)
+        except OSError:
+            continue
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info("serving metrics on port %d", candidate)
+        return candidate
+    logger.warning("no free metrics port in %d-%d", port, port + attempts - 1)
+    return None
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
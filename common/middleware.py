@@ -1,7 +1,9 @@
 import os
+import time
 from django.conf import settings
 from django.http import HttpResponse
 from django.utils.deprecation import MiddlewareMixin
+from common import metrics
 
 
 class InternalApiSecretMiddleware(MiddlewareMixin):
@@ -16,4 +18,25 @@ class InternalApiSecretMiddleware(MiddlewareMixin):
         provided = request.headers.get("X-Internal-Secret", "")
         if provided != secret:
             return HttpResponse("Unauthorized", status=401)
-        return None
\ No newline at end of file
+        return None
+
+
+class MetricsMiddleware:
+    """Time /api/ requests into jobserver_http_request_seconds, labelled by URL name, method and status."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED or not request.path.startswith("/api/"):
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        metrics.HTTP_REQUESTS.observe(
+            time.perf_counter() - started,
+            view=match.url_name if match else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+        return response
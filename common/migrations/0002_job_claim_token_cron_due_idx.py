@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('schedule_type', 'cron'), ('status', 'queued')), fields=['scheduled_at', 'cron_expression', 'id'], name='jobs_cron_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_job_claim_token_cron_due_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='payload_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
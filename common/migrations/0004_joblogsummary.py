@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_job_payload_ref'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobLogSummary',
+            fields=[
+                ('job', models.OneToOneField(db_column='job_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='log_summary', serialize=False, to='common.job')),
+                ('event_counts', models.JSONField(default=dict)),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('last_error', models.JSONField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'job_log_summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_joblogsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedJob',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('app_name', models.CharField(max_length=255)),
+                ('account_id', models.CharField(max_length=255)),
+                ('board_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('task_type', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('paused_rate_limited', 'Paused (rate limited)')], max_length=32)),
+                ('schedule_type', models.CharField(choices=[('immediate', 'Immediate'), ('run_at', 'Run at'), ('cron', 'Cron'), ('delay_from_now', 'Delay from now'), ('polling', 'Polling')], max_length=32)),
+                ('scheduled_at', models.DateTimeField(blank=True, null=True)),
+                ('cron_expression', models.CharField(blank=True, max_length=255, null=True)),
+                ('polling_interval', models.PositiveIntegerField(blank=True, null=True)),
+                ('polling_state', models.JSONField(blank=True, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('payload_ref', models.CharField(blank=True, max_length=64, null=True)),
+                ('log_summary', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_column='user_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='common.appuser')),
+            ],
+            options={
+                'db_table': 'jobs_archive',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedJobLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(max_length=255)),
+                ('attempt_number', models.PositiveIntegerField(blank=True, null=True)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('error_type', models.CharField(blank=True, choices=[('transient', 'Transient'), ('permanent', 'Permanent')], max_length=32, null=True)),
+                ('metadata', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('job', models.ForeignKey(db_column='job_id', on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='common.archivedjob')),
+            ],
+            options={
+                'db_table': 'job_logs_archive',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedjob',
+            index=models.Index(fields=['account_id'], name='jobs_archive_account_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedjoblog',
+            index=models.Index(fields=['job', 'created_at'], name='job_logs_archive_job_idx'),
+        ),
+    ]
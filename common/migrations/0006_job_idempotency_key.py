@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0005_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('app_name', 'idempotency_key'), name='jobs_app_idempotency_key_uniq'),
+        ),
+    ]
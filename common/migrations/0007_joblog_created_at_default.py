@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0006_job_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='joblog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
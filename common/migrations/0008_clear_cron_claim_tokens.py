@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def clear_claim_tokens(apps, schema_editor):
+    # Tokens used to stay after the run finished; enqueue_due_cron_jobs now skips jobs that
+    # carry one, so clear them or those jobs would wait out CRON_CLAIM_TIMEOUT.
+    Job = apps.get_model("common", "Job")
+    Job.objects.filter(schedule_type="cron", status="queued", claim_token__isnull=False).update(claim_token=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0007_joblog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_claim_tokens, migrations.RunPython.noop),
+    ]
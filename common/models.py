@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 
 
 class AppUser(models.Model):
@@ -64,6 +65,9 @@ class Job(models.Model):
     polling_interval = models.PositiveIntegerField(null=True, blank=True)  # seconds
     polling_state = models.JSONField(null=True, blank=True)
     payload = models.JSONField(default=dict)
+    payload_ref = models.CharField(max_length=64, null=True, blank=True)  # data in common.payload_store
+    claim_token = models.CharField(max_length=64, null=True, blank=True)  # cron tick whose run is in flight
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)  # client-supplied, per app
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -73,6 +77,19 @@ class Job(models.Model):
             models.Index(fields=["app_name", "status"], name="jobs_app_status_idx"),
             models.Index(fields=["scheduled_at", "status"], name="jobs_scheduled_status_idx"),
             models.Index(fields=["account_id"], name="jobs_account_id_idx"),
+            # Partial index for enqueue_due_cron_jobs; covers the (id, cron_expression) it reads.
+            models.Index(
+                fields=["scheduled_at", "cron_expression", "id"],
+                name="jobs_cron_due_idx",
+                condition=models.Q(schedule_type="cron", status="queued"),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["app_name", "idempotency_key"],
+                name="jobs_app_idempotency_key_uniq",
+                condition=models.Q(idempotency_key__isnull=False),
+            ),
         ]
 
 
@@ -99,10 +116,86 @@ class JobLog(models.Model):
         choices=JobLogErrorType.choices,
     )
     metadata = models.JSONField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # When the event happened; set by the caller, since buffered rows are inserted later.
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = "job_logs"
         indexes = [
             models.Index(fields=["job", "created_at"], name="job_logs_job_created_idx"),
-        ]
\ No newline at end of file
+        ]
+
+
+class JobLogSummary(models.Model):
+    """job_log_summaries: rollup of a job's JobLog rows deleted by retention (common.retention)."""
+    job = models.OneToOneField(
+        "common.Job",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="log_summary",
+        db_column="job_id",
+    )
+    event_counts = models.JSONField(default=dict)  # event_type -> rows rolled up
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    last_error = models.JSONField(null=True, blank=True)  # latest rolled-up row with an error_type
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "job_log_summaries"
+
+class ArchivedJob(models.Model):
+    """jobs_archive: terminal jobs moved out of jobs by common.archive (same columns)."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    app_name = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        "common.AppUser",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+        db_column="user_id",
+    )
+    account_id = models.CharField(max_length=255)
+    board_id = models.CharField(max_length=255, null=True, blank=True)
+    task_type = models.CharField(max_length=255)
+    status = models.CharField(max_length=32, choices=JobStatus.choices)
+    schedule_type = models.CharField(max_length=32, choices=ScheduleType.choices)
+    scheduled_at = models.DateTimeField(null=True, blank=True)
+    cron_expression = models.CharField(max_length=255, null=True, blank=True)
+    polling_interval = models.PositiveIntegerField(null=True, blank=True)
+    polling_state = models.JSONField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    payload_ref = models.CharField(max_length=64, null=True, blank=True)
+    log_summary = models.JSONField(null=True, blank=True)  # the job's JobLogSummary, if it had one
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "jobs_archive"
+        indexes = [
+            models.Index(fields=["account_id"], name="jobs_archive_account_id_idx"),
+        ]
+
+
+class ArchivedJobLog(models.Model):
+    """job_logs_archive: JobLog rows of archived jobs."""
+    id = models.BigIntegerField(primary_key=True)
+    job = models.ForeignKey(
+        "common.ArchivedJob",
+        on_delete=models.CASCADE,
+        related_name="logs",
+        db_column="job_id",
+    )
+    event_type = models.CharField(max_length=255)
+    attempt_number = models.PositiveIntegerField(null=True, blank=True)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    error_type = models.CharField(max_length=32, null=True, blank=True, choices=JobLogErrorType.choices)
+    metadata = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "job_logs_archive"
+        indexes = [
+            models.Index(fields=["job", "created_at"], name="job_logs_archive_job_idx"),
+        ]
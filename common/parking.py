@@ -0,0 +1,93 @@
+"""
+Parked queue for rate-limited jobs.
+
+Instead of re-enqueueing every refused job with countdown=retry_after (so they all wake at
+once and bounce again), run_job parks the job in its rate-limit bucket's Redis sorted set,
+ordered by when it was first parked. release_parked_jobs (Celery beat, every
+PARKED_RELEASE_INTERVAL seconds) takes tokens from each bucket and pops that many jobs in
+one Lua call, then publishes them with rate_token=True so run_job does not check the
+limiter a second time. Jobs are therefore released exactly as fast as the bucket refills.
+
+Before taking tokens, release() drops queued ids whose job is no longer paused_rate_limited
+(cancelled, or moved on by another path), so they do not use up the bucket.
+"""
+import json
+import time
+
+from common import rate_limiter
+from common.models import Job, JobStatus
+from common.redis_client import redis_client
+
+# Buckets that currently have parked jobs: bucket key -> [account_id, task_type]
+PARKED_BUCKETS_KEY = "rate_parked_buckets"
+
+RELEASE_LUA = rate_limiter.BUCKET_REFILL_LUA + """
+local max_release = tonumber(ARGV[3])
+local waiting = redis.call('ZCARD', KEYS[2])
+local take = math.min(waiting, math.floor(tokens), max_release)
+if take > 0 then
+    tokens = tokens - take
+end
+""" + rate_limiter.BUCKET_SAVE_LUA + """
+local released = {}
+if take > 0 then
+    released = redis.call('ZRANGE', KEYS[2], 0, take - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, take - 1)
+end
+if waiting - take <= 0 then
+    redis.call('HDEL', KEYS[3], KEYS[1])
+end
+return released
+"""
+
+_release = redis_client.register_script(RELEASE_LUA)
+
+
+def park(job, bucket):
+    """Add job to the bucket's queue (keeping its place if it is already parked). Returns its 1-based position."""
+    queue = rate_limiter.parked_key(bucket)
+    pipe = redis_client.pipeline()
+    pipe.zadd(queue, {str(job.id): time.time()}, nx=True)
+    pipe.hset(PARKED_BUCKETS_KEY, bucket, json.dumps([job.account_id, job.task_type]))
+    pipe.zrank(queue, str(job.id))
+    rank = pipe.execute()[2]
+    return None if rank is None else rank + 1
+
+
+def queue_position(account_id, task_type, job_id):
+    """1-based position of a parked job in its bucket's queue, or None if it is not parked."""
+    bucket = rate_limiter.bucket_key(account_id, task_type)
+    rank = redis_client.zrank(rate_limiter.parked_key(bucket), str(job_id))
+    return None if rank is None else rank + 1
+
+
+def release(max_per_bucket):
+    """Pop as many parked jobs as each bucket's tokens allow. Returns the released job ids."""
+    released = []
+    for bucket, owner in redis_client.hgetall(PARKED_BUCKETS_KEY).items():
+        bucket = bucket.decode()
+        account_id, task_type = json.loads(owner)
+        _drop_stale(rate_limiter.parked_key(bucket), max_per_bucket)
+        capacity, per_seconds, burst, _ = rate_limiter.get_limit(account_id, task_type)
+        size, rate = rate_limiter.bucket_size(capacity, per_seconds, burst)
+        job_ids = _release(
+            keys=[bucket, rate_limiter.parked_key(bucket), PARKED_BUCKETS_KEY],
+            args=[size, rate, max_per_bucket],
+            client=redis_client,
+        )
+        released.extend(job_id.decode() for job_id in job_ids)
+    return released
+
+
+def _drop_stale(queue, count):
+    """Remove ids among the first count in queue whose job is gone or no longer paused."""
+    head = [job_id.decode() for job_id in redis_client.zrange(queue, 0, count - 1)]
+    if not head:
+        return
+    paused = {
+        str(job_id)
+        for job_id in Job.objects.filter(id__in=head, status=JobStatus.PAUSED_RATE_LIMITED).values_list("id", flat=True)
+    }
+    stale = [job_id for job_id in head if job_id not in paused]
+    if stale:
+        redis_client.zrem(queue, *stale)
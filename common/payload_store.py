@@ -0,0 +1,102 @@
+"""
+Content-addressed store for large job payloads.
+
+When a job's request `data` serializes to more than PAYLOAD_INLINE_MAX_BYTES, _create_job
+writes it once, zlib-compressed, to PAYLOAD_STORE_DIR/<sha[:2]>/<sha> (sha256 of the JSON)
+and keeps only the hash in Job.payload_ref; Job.payload then holds just the small config
+part. Identical payloads share one blob. Small payloads stay inline as before.
+
+The blob is only read at callback time: CallbackBody splices it into the request JSON and
+decompresses it from a memory map chunk by chunk, so the callback body is streamed and
+never held in memory (or in the jobs table) as a whole. PAYLOAD_STORE_DIR must be shared
+by the web and worker containers (by default it sits next to the SQLite file).
+"""
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import uuid
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _path(ref):
+    return Path(settings.PAYLOAD_STORE_DIR) / ref[:2] / ref
+
+
+def offload(job_payload):
+    """
+    If job_payload["data"] is over the inline limit, store it, remove it from job_payload
+    and return its ref (for Job.payload_ref); otherwise leave job_payload alone and return None.
+    """
+    raw = json.dumps(job_payload.get("data"), separators=(",", ":")).encode()
+    if len(raw) <= settings.PAYLOAD_INLINE_MAX_BYTES:
+        return None
+    ref = put(raw)
+    del job_payload["data"]
+    return ref
+
+
+def put(raw):
+    """Store raw JSON bytes (once per content). Returns the ref."""
+    ref = hashlib.sha256(raw).hexdigest()
+    path = _path(ref)
+    if path.exists():
+        return ref
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(raw, settings.PAYLOAD_COMPRESSION_LEVEL))
+        os.replace(tmp, path)  # atomic: readers never see a partial blob
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return ref
+
+
+def iter_raw(ref):
+    """Yield the stored JSON bytes in chunks. Raises FileNotFoundError if the blob is gone."""
+    with open(_path(ref), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        decompressor = zlib.decompressobj()
+        for offset in range(0, len(m), CHUNK_SIZE):
+            chunk = decompressor.decompress(m[offset:offset + CHUNK_SIZE])
+            if chunk:
+                yield chunk
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def get(ref):
+    """The stored data, parsed."""
+    return json.loads(b"".join(iter_raw(ref)))
+
+
+def callback_body(body, ref):
+    """body unchanged if the job's data is inline, else a CallbackBody that streams it in."""
+    return body if ref is None else CallbackBody(body, ref)
+
+
+class CallbackBody:
+    """
+    Callback JSON whose body["payload"]["data"] is read from the store while it is sent.
+    Iterating yields the encoded body; each iteration starts a fresh read, so retries work.
+    """
+
+    def __init__(self, body, ref):
+        self.ref = ref
+        marker = f"\x00{uuid.uuid4().hex}"
+        envelope = dict(body, payload=dict(body["payload"], data=marker))
+        head, tail = json.dumps(envelope).split(json.dumps(marker), 1)
+        self._head, self._tail = head.encode(), tail.encode()
+
+    def __iter__(self):
+        yield self._head
+        yield from iter_raw(self.ref)
+        yield self._tail
@@ -1,26 +1,155 @@
-import redis
+"""
+Per-account token bucket rate limiter.
+
+One EVALSHA per check: the Lua script refills the bucket from the time elapsed since the
+last call, takes tokens if it can and returns how many it granted plus the wait until the
+next token. A limit is `capacity` calls per `per_seconds` plus a `burst` (RATE_LIMIT_BURST):
+the bucket holds at most `burst` tokens and refills at (capacity - burst) / per_seconds. Any
+per_seconds window then admits at most burst + (capacity - burst) = capacity calls, even
+straddling a full bucket, which a bucket holding `capacity` tokens would let through twice.
+The price is a sustained rate of capacity - burst per window; burst is clamped to
+1..capacity - 1.
+
+While jobs are parked on a bucket (common.parking) new callers are refused, so they queue
+behind the parked jobs instead of overtaking them.
+
+Limits come from RATE_LIMIT_DEFAULT, overridden per task_type and then per account by
+RATE_LIMIT_OVERRIDES. A task_type with its own limit gets its own bucket per account.
+
+With RATE_LIMIT_LEASE_SIZE > 1 a worker claims that many tokens at once and spends them
+locally for up to RATE_LIMIT_LEASE_TTL seconds, skipping Redis on most calls; unspent
+leased tokens are simply dropped, so the limit is never exceeded.
+"""
+import math
+import threading
+import time
+
 from django.conf import settings
 
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
-)
+from common.redis_client import redis_client
+
+# Shared by every script that touches a bucket: KEYS[1] is the bucket hash,
+# ARGV[1] capacity, ARGV[2] refill rate (tokens/second). Leaves `tokens` and `now` set.
+BUCKET_REFILL_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+"""
+
+BUCKET_SAVE_LUA = """
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+"""
+
+# KEYS[2] is the bucket's parked-job queue (common.parking); while it is non-empty new
+# callers are refused so they queue up behind it instead of overtaking it.
+TOKEN_BUCKET_LUA = BUCKET_REFILL_LUA + """
+local requested = tonumber(ARGV[3])
+local waiting = 0
+if KEYS[2] then
+    waiting = redis.call('ZCARD', KEYS[2])
+end
+
+local granted = 0
+if waiting == 0 and tokens >= 1 then
+    granted = math.min(requested, math.floor(tokens))
+    tokens = tokens - granted
+end
+""" + BUCKET_SAVE_LUA + """
+local retry_after = 0
+if granted == 0 then
+    retry_after = math.max(0, waiting + 1 - tokens) / rate
+end
+return {granted, tostring(retry_after)}
+"""
+
+_take_tokens = redis_client.register_script(TOKEN_BUCKET_LUA)
+
+_lease_lock = threading.Lock()
+_leases = {}  # bucket key -> [tokens left, expires at (monotonic)]
+
+
+def get_limit(account_id, task_type=None):
+    """(capacity, per_seconds, burst, bucket suffix) for this account/task_type."""
+    limit = dict(settings.RATE_LIMIT_DEFAULT)
+    overrides = settings.RATE_LIMIT_OVERRIDES
+    suffix = ""
+    task_limit = overrides.get("task_types", {}).get(task_type) if task_type else None
+    if task_limit:
+        limit.update(task_limit)
+        suffix = f":{task_type}"
+    limit.update(overrides.get("accounts", {}).get(account_id) or {})
+    capacity = int(limit["capacity"])
+    burst = max(1, min(int(limit.get("burst", settings.RATE_LIMIT_BURST)), capacity - 1))
+    return capacity, float(limit["per_seconds"]), burst, suffix
+
+
+def bucket_size(capacity, per_seconds, burst):
+    """(tokens the bucket holds, refill rate per second) that keep every window within capacity."""
+    return burst, max(capacity - burst, 1) / per_seconds
+
+
+def bucket_key(account_id, task_type=None):
+    return f"rate_limit:{account_id}{get_limit(account_id, task_type)[3]}"
+
+
+def parked_key(bucket):
+    """Redis sorted set of jobs parked on this bucket (see common.parking)."""
+    return f"rate_parked:{bucket}"
+
 
-WINDOW_SECONDS = 60
-MAX_CALLS_PER_WINDOW = 90  # set below Monday's actual limit as a safety margin
+def check_rate_limit(account_id, task_type=None):
+    """
+    {"allowed": True}, or {"allowed": False, "retry_after_seconds": n, "bucket": key} when the
+    bucket is empty or other jobs are already parked on it.
+    """
+    capacity, per_seconds, burst, suffix = get_limit(account_id, task_type)
+    key = f"rate_limit:{account_id}{suffix}"
 
+    lease_size = min(settings.RATE_LIMIT_LEASE_SIZE, burst)
+    if lease_size > 1 and _spend_leased(key):
+        return {"allowed": True}
 
-def check_rate_limit(account_id):
-    key = f"rate_limit:{account_id}"
+    granted, retry_after = take_tokens(key, *bucket_size(capacity, per_seconds, burst), max(lease_size, 1))
+    if granted == 0:
+        return {
+            "allowed": False,
+            "retry_after_seconds": max(1, math.ceil(retry_after)),
+            "bucket": key,
+        }
+    if granted > 1:
+        with _lease_lock:
+            _leases[key] = [granted - 1, time.monotonic() + settings.RATE_LIMIT_LEASE_TTL]
+    return {"allowed": True}
 
-    current_count = redis_client.incr(key)
 
-    if current_count == 1:
-        redis_client.expire(key, WINDOW_SECONDS)
+def take_tokens(key, size, rate, requested=1):
+    """
+    Atomically take up to `requested` tokens from bucket `key` holding at most `size` tokens
+    and refilling at `rate` per second (none while jobs are parked on it). Returns
+    (granted, retry_after_seconds).
+    """
+    granted, retry_after = _take_tokens(
+        keys=[key, parked_key(key)],
+        args=[size, rate, requested],
+        client=redis_client,
+    )
+    return int(granted), float(retry_after)
 
-    if current_count > MAX_CALLS_PER_WINDOW:
-        ttl = redis_client.ttl(key)
-        return {"allowed": False, "retry_after_seconds": ttl}
 
-    return {"allowed": True}
\ No newline at end of file
+def _spend_leased(key):
+    with _lease_lock:
+        lease = _leases.get(key)
+        if not lease:
+            return False
+        if lease[1] < time.monotonic() or lease[0] <= 0:
+            del _leases[key]
+            return False
+        lease[0] -= 1
+        return True
@@ -0,0 +1,22 @@
+import redis
+from django.conf import settings
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+# Shared by the rate limiter, parked queue and status cache.
+redis_client = redis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+)
+
+# For calls on the job-create path that have a fallback when Redis is unavailable: short
+# timeouts and no retries, so an outage costs a create REDIS_FAST_TIMEOUT, not seconds.
+fast_redis_client = redis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    socket_timeout=settings.REDIS_FAST_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_FAST_TIMEOUT,
+    retry=Retry(NoBackoff(), 0),
+)
@@ -0,0 +1,132 @@
+"""
+JobLog retention.
+
+JobLog rows older than their job's retention period are rolled up into the job's
+JobLogSummary (rows per event_type, first/last timestamps, last error) and deleted.
+compact_job_logs() (Celery beat, every JOBLOG_RETENTION_INTERVAL seconds) works in batches
+of JOBLOG_RETENTION_BATCH_SIZE rows, each rolled up and deleted in one transaction, and
+stops after JOBLOG_RETENTION_MAX_BATCHES so one run never holds the table for long.
+
+The retention period is JOBLOG_RETENTION_DAYS, overridden per app ("app_a") and then per
+app and task type ("app_a:polling_task") by JOBLOG_RETENTION_OVERRIDES. 0 keeps rows forever.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from common.models import JobLog, JobLogSummary
+
+logger = logging.getLogger(__name__)
+
+LOG_FIELDS = ("id", "job_id", "event_type", "error_type", "metadata", "created_at")
+
+
+def compact_job_logs(now=None, batch_size=None, max_batches=None):
+    """
+    Roll up and delete expired JobLog rows. Returns {scope: rows deleted}, where scope is an
+    override key ("app_a", "app_a:polling_task") or "default".
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.JOBLOG_RETENTION_BATCH_SIZE
+    batches_left = max_batches or settings.JOBLOG_RETENTION_MAX_BATCHES
+    deleted = {}
+    for scope, days, logs in _scopes():
+        if days <= 0:
+            continue
+        expired = logs.filter(created_at__lt=now - timedelta(days=days))
+        count = 0
+        while batches_left > 0:
+            batches_left -= 1
+            rows = list(expired.values(*LOG_FIELDS)[:batch_size])
+            if rows:
+                _roll_up(rows)
+                count += len(rows)
+            if len(rows) < batch_size:
+                break
+        if count:
+            deleted[scope] = count
+        if batches_left <= 0:
+            break
+    if deleted:
+        logger.info("compact_job_logs: deleted %s", deleted)
+    return deleted
+
+
+def _scopes():
+    """
+    (scope, retention days, JobLog queryset) covering every row exactly once: one per
+    app:task_type override, one per app override (minus its task types with their own), and
+    the default for everything else. Rows are selected by their job's columns, so jobs of any
+    app or task type are covered, registered or not.
+    """
+    overrides = settings.JOBLOG_RETENTION_OVERRIDES
+    task_keys = [key.split(":", 1) for key in overrides if ":" in key]
+    app_keys = [key for key in overrides if ":" not in key]
+
+    def task_override(app_name, task_type):
+        return Q(job__app_name=app_name, job__task_type=task_type)
+
+    for app_name, task_type in task_keys:
+        yield f"{app_name}:{task_type}", int(overrides[f"{app_name}:{task_type}"]), JobLog.objects.filter(
+            task_override(app_name, task_type)
+        )
+    for app_name in app_keys:
+        logs = JobLog.objects.filter(job__app_name=app_name)
+        for other_app, task_type in task_keys:
+            if other_app == app_name:
+                logs = logs.exclude(task_override(other_app, task_type))
+        yield app_name, int(overrides[app_name]), logs
+    logs = JobLog.objects.exclude(job__app_name__in=app_keys)
+    for app_name, task_type in task_keys:
+        logs = logs.exclude(task_override(app_name, task_type))
+    yield "default", settings.JOBLOG_RETENTION_DAYS, logs
+
+
+def _roll_up(rows):
+    """Merge rows into their jobs' summaries and delete them, in one transaction."""
+    by_job = {}
+    for row in rows:
+        by_job.setdefault(row["job_id"], []).append(row)
+
+    with transaction.atomic():
+        summaries = JobLogSummary.objects.select_for_update().in_bulk(list(by_job))
+        created, updated = [], []
+        for job_id, job_rows in by_job.items():
+            summary = summaries.get(job_id)
+            if summary is None:
+                first = job_rows[0]["created_at"]
+                summary = JobLogSummary(job_id=job_id, first_at=first, last_at=first)
+                created.append(summary)
+            else:
+                updated.append(summary)
+            _merge(summary, job_rows)
+        JobLogSummary.objects.bulk_create(created)
+        JobLogSummary.objects.bulk_update(updated, ["event_counts", "first_at", "last_at", "last_error", "updated_at"])
+        JobLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+
+
+def _merge(summary, rows):
+    counts = Counter(summary.event_counts)
+    counts.update(row["event_type"] for row in rows)
+    summary.event_counts = dict(counts)
+    summary.first_at = min(summary.first_at, *(row["created_at"] for row in rows))
+    summary.last_at = max(summary.last_at, *(row["created_at"] for row in rows))
+    summary.updated_at = timezone.now()
+
+    errors = [row for row in rows if row["error_type"]]
+    if errors:
+        latest = max(errors, key=lambda row: row["created_at"])
+        last_error = summary.last_error
+        if last_error is None or latest["created_at"] > parse_datetime(last_error["created_at"]):
+            summary.last_error = {
+                "event_type": latest["event_type"],
+                "error_type": latest["error_type"],
+                "metadata": latest["metadata"],
+                "created_at": latest["created_at"].isoformat(),
+            }
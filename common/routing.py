@@ -1,17 +1,49 @@
-from apps.app_a.handlers import bulk_excel_insert, delayed_archive, scheduled_cron_task, polling_task
+import functools
+from typing import Callable, NamedTuple
 
+from django.conf import settings
 
-HANDLER_REGISTRY = {
-    ("app_a", "bulk_excel_insert"): bulk_excel_insert,
-    ("app_a", "delayed_archive"): delayed_archive,
-    ("app_a", "scheduled_cron_task"): scheduled_cron_task,
-    ("app_a", "polling_task"): polling_task,
+
+# run_job message priority per kind of run (RabbitMQ: higher is delivered first). The job
+# queues are declared with x-max-priority 9 in config/celery.py.
+PRIORITIES = {
+    "immediate": 9,  # first run of a job someone just created (or whose run_at came due)
+    "retry": 6,      # retries and jobs released from the rate-limit queue
+    "polling": 3,    # polling cycles after the first
+    "cron": 0,       # cron runs enqueued by the beat tick
 }
 
 
+class TaskRoute(NamedTuple):
+    handler: Callable
+    queue: str = "jobs.default"  # must be listed in JOB_QUEUES
+
+
+@functools.cache
+def handler_registry():
+    """{(app_name, task_type): TaskRoute}."""
+    # Imported on first use: the app handlers import common.scheduling and common.tasks, which
+    # import this module.
+    from apps.app_a.handlers import bulk_excel_insert, delayed_archive, scheduled_cron_task, polling_task
+
+    return {
+        ("app_a", "bulk_excel_insert"): TaskRoute(bulk_excel_insert, queue="jobs.bulk"),
+        ("app_a", "delayed_archive"): TaskRoute(delayed_archive, queue="jobs.short"),
+        ("app_a", "scheduled_cron_task"): TaskRoute(scheduled_cron_task),
+        ("app_a", "polling_task"): TaskRoute(polling_task),
+    }
+
+
 def get_handler(app_name, task_type):
     key = (app_name, task_type)
-    handler = HANDLER_REGISTRY.get(key)
-    if not handler:
+    route = handler_registry().get(key)
+    if not route:
         raise ValueError(f"No handler registered for {key}")
-    return handler
\ No newline at end of file
+    return route.handler
+
+
+def run_options(app_name, task_type, kind):
+    """apply_async options (queue, priority) for a run_job message of this kind for this job."""
+    route = handler_registry().get((app_name, task_type))
+    queue = route.queue if route else settings.JOB_QUEUES[0]
+    return {"queue": queue, "priority": PRIORITIES[kind]}
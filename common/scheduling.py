@@ -1,12 +1,13 @@
+import threading
+import time
 import uuid
+from contextlib import contextmanager
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from common import cron, delayed, fair_queue, idempotency, payload_store
 from common.models import AppUser, Job, JobStatus, ScheduleType
-from common.tasks import run_job
-
-try:
-    from croniter import croniter
-except ImportError:
-    croniter = None
+from common.routing import run_options
+from common.tasks import dispatch_fair_queue, run_job
 
 
 def _ensure_user(app_name, user_id):
@@ -18,6 +19,181 @@ def _ensure_user(app_name, user_id):
     return user
 
 
+def _ensure_users(keys):
+    """Resolve many (app_name, user_id) pairs at once. Returns {(app_name, user_id): AppUser}."""
+    by_app = {}
+    for app_name, user_id in keys:
+        by_app.setdefault(app_name, set()).add(user_id)
+    users = {}
+    for app_name, user_ids in by_app.items():
+        existing = AppUser.objects.filter(app_name=app_name, monday_user_id__in=user_ids)
+        users.update({(app_name, u.monday_user_id): u for u in existing})
+        missing = [uid for uid in user_ids if (app_name, uid) not in users]
+        if missing:
+            AppUser.objects.bulk_create(
+                [AppUser(app_name=app_name, monday_user_id=uid) for uid in missing],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts leaves pks unset (and a concurrent request may have won), so re-read.
+            created = AppUser.objects.filter(app_name=app_name, monday_user_id__in=missing)
+            users.update({(app_name, u.monday_user_id): u for u in created})
+    return users
+
+
+class _JobBatch:
+    """Collects Jobs and their run_job messages while bulk_scheduling() is active."""
+
+    def __init__(self):
+        self.entries = []  # (job, (app_name, user_id), apply_async options or None)
+        self.duplicates = {}  # returned job id -> id of the job that already had its idempotency key
+
+    def add(self, job, user_key, options):
+        self.entries.append((job, user_key, options))
+
+    def flush(self):
+        if not self.entries:
+            return
+        users = _ensure_users({user_key for _, user_key, _ in self.entries})
+        for job, user_key, _ in self.entries:
+            job.user = users[user_key]
+        entries = self.entries
+        try:
+            with transaction.atomic():
+                Job.objects.bulk_create([job for job, _, _ in entries], batch_size=500)
+        except IntegrityError:
+            # An idempotency key is taken (by another request, or twice in this batch):
+            # insert one by one and drop the duplicates.
+            entries = []
+            for entry in self.entries:
+                job = entry[0]
+                existing = _insert(job)
+                if existing is None:
+                    entries.append(entry)
+                else:
+                    self.duplicates[str(job.id)] = existing
+        idempotency.remember(job for job, _, _ in entries)
+        # Publish only after commit so workers never see a job id that is not in the DB yet.
+        _publish([(job, options) for job, _, options in entries if options is not None])
+
+
+_local = threading.local()
+
+
+@contextmanager
+def bulk_scheduling():
+    """
+    Defer Job inserts and run_job publishes made by the run_* primitives until the block exits,
+    then resolve users in one query per app, bulk_create the jobs and publish all messages
+    over a single broker connection. Job ids are returned by the primitives as usual.
+    """
+    if getattr(_local, "batch", None) is not None:
+        yield _local.batch
+        return
+    batch = _local.batch = _JobBatch()
+    try:
+        yield batch
+    finally:
+        _local.batch = None
+    batch.flush()
+
+
+def _create_job(config, payload, enqueue=None, **fields):
+    """
+    Create the Job row and, if enqueue is given (apply_async options), queue run_job for it.
+    Raises idempotency.DuplicateJob if config["idempotency_key"] already belongs to a job
+    (inside bulk_scheduling() the duplicate is recorded in the batch instead).
+    """
+    batch = getattr(_local, "batch", None)
+    if enqueue is not None:
+        enqueue = {**run_options(config["app_name"], config["task_type"], "immediate"), **enqueue}
+    job_payload = _payload_from_config_and_data(config, payload)
+    payload_ref = payload_store.offload(job_payload)
+    job = Job(
+        app_name=config["app_name"],
+        account_id=config["account_id"],
+        board_id=config.get("board_id"),
+        task_type=config["task_type"],
+        status=JobStatus.QUEUED,
+        payload=job_payload,
+        payload_ref=payload_ref,
+        idempotency_key=config.get("idempotency_key"),
+        **fields,
+    )
+    if batch is not None:
+        batch.add(job, (config["app_name"], config["user_id"]), enqueue)
+        return str(job.id)
+    job.user = _ensure_user(config["app_name"], config["user_id"])
+    existing = _insert(job)
+    if existing is not None:
+        raise idempotency.DuplicateJob(existing)
+    idempotency.remember([job])
+    if enqueue is not None:
+        _publish([(job, enqueue)])
+    return str(job.id)
+
+
+def _insert(job):
+    """Insert job. If its idempotency key is already taken, returns the id of the job holding it."""
+    try:
+        with transaction.atomic():
+            job.save(force_insert=True)
+        return None
+    except IntegrityError:
+        if not job.idempotency_key:
+            raise
+        existing = idempotency.lookup(job.app_name, job.idempotency_key)
+        if existing is not None:
+            return existing
+    # lookup() found the key on an expired job and released it.
+    job.save(force_insert=True)
+    return None
+
+
+def _publish(jobs):
+    """
+    Publish run_job for [(job, apply_async options)]. Runs due now go through the fair queue
+    (common.fair_queue) when it is enabled, runs due later through the delayed store
+    (common.delayed); the rest, and everything Redis could not take, go to the broker.
+    """
+    held, later, direct = [], [], []
+    now = time.time()
+    for job, options in jobs:
+        delay = _delay(options)
+        if delay is None:
+            (held if fair_queue.enabled() else direct).append((job, options))
+        elif delayed.wants(delay):
+            later.append((job, options, now + delay))
+        else:
+            direct.append((job, options))
+    if held:
+        if fair_queue.hold([(job.id, job.app_name, job.account_id, options) for job, options in held]):
+            if fair_queue.should_kick():
+                dispatch_fair_queue.apply_async()
+        else:
+            direct.extend(held)
+    if later:
+        entries = [
+            (job.id, due_at, {k: v for k, v in options.items() if k not in ("eta", "countdown")})
+            for job, options, due_at in later
+        ]
+        if not delayed.hold(entries):
+            direct.extend((job, options) for job, options, _ in later)
+    if not direct:
+        return
+    with run_job.app.producer_or_acquire() as producer:
+        for job, options in direct:
+            run_job.apply_async(args=[str(job.id)], producer=producer, **options)
+
+
+def _delay(options):
+    """Seconds until a message with these apply_async options is due; None if it has no eta/countdown."""
+    if "countdown" in options:
+        return options["countdown"]
+    if "eta" in options:
+        return (options["eta"] - timezone.now()).total_seconds()
+    return None
+
+
 def _payload_from_config_and_data(config, payload):
     """Merge config metadata with request data for Job.payload."""
     out = {
@@ -27,70 +203,39 @@ def _payload_from_config_and_data(config, payload):
         "data": payload,
     }
     for k, v in config.items():
-        if k not in ("app_name", "user_id", "account_id", "board_id", "task_type"):
+        if k not in ("app_name", "user_id", "account_id", "board_id", "task_type", "idempotency_key"):
             out.setdefault(k, v)
     return out
 
 
 def run_immediate(config, payload):
     """Creates job, queues Celery task immediately. Returns job UUID."""
-    user = _ensure_user(config["app_name"], config["user_id"])
-    job = Job.objects.create(
-        app_name=config["app_name"],
-        user=user,
-        account_id=config["account_id"],
-        board_id=config.get("board_id"),
-        task_type=config["task_type"],
-        status=JobStatus.QUEUED,
-        schedule_type=ScheduleType.IMMEDIATE,
-        payload=_payload_from_config_and_data(config, payload),
-    )
-    run_job.apply_async(args=[str(job.id)])
-    return str(job.id)
+    return _create_job(config, payload, enqueue={}, schedule_type=ScheduleType.IMMEDIATE)
 
 
 def run_at(config, payload, timestamp):
     """Creates job with scheduled_at, queues with Celery eta. Returns job UUID."""
     if timezone.is_naive(timestamp):
         timestamp = timezone.make_aware(timestamp)
-    user = _ensure_user(config["app_name"], config["user_id"])
-    job = Job.objects.create(
-        app_name=config["app_name"],
-        user=user,
-        account_id=config["account_id"],
-        board_id=config.get("board_id"),
-        task_type=config["task_type"],
-        status=JobStatus.QUEUED,
+    return _create_job(
+        config,
+        payload,
+        enqueue={"eta": timestamp},
         schedule_type=ScheduleType.RUN_AT,
         scheduled_at=timestamp,
-        payload=_payload_from_config_and_data(config, payload),
     )
-    run_job.apply_async(args=[str(job.id)], eta=timestamp)
-    return str(job.id)
 
 
 def run_cron(config, payload, cron_expression):
     """Creates job with cron_expression; Celery Beat task will enqueue when due. Returns job UUID."""
-    user = _ensure_user(config["app_name"], config["user_id"])
-    scheduled_at = None
-    if croniter:
-        base = timezone.now()
-        it = croniter(cron_expression, base)
-        next_run = it.get_next(timezone.datetime)
-        scheduled_at = timezone.make_aware(next_run) if timezone.is_naive(next_run) else next_run
-    job = Job.objects.create(
-        app_name=config["app_name"],
-        user=user,
-        account_id=config["account_id"],
-        board_id=config.get("board_id"),
-        task_type=config["task_type"],
-        status=JobStatus.QUEUED,
+    scheduled_at = cron.next_run(cron_expression)
+    return _create_job(
+        config,
+        payload,
         schedule_type=ScheduleType.CRON,
         cron_expression=cron_expression,
         scheduled_at=scheduled_at,
-        payload=_payload_from_config_and_data(config, payload),
     )
-    return str(job.id)
 
 
 def run_after_delay(config, payload, duration_seconds):
@@ -101,18 +246,11 @@ def run_after_delay(config, payload, duration_seconds):
 
 def run_polling(config, payload, interval_seconds):
     """Creates job; task runs and reschedules itself after each run using polling_state. Returns job UUID."""
-    user = _ensure_user(config["app_name"], config["user_id"])
-    job = Job.objects.create(
-        app_name=config["app_name"],
-        user=user,
-        account_id=config["account_id"],
-        board_id=config.get("board_id"),
-        task_type=config["task_type"],
-        status=JobStatus.QUEUED,
+    return _create_job(
+        config,
+        payload,
+        enqueue={},
         schedule_type=ScheduleType.POLLING,
         polling_interval=interval_seconds,
         polling_state={},
-        payload=_payload_from_config_and_data(config, payload),
     )
-    run_job.apply_async(args=[str(job.id)])
-    return str(job.id)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.utils import timezone
+from common import cron
 
 SCHEDULE_TYPES = {"immediate", "run_at", "cron", "delay_from_now", "polling"}
 
@@ -12,6 +13,7 @@ class JobCreateSerializer(serializers.Serializer):
     task_type = serializers.CharField(max_length=255)
     schedule = serializers.DictField()
     data = serializers.DictField(required=False, default=dict)
+    idempotency_key = serializers.CharField(max_length=255, required=False, allow_null=True, default=None)
 
     def validate_schedule(self, value):
         if not isinstance(value, dict):
@@ -32,6 +34,10 @@ class JobCreateSerializer(serializers.Serializer):
         elif stype == "cron":
             if not value.get("expression"):
                 raise serializers.ValidationError("schedule.expression required for type cron")
+            try:
+                cron.validate(value["expression"])
+            except ValueError as e:
+                raise serializers.ValidationError(f"schedule.expression is not a valid cron expression: {e}")
         elif stype == "delay_from_now":
             d = value.get("duration_seconds")
             if d is None:
@@ -0,0 +1,158 @@
+"""
+Redis snapshot of each job's status response.
+
+job_status:{id} (hash: status, task_type, created_at, scheduled_at, account_id, etag) and
+job_status_logs:{id} (list of the latest STATUS_CACHE_LOGS log entries, newest first) hold
+exactly what JobStatusView returns. The view fills them from the DB on a miss; after that
+job_state.transition() keeps them current (write-through) and changes the etag, which the
+view uses for If-None-Match / 304.
+
+Write-through only touches snapshots that exist, so a partial snapshot is never served.
+Snapshots filled from the DB get the short STATUS_CACHE_FILL_TTL, bounding how long a fill
+that raced with a transition (or with logs still in the JobLog buffer) can stay stale.
+"""
+import json
+import logging
+import uuid
+
+import redis
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from common.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# KEYS: hash, logs; ARGV: status, etag, log entry JSON or "", max logs, ttl
+UPDATE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[1], 'etag', ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('LPUSH', KEYS[2], ARGV[3])
+    redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[4]) - 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+"""
+
+# KEYS: hash, logs; ARGV: snapshot fields JSON, ttl, log entry JSON... (newest first)
+FILL_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local fields = cjson.decode(ARGV[1])
+for name, value in pairs(fields) do
+    redis.call('HSET', KEYS[1], name, value)
+end
+redis.call('DEL', KEYS[2])
+for i = 3, #ARGV do
+    redis.call('RPUSH', KEYS[2], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+_update = redis_client.register_script(UPDATE_LUA)
+_fill = redis_client.register_script(FILL_LUA)
+
+
+def _keys(job_id):
+    return [f"job_status:{job_id}", f"job_status_logs:{job_id}"]
+
+
+def _dumps(value):
+    # Same rendering as the DRF response, so cached and DB-served bodies are identical.
+    return json.dumps(value, cls=JSONEncoder)
+
+
+def get(job_id):
+    """
+    The cached status body plus "etag" and "account_id" (for the caller to pop), or None on
+    a miss or if Redis is unavailable.
+    """
+    if not settings.STATUS_CACHE_ENABLED:
+        return None
+    hash_key, logs_key = _keys(job_id)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(hash_key)
+        pipe.lrange(logs_key, 0, settings.STATUS_CACHE_LOGS - 1)
+        fields, logs = pipe.execute()
+    except redis.RedisError:
+        return None
+    if not fields:
+        return None
+    fields = {k.decode(): v.decode() for k, v in fields.items()}
+    return {
+        "job_id": str(job_id),
+        "status": fields["status"],
+        "task_type": fields["task_type"],
+        "created_at": fields["created_at"] or None,
+        "scheduled_at": fields["scheduled_at"] or None,
+        "logs": [json.loads(entry) for entry in logs],
+        "etag": fields["etag"],
+        "account_id": fields["account_id"],
+    }
+
+
+def fill(body, account_id):
+    """Store a status body built from the DB. Returns its etag."""
+    etag = uuid.uuid4().hex
+    if not settings.STATUS_CACHE_ENABLED:
+        return etag
+    fields = {
+        "status": body["status"],
+        "task_type": body["task_type"],
+        "created_at": body["created_at"] or "",
+        "scheduled_at": body["scheduled_at"] or "",
+        "account_id": account_id,
+        "etag": etag,
+    }
+    try:
+        _fill(
+            keys=_keys(body["job_id"]),
+            args=[json.dumps(fields), settings.STATUS_CACHE_FILL_TTL]
+            + [_dumps(entry) for entry in body["logs"][: settings.STATUS_CACHE_LOGS]],
+            client=redis_client,
+        )
+    except redis.RedisError:
+        logger.warning("status cache fill failed for job %s", body["job_id"])
+    return etag
+
+
+def record_transition(job_id, status, log=None, created_at=None):
+    """Write-through from job_state.transition(): new status and, if given, the new log entry."""
+    if not settings.STATUS_CACHE_ENABLED:
+        return
+    entry = ""
+    if log:
+        entry = _dumps({
+            "event_type": log["event_type"],
+            "attempt_number": log.get("attempt_number"),
+            "error_type": log.get("error_type"),
+            "metadata": log.get("metadata"),
+            "created_at": created_at,
+        })
+    try:
+        _update(
+            keys=_keys(job_id),
+            args=[status, uuid.uuid4().hex, entry, settings.STATUS_CACHE_LOGS, settings.STATUS_CACHE_TTL],
+            client=redis_client,
+        )
+    except redis.RedisError:
+        logger.warning("status cache update failed for job %s", job_id)
+
+
+def invalidate(job_ids):
+    """Drop snapshots whose row changed outside transition() (e.g. scheduled_at advanced by the cron tick)."""
+    if not settings.STATUS_CACHE_ENABLED or not job_ids:
+        return
+    keys = [key for job_id in job_ids for key in _keys(job_id)]
+    try:
+        redis_client.delete(*keys)
+    except redis.RedisError:
+        logger.warning("status cache invalidation failed for %d jobs", len(job_ids))
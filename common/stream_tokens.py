@@ -0,0 +1,28 @@
+"""
+Signed tokens for the account and board streams of /ws/jobs/ (common.consumers).
+
+A token names one account and any of its boards, is signed with INTERNAL_API_SECRET and
+expires after WS_TOKEN_MAX_AGE seconds. The app backend, which holds the secret, gets one
+from POST /api/jobs/stream-token and hands it to its browser, which sends it with each
+account or board subscribe. Job ids need no token.
+"""
+from django.conf import settings
+from django.core import signing
+
+SALT = "common.stream_tokens"
+
+
+def _signer():
+    return signing.TimestampSigner(key=settings.INTERNAL_API_SECRET, salt=SALT)
+
+
+def issue(account_id, board_ids=()):
+    return _signer().sign_object({"account_id": str(account_id), "board_ids": [str(b) for b in board_ids]})
+
+
+def grants(token):
+    """(account_id, set of board ids) the token is valid for; raises signing.BadSignature if it is not."""
+    if not isinstance(token, str):
+        raise signing.BadSignature("token must be a string")
+    claims = _signer().unsign_object(token, max_age=settings.WS_TOKEN_MAX_AGE)
+    return claims["account_id"], set(claims["board_ids"])
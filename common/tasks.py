@@ -1,45 +1,279 @@
 import logging
+import random
+import time
+import uuid
 from celery import shared_task
+from celery.exceptions import Retry
+from celery.signals import task_postrun, worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Max, Q, Value, When
 from django.utils import timezone
+import redis
 import requests
 
+from common import (
+    archive,
+    async_engine,
+    channel_utils,
+    circuit_breaker,
+    cron,
+    delayed,
+    fair_queue,
+    http_client,
+    job_state,
+    joblog_sink,
+    metrics,
+    parking,
+    payload_store,
+    retention,
+    status_cache,
+)
 from common.models import Job, JobLog, JobStatus, ScheduleType, JobLogErrorType
 from common.rate_limiter import check_rate_limit
-from common.channel_utils import publish_job_update
+from common.routing import run_options
 
 logger = logging.getLogger(__name__)
 
-try:
-    from croniter import croniter
-except ImportError:
-    croniter = None
 
-CALLBACK_TIMEOUT = 30
+@task_postrun.connect
+def _flush_job_logs(**kwargs):
+    # A finished task's last events go out now rather than waiting for the flusher thread.
+    try:
+        joblog_sink.flush()
+    except Exception:
+        logger.exception("JobLog buffer flush failed")  # kept for the next flush
+
+
+@worker_ready.connect
+@worker_process_init.connect
+def _serve_metrics(**kwargs):
+    # worker_ready: the main process (threads/solo pools); worker_process_init: prefork children.
+    if settings.METRICS_ENABLED and settings.METRICS_WORKER_PORT:
+        metrics.serve(settings.METRICS_WORKER_PORT)
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def _on_worker_shutdown(**kwargs):
+    left = async_engine.drain(timeout=settings.ASYNC_CALLBACK_DRAIN_TIMEOUT)
+    if left:
+        logger.warning("%d async callbacks still in flight at shutdown", left)
+    channel_utils.flush()
+    async_engine.shutdown(timeout=0)
+    joblog_sink.flush()
+    logger.info("callback connection pools: %s", http_client.pool_stats())
+    http_client.close_all()
+
 
 @shared_task
 def enqueue_due_cron_jobs():
     """
     Beat runs this periodically. Finds cron Jobs that are due (scheduled_at <= now),
     enqueues run_job for each, and advances scheduled_at to the next run.
+
+    Works in chunks of CRON_SCAN_CHUNK_SIZE. Each chunk is claimed with one UPDATE that
+    advances scheduled_at (per cron expression) and stamps this tick's claim_token, guarded
+    by scheduled_at <= now, so an overlapping tick cannot claim the same rows; on databases
+    with SKIP LOCKED the candidate rows are also locked. The token stays until the run
+    completes, so a run that is still retrying when the next fire time comes is not enqueued
+    a second time (unless its row has not changed for CRON_CLAIM_TIMEOUT seconds). Only rows carrying our token are
+    published, over one broker connection per chunk. Without croniter the tick raises before
+    claiming anything.
     """
+    started = time.monotonic()
     now = timezone.now()
+    token = uuid.uuid4().hex
+    chunk_size = settings.CRON_SCAN_CHUNK_SIZE
+    enqueued = 0
+    while True:
+        candidates, claimed = _claim_due_cron_chunk(now, token, chunk_size)
+        if claimed:
+            enqueue_run_jobs(claimed, "cron")
+            enqueued += len(claimed)
+        if candidates < chunk_size:
+            break
+
+    duration = time.monotonic() - started
+    metrics.CRON_TICK.observe(duration)
+    metrics.CRON_ENQUEUED.inc(enqueued)
+    log = logger.warning if duration > settings.CRON_TICK_WARN_SECONDS else logger.info
+    log("enqueue_due_cron_jobs: enqueued %d jobs in %.3fs", enqueued, duration)
+    return {"enqueued": enqueued, "duration_seconds": round(duration, 3)}
+
+
+def _claim_due_cron_chunk(now, token, chunk_size):
+    """Claim up to chunk_size due cron jobs. Returns (candidates seen, [(id, app_name, task_type)] to enqueue)."""
+    stale = now - timezone.timedelta(seconds=settings.CRON_CLAIM_TIMEOUT)
+    unclaimed = Q(claim_token__isnull=True) | Q(updated_at__lt=stale)  # no run in flight
     due = Job.objects.filter(
+        unclaimed,
         schedule_type=ScheduleType.CRON,
         status=JobStatus.QUEUED,
         scheduled_at__lte=now,
         cron_expression__isnull=False,
-    ).exclude(cron_expression="")
-    for job in due:
-        run_job.apply_async(args=[str(job.id)])
-        if croniter and job.cron_expression:
-            try:
-                it = croniter(job.cron_expression, now)
-                next_run = it.get_next(timezone.datetime)
-                next_run = timezone.make_aware(next_run) if timezone.is_naive(next_run) else next_run
-                job.scheduled_at = next_run
-                job.save(update_fields=["scheduled_at", "updated_at"])
-            except Exception as e:
-                logger.warning("croniter next run failed for job %s: %s", job.id, e)
+    ).exclude(cron_expression="").order_by("scheduled_at")
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        candidates = list(due.values_list("id", "cron_expression")[:chunk_size])
+        if not candidates:
+            return 0, []
+
+        next_runs = cron.next_runs([expr for _, expr in candidates], now)
+        for expression, run in next_runs.items():
+            if run is None:
+                logger.warning("cannot compute next run for cron expression %r; unscheduling its jobs", expression)
+                metrics.CRON_UNSCHEDULED.inc(sum(1 for _, expr in candidates if expr == expression))
+        ids = [job_id for job_id, _ in candidates]
+        Job.objects.filter(unclaimed, id__in=ids, status=JobStatus.QUEUED, scheduled_at__lte=now).update(
+            scheduled_at=Case(
+                *[When(cron_expression=expr, then=Value(run)) for expr, run in next_runs.items()],
+                default=Value(None),
+                output_field=DateTimeField(),
+            ),
+            claim_token=token,
+            updated_at=timezone.now(),
+        )
+        # Jobs with an unusable expression were claimed with scheduled_at cleared: never due again.
+        valid = [expr for expr, run in next_runs.items() if run is not None]
+        claimed = list(
+            Job.objects.filter(id__in=ids, claim_token=token, cron_expression__in=valid)
+            .values_list("id", "app_name", "task_type")
+        )
+    status_cache.invalidate(ids)  # scheduled_at moved
+    return len(candidates), claimed
+
+
+def enqueue_run_jobs(jobs, kind, **options):
+    """Publish run_job for many (id, app_name, task_type) over a single broker connection."""
+    with run_job.app.producer_or_acquire() as producer:
+        for job_id, app_name, task_type in jobs:
+            run_job.apply_async(
+                args=[str(job_id)],
+                producer=producer,
+                **run_options(app_name, task_type, kind),
+                **options,
+            )
+
+
+@shared_task
+def dispatch_fair_queue():
+    """
+    Move held first runs (common.fair_queue) to the broker in deficit round-robin order,
+    topping each job queue up to FAIR_QUEUE_TARGET_DEPTH waiting messages. Kicked when jobs
+    are held, and again every FAIR_KICK_INTERVAL while any are left; beat also runs it every
+    FAIR_DISPATCH_INTERVAL seconds.
+    """
+    dispatched = 0
+    backlog = False
+    for queue in fair_queue.queues():
+        entries = fair_queue.pop(queue, settings.FAIR_QUEUE_TARGET_DEPTH - _broker_depth(queue))
+        backlog = backlog or fair_queue.has_pending(queue)
+        if not entries:
+            continue
+        with run_job.app.producer_or_acquire() as producer:
+            for job_id, options in entries:
+                run_job.apply_async(args=[job_id], producer=producer, **options)
+        dispatched += len(entries)
+    if backlog and fair_queue.should_kick():
+        dispatch_fair_queue.apply_async(countdown=settings.FAIR_KICK_INTERVAL)
+    return dispatched
+
+
+@shared_task
+def dispatch_delayed_jobs():
+    """
+    Beat runs this every DELAYED_DISPATCH_INTERVAL seconds: publish the runs held in
+    common.delayed that are due, DELAYED_DISPATCH_BATCH per broker connection, for at most
+    DELAYED_DISPATCH_MAX_BATCHES batches.
+    """
+    dispatched = 0
+    for _ in range(settings.DELAYED_DISPATCH_MAX_BATCHES):
+        entries = delayed.pop_due(settings.DELAYED_DISPATCH_BATCH)
+        if not entries:
+            break
+        try:
+            with run_job.app.producer_or_acquire() as producer:
+                for job_id, options in entries:
+                    run_job.apply_async(args=[job_id], producer=producer, **options)
+        except Exception:
+            # Runs published before the failure go out twice; run_job's claim makes that a no-op.
+            delayed.restore(entries)
+            raise
+        dispatched += len(entries)
+        if len(entries) < settings.DELAYED_DISPATCH_BATCH:
+            break
+    return dispatched
+
+
+def _broker_depth(queue):
+    """Messages waiting in a broker queue (0 if it does not exist yet)."""
+    with run_job.app.connection_for_read() as conn:
+        try:
+            return conn.default_channel.queue_declare(queue=queue, passive=True).message_count
+        except conn.channel_errors:
+            return 0
+
+
+@shared_task
+def compact_job_logs():
+    """Beat runs this every JOBLOG_RETENTION_INTERVAL seconds: roll up and delete expired JobLog rows."""
+    return retention.compact_job_logs()
+
+
+@shared_task
+def archive_terminal_jobs():
+    """Beat runs this every JOB_ARCHIVE_INTERVAL seconds: move old finished jobs to the archive tables."""
+    return archive.archive_terminal_jobs()
+
+
+@shared_task
+def recover_stuck_jobs():
+    """
+    Beat runs this every RUNNING_RECOVERY_INTERVAL seconds. A job RUNNING for longer than
+    RUNNING_RECOVERY_SECONDS lost its run (the worker died mid-callback, or an async callback
+    never reported back): the attempt is logged as a transient failure and retried now, or the
+    job fails if that was its last attempt. The UPDATE is guarded by updated_at, so a job that
+    moved on meanwhile is left alone.
+    """
+    cutoff = timezone.now() - timezone.timedelta(seconds=settings.RUNNING_RECOVERY_SECONDS)
+    stuck = list(
+        Job.objects.filter(status=JobStatus.RUNNING, updated_at__lt=cutoff)
+        .order_by("updated_at")[: settings.RUNNING_RECOVERY_BATCH]
+    )
+    if not stuck:
+        return 0
+    # The claim logged execution_started with the attempt number; 1 if that row was lost too.
+    attempts = dict(
+        JobLog.objects.filter(job__in=stuck)
+        .values("job_id")
+        .annotate(attempt=Max("attempt_number"))
+        .values_list("job_id", "attempt")
+    )
+    recovered = 0
+    for job in stuck:
+        attempt_number = attempts.get(job.id) or 1
+        log = {
+            "event_type": "execution_failed",
+            "idempotency_key": f"{job.id}::lost::{attempt_number}",
+            "attempt_number": attempt_number,
+            "error_type": JobLogErrorType.TRANSIENT,
+            "metadata": {"message": f"run lost: running for more than {settings.RUNNING_RECOVERY_SECONDS}s"},
+        }
+        guard = {"from_statuses": (JobStatus.RUNNING,), "log": log, "where": {"updated_at__lt": cutoff}}
+        if attempt_number <= (job.payload or {}).get("max_retries", 3):
+            if job_state.transition(job, JobStatus.QUEUED, **guard):
+                metrics.outcome(job, "retry")
+                _run_later(job, 0, "retry", retries=attempt_number)
+                recovered += 1
+        elif job_state.transition(job, JobStatus.FAILED, **guard):
+            metrics.outcome(job, "failed")
+            recovered += 1
+    if recovered:
+        logger.warning("recover_stuck_jobs: recovered %d jobs stuck in running", recovered)
+    return recovered
 
 
 @shared_task
@@ -48,181 +282,323 @@ def dummy_task():
 
 
 @shared_task(bind=True, max_retries=None)
-def run_job(self, job_id):
+def run_job(self, job_id, rate_token=False):
+    started = time.perf_counter()
     try:
         job = Job.objects.get(id=job_id)
     except Job.DoesNotExist:
         return
-    if job.status not in (JobStatus.QUEUED, JobStatus.RUNNING):
+    metrics.observe_phase(job, "load", started)
+    if job.status not in job_state.RUNNABLE_STATUSES:
+        metrics.outcome(job, "skipped")
         return
 
+    slot = None
+    if (job.payload or {}).get("callback_url") and async_engine.handles(job.task_type):
+        # Take a place on the engine before claiming, so no job sits RUNNING behind its limit.
+        slot = async_engine.reserve(settings.ASYNC_CALLBACK_SUBMIT_TIMEOUT)
+        if slot is None:
+            metrics.outcome(job, "engine_busy")
+            _run_later(job, 0, "retry", kwargs={"rate_token": rate_token}, retries=self.request.retries)
+            return
+    try:
+        _run_claimed(self, job, rate_token, slot)
+    finally:
+        if slot is not None and not slot.submitted:
+            slot.release()
+
+
+def _run_claimed(task, job, rate_token, slot):
+    """Claim job and run it: rate limit, callback (on the async engine when slot is given), outcome."""
     # Calculate Attempt Number (starts at 0, so add 1)
-    attempt_number = self.request.retries + 1
-    
-    # 1. Start Log Key: Unique per attempt
-    start_key = f"{job_id}::started::{attempt_number}"
-    
+    attempt_number = task.request.retries + 1
+
     payload = job.payload or {}
     max_retries = payload.get("max_retries", 3)
     retry_backoff_base = payload.get("retry_backoff_base", 60)
 
-    job.status = JobStatus.RUNNING
-    job.save(update_fields=["status", "updated_at"])
-    publish_job_update(str(job.id), status=job.status, log=None)
-
-    # Use get_or_create for Start Log
-    JobLog.objects.get_or_create(
-        idempotency_key=start_key,
-        defaults={
-            "job": job,
-            "event_type": "execution_started",
-            "attempt_number": attempt_number,
-        }
-    )
-
-    publish_job_update(str(job.id), status=job.status, log={
-        "event_type": "execution_started",
-        "metadata": None,
-        "created_at": timezone.now().isoformat(),
-    })
-
-    rate_result = check_rate_limit(job.account_id)
-    if not rate_result["allowed"]:
-        job.status = JobStatus.PAUSED_RATE_LIMITED
-        job.save(update_fields=["status", "updated_at"])
-        publish_job_update(str(job.id), status=job.status, log=None)
-        
-        # Log the pause safely
-        JobLog.objects.get_or_create(
-            idempotency_key=f"{job_id}::rate_limit::{attempt_number}",
-            defaults={
-                "job": job,
-                "event_type": "rate_limited",
+    # Claim the job: only one delivery of this message can move it to RUNNING.
+    with metrics.phase(job, "claim"):
+        claimed = job_state.transition(
+            job,
+            JobStatus.RUNNING,
+            from_statuses=job_state.RUNNABLE_STATUSES,
+            log={
+                "event_type": "execution_started",
+                "idempotency_key": f"{job.id}::started::{attempt_number}",
                 "attempt_number": attempt_number,
-                "metadata": {"wait_seconds": rate_result["retry_after_seconds"]}
-            }
+            },
         )
+    if not claimed:
+        metrics.outcome(job, "skipped")
+        return
 
-        run_job.apply_async(
-            args=[str(job.id)],
-            countdown=rate_result["retry_after_seconds"],
-        )
+    # Jobs released from the parked queue already hold a token taken on their behalf.
+    if rate_token:
+        rate_result = {"allowed": True}
+    else:
+        with metrics.phase(job, "rate_limit"):
+            rate_result = check_rate_limit(job.account_id, job.task_type)
+    if not rate_result["allowed"]:
+        _pause_rate_limited(job, attempt_number, rate_result)
         return
 
     callback_url = payload.get("callback_url")
 
     # Construct the key sent to the external server
     # This remains the same so Node knows it's the same attempt
-    external_idempotency_key = f"{job_id}_{attempt_number}"
+    external_idempotency_key = f"{job.id}_{attempt_number}"
+
+    def retry(countdown, max_retries):
+        # A retry never carries rate_token over from the released message.
+        if _hold_delayed(job, countdown, "retry", retries=task.request.retries + 1):
+            raise Retry(when=countdown)
+        raise task.retry(
+            kwargs={},
+            countdown=countdown,
+            max_retries=max_retries,
+            **run_options(job.app_name, job.task_type, "retry"),
+        )
+
+    failure_kwargs = {
+        "job": job,
+        "attempt_number": attempt_number,
+        "max_retries": max_retries,
+        "retry_backoff_base": retry_backoff_base,
+    }
+
+    if callback_url:
+        body = {
+            "idempotency_key": external_idempotency_key,
+            "payload": payload,
+        }
+        if job.schedule_type == ScheduleType.POLLING:
+            body["job_id"] = str(job.id)
+            body["polling_state"] = job.polling_state or {}
+        body = payload_store.callback_body(body, job.payload_ref)
+
+        lease = circuit_breaker.acquire(callback_url)
+        if not lease["allowed"]:
+            _defer_callback(job, attempt_number, lease)
+            return
+
+        if slot is not None:
+            # Hand the HTTP phase to the worker's event loop and free this worker thread;
+            # completion and failure handling run from the loop once the callback returns.
+            _submit_async_callback(job, attempt_number, callback_url, body, failure_kwargs, lease, slot)
+            return
 
     try:
+        result_data = None
         if callback_url:
-            body = {
-                "idempotency_key": external_idempotency_key,
-                "payload": payload,
-            }
-            if job.schedule_type == ScheduleType.POLLING:
-                body["job_id"] = str(job.id)
-                body["polling_state"] = job.polling_state or {}
-            resp = requests.post(
-                callback_url,
-                json=body,
-                timeout=CALLBACK_TIMEOUT,
-                headers={"Content-Type": "application/json"},
-            )
-            resp.raise_for_status()
-        else:
-            resp = None  # no response to parse
-
-        # Stateful polling: parse response, update polling_state, reschedule only if not done
-        if job.schedule_type == ScheduleType.POLLING and job.polling_interval and callback_url and resp is not None:
+            host_ok = True
             try:
-                result_data = resp.json()
-            except Exception:
-                result_data = {}
-            new_state = result_data.get("polling_state")
-            if new_state is not None:
-                job.polling_state = new_state
-            done = result_data.get("done") is True
-
-            if done:
-                job.status = JobStatus.COMPLETED
-                job.save(update_fields=["status", "polling_state", "updated_at"])
-                completion_key = f"{job_id}::completed::{attempt_number}"
-                JobLog.objects.get_or_create(
-                    idempotency_key=completion_key,
-                    defaults={
-                        "job": job,
-                        "event_type": "execution_completed",
-                        "attempt_number": attempt_number,
-                    }
-                )
-                publish_job_update(
-                    str(job.id),
-                    status=job.status,
-                    log={
-                        "event_type": "execution_completed",
-                        "metadata": None,
-                        "created_at": timezone.now().isoformat(),
-                    },
-                )
-            else:
-                job.status = JobStatus.QUEUED
-                job.save(update_fields=["status", "polling_state", "updated_at"])
-                publish_job_update(str(job.id), status=job.status, log=None)
-                run_job.apply_async(
-                    args=[str(job.id)],
-                    countdown=job.polling_interval,
-                )
-        else:
-            # Non-polling (or no callback): mark completed and handle cron
-            job.status = JobStatus.COMPLETED
-            job.save(update_fields=["status", "updated_at"])
-            completion_key = f"{job_id}::completed::{attempt_number}"
-            JobLog.objects.get_or_create(
-                idempotency_key=completion_key,
-                defaults={
-                    "job": job,
-                    "event_type": "execution_completed",
-                    "attempt_number": attempt_number,
-                }
-            )
-            publish_job_update(
-                str(job.id),
-                status=job.status,
+                with metrics.phase(job, "callback"), http_client.post(
+                    callback_url,
+                    headers={"Content-Type": "application/json"},
+                    stream=True,
+                    **http_client.body_kwargs(body),
+                ) as resp:
+                    resp.raise_for_status()
+                    if job.schedule_type == ScheduleType.POLLING:
+                        result_data = http_client.loads(http_client.read_body(resp))
+                    else:
+                        http_client.discard_body(resp)
+            except requests.RequestException as e:
+                host_ok = not _is_transient_http_error(e)
+                raise
+            finally:
+                circuit_breaker.release(lease, host_ok)
+        with metrics.phase(job, "complete"):
+            _complete_job(job, attempt_number, result_data)
+
+    except requests.RequestException as e:
+        with metrics.phase(job, "failure"):
+            _handle_callback_failure(retry=retry, error=e, **failure_kwargs)
+    except Exception as e:
+        with metrics.phase(job, "failure"):
+            _handle_execution_failure(retry=retry, error=e, **failure_kwargs)
+
+
+def _pause_rate_limited(job, attempt_number, rate_result):
+    """
+    Move a refused job to PAUSED_RATE_LIMITED and park it, or requeue it after the wait when
+    parking is off or Redis refuses the park (so a paused job is never left without a way back).
+    """
+    parked = settings.RATE_LIMIT_PARKING_ENABLED
+    paused = job_state.transition(
+        job,
+        JobStatus.PAUSED_RATE_LIMITED,
+        log={
+            "event_type": "rate_limited",
+            "idempotency_key": f"{job.id}::rate_limit::{attempt_number}",
+            "attempt_number": attempt_number,
+            "metadata": {"wait_seconds": rate_result["retry_after_seconds"], "parked": parked},
+        },
+    )
+    if not paused:
+        return
+    metrics.outcome(job, "rate_limited")
+    if parked:
+        try:
+            parking.park(job, rate_result["bucket"])
+            return
+        except redis.RedisError:
+            logger.warning("cannot park job %s; requeueing it in %ss", job.id, rate_result["retry_after_seconds"])
+    _run_later(job, rate_result["retry_after_seconds"], "retry")
+
+
+def _defer_callback(job, attempt_number, lease):
+    """
+    Put a claimed job whose callback host refused it (open circuit or concurrency limit) back
+    in QUEUED and run it again after the wait, as the same attempt and keeping its rate token.
+    """
+    wait = lease["retry_after_seconds"] * random.uniform(1, 1.5)  # spread the herd at half-open
+    deferred = job_state.transition(
+        job,
+        JobStatus.QUEUED,
+        log={
+            "event_type": "callback_deferred",
+            "idempotency_key": f"{job.id}::deferred::{attempt_number}",
+            "attempt_number": attempt_number,
+            "metadata": {"host": lease["host"], "circuit": lease["state"], "wait_seconds": round(wait, 1)},
+        },
+    )
+    if not deferred:
+        return
+    metrics.outcome(job, "deferred")
+    _run_later(job, wait, "retry", kwargs={"rate_token": True}, retries=attempt_number - 1)
+
+
+@shared_task
+def release_parked_jobs():
+    """Beat runs this every PARKED_RELEASE_INTERVAL seconds: publish parked jobs the limiter now allows."""
+    job_ids = parking.release(settings.PARKED_RELEASE_BATCH)
+    if job_ids:
+        jobs = Job.objects.filter(id__in=job_ids, status=JobStatus.PAUSED_RATE_LIMITED).values_list(
+            "id", "app_name", "task_type"
+        )
+        enqueue_run_jobs(jobs, "retry", kwargs={"rate_token": True})
+    return len(job_ids)
+
+
+def _complete_job(job, attempt_number, result_data):
+    """
+    Success path after the callback (if any) returned 2xx.
+    result_data is the parsed callback response for polling jobs, else None.
+    Each outcome is a single state transition carrying its JobLog row.
+    """
+    completed_log = {
+        "event_type": "execution_completed",
+        "idempotency_key": f"{job.id}::completed::{attempt_number}",
+        "attempt_number": attempt_number,
+    }
+
+    # Stateful polling: parse response, update polling_state, reschedule only if not done
+    if job.schedule_type == ScheduleType.POLLING and job.polling_interval and result_data is not None:
+        if not isinstance(result_data, dict):
+            result_data = {}
+        new_state = result_data.get("polling_state")
+        fields = {"polling_state": new_state} if new_state is not None else None
+        state_size = _json_size(new_state) if new_state is not None else 0
+        if state_size > settings.POLLING_STATE_MAX_BYTES:
+            job_state.transition(
+                job,
+                JobStatus.FAILED,
                 log={
-                    "event_type": "execution_completed",
-                    "metadata": None,
-                    "created_at": timezone.now().isoformat(),
+                    "event_type": "execution_failed",
+                    "idempotency_key": f"{job.id}::failure::{attempt_number}",
+                    "attempt_number": attempt_number,
+                    "error_type": JobLogErrorType.PERMANENT,
+                    "metadata": {
+                        "message": f"polling_state is {state_size} bytes; "
+                                   f"POLLING_STATE_MAX_BYTES is {settings.POLLING_STATE_MAX_BYTES}",
+                    },
                 },
             )
+            metrics.outcome(job, "failed")
+            return
+
+        if result_data.get("done") is True:
+            job_state.transition(job, JobStatus.COMPLETED, log=completed_log, fields=fields)
+            metrics.outcome(job, "completed")
+        elif job_state.transition(job, JobStatus.QUEUED, fields=fields):
+            metrics.outcome(job, "polling")
+            _run_later(job, job.polling_interval, "polling")
+    elif job.schedule_type == ScheduleType.CRON:
+        # The run is logged as completed, but the job itself goes straight back to waiting
+        # for enqueue_due_cron_jobs, which may claim it again now.
+        job_state.transition(job, JobStatus.QUEUED, log=completed_log, fields={"claim_token": None})
+        metrics.outcome(job, "completed")
+    else:
+        job_state.transition(job, JobStatus.COMPLETED, log=completed_log)
+        metrics.outcome(job, "completed")
 
-            if job.schedule_type == ScheduleType.CRON:
-                job.status = JobStatus.QUEUED
-                job.save(update_fields=["status", "updated_at"])
-                publish_job_update(str(job.id), status=job.status, log=None)
 
-    except requests.RequestException as e:
-        _handle_callback_failure(
-            self=self,
-            job=job,
-            attempt_number=attempt_number,
-            error=e,
-            max_retries=max_retries,
-            retry_backoff_base=retry_backoff_base,
+def _run_later(job, countdown, kind, **options):
+    """Publish run_job for job in countdown seconds (via the delayed store for long waits)."""
+    if not _hold_delayed(job, countdown, kind, **options):
+        run_job.apply_async(
+            args=[str(job.id)],
+            countdown=countdown,
+            **run_options(job.app_name, job.task_type, kind),
+            **options,
         )
-    except Exception as e:
-        _handle_execution_failure(
-            self=self,
-            job=job,
-            attempt_number=attempt_number,
-            error=e,
-            max_retries=max_retries,
-            retry_backoff_base=retry_backoff_base,
+
+
+def _hold_delayed(job, countdown, kind, **options):
+    """Hand a run countdown seconds from now to common.delayed. False if it was not taken."""
+    if not delayed.wants(countdown):
+        return False
+    options = {**run_options(job.app_name, job.task_type, kind), **options}
+    return delayed.hold([(job.id, time.time() + countdown, options)])
+
+
+def _json_size(value):
+    return len(http_client.dumps(value).encode())
+
+
+def _submit_async_callback(job, attempt_number, callback_url, body, failure_kwargs, lease, slot):
+    """Run the callback on the async engine; same completion/failure handling as the sync path."""
+
+    def retry(countdown, max_retries):
+        # No task context on the loop: requeue with the attempt count carried forward.
+        _run_later(job, countdown, "retry", retries=attempt_number)
+
+    started = time.perf_counter()
+
+    def on_response(result_data):
+        metrics.observe_phase(job, "callback", started)
+        circuit_breaker.release(lease, True)
+        try:
+            with metrics.phase(job, "complete"):
+                _complete_job(job, attempt_number, result_data)
+        except Exception as e:
+            _handle_execution_failure(retry=retry, error=e, **failure_kwargs)
+
+    def on_error(error):
+        metrics.observe_phase(job, "callback", started)
+        circuit_breaker.release(
+            lease, not (isinstance(error, requests.RequestException) and _is_transient_http_error(error))
         )
+        if isinstance(error, requests.RequestException):
+            _handle_callback_failure(retry=retry, error=error, **failure_kwargs)
+        else:
+            _handle_execution_failure(retry=retry, error=error, **failure_kwargs)
+
+    async_engine.submit_callback(
+        callback_url,
+        body,
+        parse_json=job.schedule_type == ScheduleType.POLLING,
+        on_response=on_response,
+        on_error=on_error,
+        slot=slot,
+    )
 
 
 def _is_transient_http_error(exc):
+    if isinstance(exc, http_client.ResponseTooLarge):
+        return False
     if not hasattr(exc, "response") or exc.response is None:
         return True
     status = exc.response.status_code
@@ -234,7 +610,7 @@ def _is_transient_http_error(exc):
 
 
 def _handle_callback_failure(
-    self,
+    retry,
     job,
     attempt_number,
     error,
@@ -242,50 +618,33 @@ def _handle_callback_failure(
     retry_backoff_base,
 ):
     """
-    Handles network/callback failures. 
-    Crucially uses get_or_create to prevent UniqueConstraint crashes on retries.
+    Handles network/callback failures.
+    The failure log rides on the transition (back to QUEUED for a retry, or FAILED);
+    its idempotency key makes a repeated attempt a no-op.
     """
     transient = _is_transient_http_error(error)
     error_type = JobLogErrorType.TRANSIENT if transient else JobLogErrorType.PERMANENT
     status_code = getattr(getattr(error, "response", None), "status_code", None)
-    
-    # Robust key generation and get_or_create
-    idempotency_key = f"{job.id}::failure::{attempt_number}"
-
-    JobLog.objects.get_or_create(
-        idempotency_key=idempotency_key,
-        defaults={
-            "job": job,
+
+    _fail_or_retry(
+        retry,
+        job,
+        attempt_number,
+        can_retry=transient,
+        max_retries=max_retries,
+        retry_backoff_base=retry_backoff_base,
+        log={
             "event_type": "execution_failed",
+            "idempotency_key": f"{job.id}::failure::{attempt_number}",
             "attempt_number": attempt_number,
             "error_type": error_type,
             "metadata": {"message": str(error), "status_code": status_code},
-        }
-    )
-
-    publish_job_update(
-        str(job.id),
-        status=job.status,
-        log={
-            "event_type": "execution_failed",
-            "metadata": None,
-            "created_at": timezone.now().isoformat(),
         },
     )
 
-    if transient and attempt_number <= max_retries:
-        countdown = retry_backoff_base * (2 ** (attempt_number - 1))
-        countdown = min(countdown, 3600)
-        # Using raise self.retry is cleaner than calling self.retry
-        raise self.retry(countdown=countdown, max_retries=max_retries)
-    else:
-        job.status = JobStatus.FAILED
-        job.save(update_fields=["status", "updated_at"])
-        publish_job_update(str(job.id), status=job.status, log=None)
-
 
 def _handle_execution_failure(
-    self,
+    retry,
     job,
     attempt_number,
     error,
@@ -295,35 +654,31 @@ def _handle_execution_failure(
     """
     Handles internal/generic exceptions.
     """
-    #Robust key generation and get_or_create
-    idempotency_key = f"{job.id}::exception::{attempt_number}"
-
-    JobLog.objects.get_or_create(
-        idempotency_key=idempotency_key,
-        defaults={
-            "job": job,
+    _fail_or_retry(
+        retry,
+        job,
+        attempt_number,
+        can_retry=True,
+        max_retries=max_retries,
+        retry_backoff_base=retry_backoff_base,
+        log={
             "event_type": "execution_failed",
+            "idempotency_key": f"{job.id}::exception::{attempt_number}",
             "attempt_number": attempt_number,
             "error_type": JobLogErrorType.TRANSIENT,
             "metadata": {"message": str(error)},
-        }
-    )
-
-    publish_job_update(
-        str(job.id),
-        status=job.status,
-        log={
-            "event_type": "execution_failed",
-            "metadata": None,
-            "created_at": timezone.now().isoformat(),
         },
     )
 
-    if attempt_number <= max_retries:
+
+def _fail_or_retry(retry, job, attempt_number, can_retry, max_retries, retry_backoff_base, log):
+    if can_retry and attempt_number <= max_retries:
+        if not job_state.transition(job, JobStatus.QUEUED, from_statuses=(JobStatus.RUNNING,), log=log):
+            return  # cancelled (or otherwise moved on) while the callback was in flight
         countdown = retry_backoff_base * (2 ** (attempt_number - 1))
         countdown = min(countdown, 3600)
-        raise self.retry(countdown=countdown, max_retries=max_retries)
-    else:
-        job.status = JobStatus.FAILED
-        job.save(update_fields=["status", "updated_at"])
-        publish_job_update(str(job.id), status=job.status, log=None)
\ No newline at end of file
+        metrics.outcome(job, "retry")
+        # retry() raises celery's Retry on the worker thread; on the async engine it requeues
+        retry(countdown=countdown, max_retries=max_retries)
+    elif job_state.transition(job, JobStatus.FAILED, from_statuses=(JobStatus.RUNNING,), log=log):
+        metrics.outcome(job, "failed")
@@ -0,0 +1,93 @@
+"""
+Shared test setup. Redis is a fakeredis server (Lua scripts run on lupa), swapped in behind
+common.redis_client so every module and registered script uses it, and run_job messages are
+captured instead of being sent to the broker.
+"""
+import os
+from unittest import mock
+
+import fakeredis
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from common.models import AppUser, Job, JobStatus, ScheduleType
+from common.redis_client import fast_redis_client, redis_client
+from common.tasks import dispatch_fair_queue, run_job
+
+
+class FakeClock:
+    """Stands in for the time module inside fakeredis, so Lua scripts calling TIME see self.now."""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+test_settings = override_settings(
+    PUBLISH_JOB_UPDATES=False,
+    FAIR_DISPATCH_ENABLED=False,
+    JOBLOG_BUFFER_ENABLED=False,
+    INTERNAL_API_SECRET="",
+)
+
+
+class JobServerMixin:
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        self.patch(mock.patch.object(redis_client, "connection_pool", self.redis.connection_pool))
+        self.patch(mock.patch.object(fast_redis_client, "connection_pool", self.redis.connection_pool))
+        self.patch(mock.patch.dict(os.environ, {"NODE_SERVER_URL": "http://callbacks.test"}))
+        self.published = []  # apply_async kwargs of every run_job message sent
+        self.patch(mock.patch.object(run_job, "apply_async", side_effect=self._publish))
+        self.patch(mock.patch.object(dispatch_fair_queue, "apply_async"))
+
+    def patch(self, patcher):
+        value = patcher.start()
+        self.addCleanup(patcher.stop)
+        return value
+
+    def _publish(self, *args, **kwargs):
+        self.published.append(kwargs)
+
+    def use_fake_clock(self, now=1_700_000_000.0):
+        """Freeze the Redis server clock (TIME) at now; advance it with the returned clock."""
+        clock = FakeClock(now)
+        self.patch(mock.patch("fakeredis.commands_mixins.server_mixin.time", clock))
+        return clock
+
+    def make_job(self, status=JobStatus.QUEUED, schedule_type=ScheduleType.IMMEDIATE, **fields):
+        user, _ = AppUser.objects.get_or_create(app_name=fields.get("app_name", "app_a"), monday_user_id="u1")
+        fields.setdefault("app_name", "app_a")
+        fields.setdefault("account_id", "acct-1")
+        fields.setdefault("task_type", "bulk_excel_insert")
+        fields.setdefault("payload", {"callback_url": "http://callbacks.test/done", "data": {}})
+        return Job.objects.create(user=user, status=status, schedule_type=schedule_type, **fields)
+
+
+@test_settings
+class JobServerTestCase(JobServerMixin, TestCase):
+    pass
+
+
+@test_settings
+class JobServerTransactionTestCase(JobServerMixin, TransactionTestCase):
+    """For tests whose code under test writes from other threads (the async engine)."""
+
+
+def job_item(**overrides):
+    """A valid create request body."""
+    item = {
+        "app_name": "app_a",
+        "user_id": "u1",
+        "account_id": "acct-1",
+        "task_type": "bulk_excel_insert",
+        "schedule": {"type": "immediate"},
+        "data": {"rows": 1},
+    }
+    item.update(overrides)
+    return item
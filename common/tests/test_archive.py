@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from common import archive
+from common.models import ArchivedJob, ArchivedJobLog, Job, JobLog, JobLogSummary, JobStatus
+from common.tests.base import JobServerTestCase
+
+
+@override_settings(JOB_ARCHIVE_AFTER_DAYS=14)
+class ArchiveTerminalJobsTests(JobServerTestCase):
+    def make_finished(self, status=JobStatus.COMPLETED, days_ago=30):
+        job = self.make_job(status=status)
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(days=days_ago))
+        return job
+
+    def test_moves_old_finished_jobs_with_their_logs_and_summary(self):
+        job = self.make_finished()
+        JobLog.objects.create(job=job, event_type="execution_completed", idempotency_key=f"{job.id}::completed::1")
+        now = timezone.now()
+        JobLogSummary.objects.create(job=job, event_counts={"execution_started": 2}, first_at=now, last_at=now)
+
+        self.assertEqual(archive.archive_terminal_jobs(), 1)
+
+        self.assertFalse(Job.objects.filter(id=job.id).exists())
+        self.assertFalse(JobLog.objects.filter(job_id=job.id).exists())
+        self.assertFalse(JobLogSummary.objects.filter(job_id=job.id).exists())
+        archived = ArchivedJob.objects.get(id=job.id)
+        self.assertEqual((archived.status, archived.account_id), (JobStatus.COMPLETED, "acct-1"))
+        self.assertEqual(archived.log_summary["event_counts"], {"execution_started": 2})
+        self.assertEqual(
+            list(ArchivedJobLog.objects.filter(job_id=job.id).values_list("event_type", flat=True)),
+            ["execution_completed"],
+        )
+
+    def test_keeps_recent_and_unfinished_jobs(self):
+        recent = self.make_finished(days_ago=1)
+        running = self.make_job(status=JobStatus.RUNNING)
+        Job.objects.filter(id=running.id).update(updated_at=timezone.now() - timedelta(days=30))
+        self.make_finished(status=JobStatus.FAILED)
+        self.make_finished(status=JobStatus.CANCELLED)
+
+        self.assertEqual(archive.archive_terminal_jobs(), 2)
+        self.assertEqual(set(Job.objects.values_list("id", flat=True)), {recent.id, running.id})
+
+    def test_works_in_bounded_batches(self):
+        for _ in range(5):
+            self.make_finished()
+        self.assertEqual(archive.archive_terminal_jobs(batch_size=2, max_batches=2), 4)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_zero_days_disables_archival(self):
+        self.make_finished()
+        with self.settings(JOB_ARCHIVE_AFTER_DAYS=0):
+            self.assertEqual(archive.archive_terminal_jobs(), 0)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_status_endpoint_serves_archived_jobs(self):
+        job = self.make_finished()
+        archive.archive_terminal_jobs()
+        response = self.client.get(f"/api/jobs/{job.id}/status")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], JobStatus.COMPLETED)
@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import override_settings
+
+from common import async_engine
+from common.models import Job, JobStatus, ScheduleType
+from common.tasks import run_job
+from common.tests.base import JobServerTestCase, JobServerTransactionTestCase
+
+
+class CallbackServer:
+    """Answers every POST with 200 and {"done": true} after delay seconds."""
+
+    def __init__(self, delay=0.0):
+        self.requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(handler):
+                handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+                self.requests.append(handler.path)
+                time.sleep(delay)
+                body = json.dumps({"done": True, "polling_state": {}}).encode()
+                handler.send_response(200)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/callback"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(ASYNC_CALLBACK_TASK_TYPES=["polling_task"], ASYNC_CALLBACK_MAX_IN_FLIGHT=1)
+class SlotTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        async_engine.shutdown(timeout=5)  # new loop and slots with this test's limit
+        self.addCleanup(async_engine.shutdown, 5)
+
+    def test_reserve_gives_out_at_most_the_limit(self):
+        slot = async_engine.reserve(timeout=0)
+        self.assertIsNotNone(slot)
+        self.assertIsNone(async_engine.reserve(timeout=0.01))
+        slot.release()
+        slot.release()  # idempotent
+        second = async_engine.reserve(timeout=0)
+        self.assertIsNotNone(second)
+        second.release()
+
+    def test_full_engine_requeues_without_claiming(self):
+        held = async_engine.reserve(timeout=0)
+        self.addCleanup(held.release)
+        job = self.make_job(task_type="polling_task", schedule_type=ScheduleType.POLLING, polling_interval=60)
+
+        with override_settings(ASYNC_CALLBACK_SUBMIT_TIMEOUT=0.01):
+            run_job.apply(args=[str(job.id)], retries=2)
+
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.QUEUED)
+        self.assertFalse(job.logs.exists())
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(self.published[0]["retries"], 2)  # same attempt when it runs
+
+    def test_slot_is_returned_when_the_job_is_not_claimed(self):
+        job = self.make_job(task_type="polling_task", status=JobStatus.CANCELLED)
+        run_job.apply(args=[str(job.id)])
+        job = self.make_job(task_type="polling_task")
+        Job.objects.filter(id=job.id).update(status=JobStatus.RUNNING)  # claimed elsewhere meanwhile
+        run_job.apply(args=[str(job.id)])
+        slot = async_engine.reserve(timeout=0)
+        self.assertIsNotNone(slot)
+        slot.release()
+
+
+@override_settings(ASYNC_CALLBACK_TASK_TYPES=["polling_task"], ASYNC_CALLBACK_MAX_IN_FLIGHT=4)
+class EngineRunTests(JobServerTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        async_engine.shutdown(timeout=5)
+        self.addCleanup(async_engine.shutdown, 5)
+        self.callbacks = CallbackServer(delay=0.2)
+        self.addCleanup(self.callbacks.close)
+
+    def test_callbacks_and_their_handlers_run_concurrently(self):
+        jobs = [
+            self.make_job(
+                task_type="polling_task",
+                schedule_type=ScheduleType.POLLING,
+                polling_interval=60,
+                payload={"callback_url": self.callbacks.url, "data": {}},
+            )
+            for _ in range(4)
+        ]
+        started = time.monotonic()
+        for job in jobs:
+            run_job.apply(args=[str(job.id)])
+        self.assertEqual(async_engine.drain(timeout=10), 0)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(len(self.callbacks.requests), 4)
+        self.assertEqual(
+            set(Job.objects.filter(id__in=[j.id for j in jobs]).values_list("status", flat=True)),
+            {JobStatus.COMPLETED},
+        )
+        self.assertLess(elapsed, 0.2 * 4)  # not one after another
+        slots = [async_engine.reserve(timeout=0) for _ in range(4)]
+        self.assertNotIn(None, slots)  # every slot came back
+        for slot in slots:
+            slot.release()
@@ -0,0 +1,71 @@
+import uuid
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from common import archive
+from common.models import Job, JobLog, JobLogSummary, JobStatus
+from common.tests.base import JobServerTestCase
+
+
+@override_settings(BATCH_STATUS_MAX_IDS=5, JOB_ARCHIVE_AFTER_DAYS=14)
+class BatchStatusTests(JobServerTestCase):
+    def status(self, body):
+        return self.client.post("/api/jobs/status", body, content_type="application/json")
+
+    def log(self, job, event_type, minutes_ago):
+        row = JobLog.objects.create(job=job, event_type=event_type)
+        JobLog.objects.filter(id=row.id).update(created_at=timezone.now() - timedelta(minutes=minutes_ago))
+
+    def test_returns_each_job_with_its_latest_logs(self):
+        first, second = self.make_job(), self.make_job(status=JobStatus.COMPLETED)
+        for minutes_ago, event_type in ((3, "execution_started"), (2, "execution_failed"), (1, "execution_started")):
+            self.log(first, event_type, minutes_ago)
+        unknown, garbage = str(uuid.uuid4()), "not-a-uuid"
+
+        response = self.status({"ids": [str(first.id), str(second.id), unknown, garbage], "log_limit": 2})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(set(body["jobs"]), {str(first.id), str(second.id)})
+        self.assertCountEqual(body["missing"], [unknown, garbage])
+        logs = body["jobs"][str(first.id)]["logs"]
+        self.assertEqual([log["event_type"] for log in logs], ["execution_started", "execution_failed"])
+        self.assertEqual(body["jobs"][str(second.id)]["status"], JobStatus.COMPLETED)
+        self.assertEqual(body["jobs"][str(second.id)]["logs"], [])
+
+    def test_returns_only_the_requested_fields(self):
+        job = self.make_job()
+        body = self.status({"ids": [str(job.id)], "fields": ["status"]}).json()
+        self.assertEqual(body["jobs"][str(job.id)], {"job_id": str(job.id), "status": JobStatus.QUEUED})
+
+    def test_log_summary_only_when_asked(self):
+        job = self.make_job()
+        now = timezone.now()
+        JobLogSummary.objects.create(job=job, event_counts={"execution_started": 3}, first_at=now, last_at=now)
+        self.assertNotIn("log_summary", self.status({"ids": [str(job.id)]}).json()["jobs"][str(job.id)])
+        body = self.status({"ids": [str(job.id)], "fields": ["status", "log_summary"]}).json()
+        self.assertEqual(body["jobs"][str(job.id)]["log_summary"]["event_counts"], {"execution_started": 3})
+
+    def test_falls_back_to_the_archive(self):
+        job = self.make_job(status=JobStatus.COMPLETED)
+        self.log(job, "execution_completed", 1)
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(archive.archive_terminal_jobs(), 1)
+
+        body = self.status({"ids": [str(job.id)]}).json()
+        self.assertEqual(body["missing"], [])
+        self.assertEqual(body["jobs"][str(job.id)]["status"], JobStatus.COMPLETED)
+        self.assertEqual([log["event_type"] for log in body["jobs"][str(job.id)]["logs"]], ["execution_completed"])
+
+    def test_rejects_bad_requests(self):
+        ids = [str(uuid.uuid4())]
+        for body in (
+            {"ids": []},
+            {"ids": [str(uuid.uuid4()) for _ in range(6)]},
+            {"ids": ids, "fields": ["status", "password"]},
+            {"ids": ids, "log_limit": 101},
+            {"ids": ids, "log_limit": True},
+        ):
+            self.assertEqual(self.status(body).status_code, 400, body)
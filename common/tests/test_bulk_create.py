@@ -0,0 +1,63 @@
+from django.test import override_settings
+
+from common.models import Job
+from common.tests.base import JobServerTestCase, job_item
+
+URL = "/api/jobs/bulk"
+
+
+class BulkCreateTests(JobServerTestCase):
+    def post(self, body):
+        return self.client.post(URL, body, content_type="application/json")
+
+    def test_creates_every_job_and_publishes_one_message_each(self):
+        response = self.post({"jobs": [job_item(account_id=f"acct-{i}") for i in range(5)]})
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body["created"], body["duplicates"], body["failed"]), (5, 0, 0))
+        ids = [r["id"] for r in body["results"]]
+        self.assertEqual([r["index"] for r in body["results"]], list(range(5)))
+        self.assertEqual(Job.objects.filter(id__in=ids).count(), 5)
+        self.assertEqual(sorted(m["args"][0] for m in self.published), sorted(ids))
+
+    def test_accepts_a_bare_array(self):
+        response = self.post([job_item(), job_item()])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+
+    def test_invalid_items_are_reported_without_failing_the_rest(self):
+        response = self.post([job_item(), job_item(schedule={"type": "nope"}), job_item(task_type="unknown")])
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (1, 2))
+        self.assertIn("id", body["results"][0])
+        self.assertIn("schedule", body["results"][1]["errors"])
+        self.assertIn("No handler registered", body["results"][2]["errors"]["error"])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_all_invalid_is_a_bad_request(self):
+        response = self.post([job_item(schedule={})])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 0)
+        self.assertEqual(self.published, [])
+
+    def test_rejects_empty_and_non_list_bodies(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post({"jobs": "x"}).status_code, 400)
+
+    @override_settings(BULK_CREATE_MAX_ITEMS=2)
+    def test_rejects_more_than_the_maximum(self):
+        response = self.post([job_item()] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_repeated_idempotency_key_in_one_request_is_a_duplicate(self):
+        response = self.post([job_item(idempotency_key="k1"), job_item(idempotency_key="k1"), job_item()])
+
+        body = response.json()
+        self.assertEqual((body["created"], body["duplicates"]), (2, 1))
+        first, second, _ = body["results"]
+        self.assertEqual(second, {"index": 1, "id": first["id"], "duplicate": True})
+        self.assertEqual(len(self.published), 2)
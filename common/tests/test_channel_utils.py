@@ -0,0 +1,71 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from common import channel_utils
+
+
+@override_settings(PUBLISH_JOB_UPDATES=True, PUBLISH_PRESENCE_CHECK=False)
+class CoalescingPublisherTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.object(channel_utils, "_pending", {}),
+            mock.patch.object(channel_utils, "_flush_scheduled", False),
+            mock.patch.object(channel_utils.async_engine, "get_loop"),  # the window never fires by itself
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.layer = mock.Mock(group_send=mock.AsyncMock())
+        patcher = mock.patch("channels.layers.get_channel_layer", return_value=self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def flush(self):
+        self.layer.group_send.reset_mock()
+        asyncio.run(channel_utils._flush())
+        return {group: message for (group, message), _ in self.layer.group_send.call_args_list}
+
+    def test_updates_in_one_window_are_sent_as_one_message(self):
+        channel_utils.publish_job_update("job-1", status="running", log={"event_type": "execution_started"})
+        channel_utils.publish_job_update("job-1", log={"event_type": "callback_deferred"})
+        channel_utils.publish_job_update("job-1", status="completed", log={"event_type": "execution_completed"})
+        channel_utils.async_engine.get_loop.return_value.call_soon_threadsafe.assert_called_once()
+
+        sent = self.flush()
+
+        self.assertEqual(list(sent), ["job_job-1"])
+        message = sent["job_job-1"]
+        self.assertEqual(message["type"], "job_update")
+        self.assertEqual(message["status"], "completed")
+        self.assertEqual(
+            [log["event_type"] for log in message["logs"]],
+            ["execution_started", "callback_deferred", "execution_completed"],
+        )
+        self.assertEqual(message["log"], {"event_type": "execution_completed"})
+        self.assertEqual(self.flush(), {})  # nothing left pending
+
+    def test_account_and_board_groups_get_the_window_as_one_batch(self):
+        channel_utils.publish_job_update("job-1", status="running", account_id="acct-1", board_id="board-1")
+        channel_utils.publish_job_update("job-2", status="queued", account_id="acct-1")
+        channel_utils.publish_job_update("job-1", status="completed", account_id="acct-1", board_id="board-1")
+
+        sent = self.flush()
+
+        self.assertEqual(set(sent), {"job_job-1", "job_job-2", "account_acct-1", "board_board-1"})
+        batch = sent["account_acct-1"]
+        self.assertEqual(batch["type"], "job_updates")
+        self.assertEqual([(u["job_id"], u["status"]) for u in batch["updates"]], [("job-1", "completed"), ("job-2", "queued")])
+        self.assertEqual([u["job_id"] for u in sent["board_board-1"]["updates"]], ["job-1"])
+        # The same update id on every group, so a socket on several of them keeps one copy.
+        self.assertEqual(batch["updates"][0]["update_id"], sent["job_job-1"]["update_id"])
+
+    @override_settings(PUBLISH_PRESENCE_CHECK=True)
+    def test_unwatched_groups_are_skipped(self):
+        channel_utils.publish_job_update("job-1", status="running", account_id="acct-1")
+        presence = mock.Mock(mget=mock.AsyncMock(return_value=[None, b"2"]))
+        with mock.patch.object(channel_utils, "_get_presence_client", return_value=presence):
+            sent = self.flush()
+        presence.mget.assert_awaited_once_with(["ws_presence:job_job-1", "ws_presence:account_acct-1"])
+        self.assertEqual(list(sent), ["account_acct-1"])
@@ -0,0 +1,118 @@
+import math
+
+from django.test import override_settings
+
+from common import circuit_breaker
+from common.tests.base import JobServerTestCase
+
+URL = "http://callbacks.test/done"
+
+
+@override_settings(
+    CIRCUIT_BREAKER_ENABLED=True,
+    CIRCUIT_BREAKER_WINDOW=30,
+    CIRCUIT_BREAKER_MIN_CALLS=4,
+    CIRCUIT_BREAKER_FAILURE_RATIO=0.5,
+    CIRCUIT_BREAKER_OPEN_SECONDS=30,
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES=1,
+    CALLBACK_CONCURRENCY_MIN=1,
+    CALLBACK_CONCURRENCY_MAX=4,
+    CALLBACK_CONCURRENCY_INCREASE=1,
+    CALLBACK_CONCURRENCY_DECREASE=0.5,
+)
+class CircuitBreakerTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = self.use_fake_clock()
+        self.lease_seconds = circuit_breaker._lease_seconds(URL)
+
+    def call(self, succeeded):
+        lease = circuit_breaker.acquire(URL)
+        self.assertTrue(lease["allowed"], lease)
+        self.clock.advance(0.1)
+        circuit_breaker.release(lease, succeeded)
+        return lease
+
+    def state(self):
+        return {"state": "closed", **circuit_breaker.snapshot(URL)}
+
+    def test_closed_open_half_open_closed(self):
+        self.call(True)
+        self.call(True)
+        self.call(False)
+        self.assertEqual(self.state()["state"], "closed")  # 1 of 3: too few calls to judge
+        self.call(False)
+        self.assertEqual(self.state()["state"], "open")  # 2 of 4 failed
+
+        self.clock.advance(10)
+        refused = circuit_breaker.acquire(URL)
+        self.assertEqual((refused["allowed"], refused["state"]), (False, "open"))
+        self.assertEqual(refused["retry_after_seconds"], 20)  # the rest of the open period
+
+        self.clock.advance(20)
+        probe = circuit_breaker.acquire(URL)
+        self.assertEqual((probe["allowed"], probe["state"]), (True, "half_open"))
+        self.clock.advance(1)
+        waiting = circuit_breaker.acquire(URL)  # the one probe is out
+        self.assertEqual((waiting["allowed"], waiting["state"]), (False, "half_open"))
+        self.assertEqual(waiting["retry_after_seconds"], math.ceil(self.lease_seconds - 1))
+
+        circuit_breaker.release(probe, True)
+        self.assertEqual(self.state()["state"], "closed")
+        self.assertEqual(circuit_breaker.acquire(URL)["state"], "closed")
+
+    def test_failed_probe_reopens(self):
+        for _ in range(4):
+            self.call(False)
+        self.clock.advance(30)
+        self.call(False)  # the probe
+        state = self.state()
+        self.assertEqual(state["state"], "open")
+        self.assertAlmostEqual(float(state["open_until"]), self.clock.now + 30, delta=0.01)
+
+    @override_settings(CIRCUIT_BREAKER_MIN_CALLS=100)
+    def test_a_burst_of_failures_cuts_the_limit_once(self):
+        leases = [circuit_breaker.acquire(URL) for _ in range(4)]
+        self.assertTrue(all(lease["allowed"] for lease in leases))
+        self.clock.advance(2)
+        limited = circuit_breaker.acquire(URL)
+        self.assertEqual((limited["allowed"], limited["state"]), (False, "limited"))
+        self.assertEqual(limited["retry_after_seconds"], math.ceil(self.lease_seconds - 2))  # oldest lease expires
+
+        for lease in leases:  # all started before the first cut
+            circuit_breaker.release(lease, False)
+        self.assertEqual(float(self.state()["limit"]), 2)
+
+        self.clock.advance(1)
+        self.call(False)  # started after the cut: cuts again
+        self.assertEqual(float(self.state()["limit"]), 1)
+        self.call(True)
+        self.assertEqual(float(self.state()["limit"]), 2)  # +INCREASE / limit
+
+    @override_settings(CIRCUIT_BREAKER_MIN_CALLS=100)
+    def test_leases_of_dead_workers_expire(self):
+        for _ in range(4):
+            self.assertTrue(circuit_breaker.acquire(URL)["allowed"])  # never released
+        self.assertFalse(circuit_breaker.acquire(URL)["allowed"])
+        self.assertEqual(self.state()["in_flight"], 4)
+
+        self.clock.advance(self.lease_seconds + 0.1)
+        self.assertTrue(circuit_breaker.acquire(URL)["allowed"])
+        self.assertEqual(self.state()["in_flight"], 1)
+
+    def test_unanswered_probes_are_replaced_after_a_lease(self):
+        for _ in range(4):
+            self.call(False)
+        self.clock.advance(30)
+        self.assertTrue(circuit_breaker.acquire(URL)["allowed"])  # probe whose worker dies
+        self.assertFalse(circuit_breaker.acquire(URL)["allowed"])
+        self.clock.advance(self.lease_seconds)
+        reprobe = circuit_breaker.acquire(URL)
+        self.assertEqual((reprobe["allowed"], reprobe["state"]), (True, "half_open"))
+        self.assertFalse(circuit_breaker.acquire(URL)["allowed"])
+
+    def test_disabled_breaker_allows_everything(self):
+        with self.settings(CIRCUIT_BREAKER_ENABLED=False):
+            for _ in range(10):
+                self.assertTrue(circuit_breaker.acquire(URL)["allowed"])
+        self.assertEqual(self.state()["in_flight"], 0)
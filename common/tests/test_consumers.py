@@ -0,0 +1,132 @@
+import uuid
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+
+from common import stream_tokens
+from common.consumers import JobStreamConsumer
+from common.tests.base import JobServerTestCase
+
+SECRET = "s3cret"
+
+
+@override_settings(
+    INTERNAL_API_SECRET=SECRET,
+    PUBLISH_PRESENCE_CHECK=False,
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class StreamSubscribeTests(SimpleTestCase):
+    async def subscribe(self, command, headers=()):
+        communicator = WebsocketCommunicator(JobStreamConsumer.as_asgi(), "/ws/jobs/", headers=list(headers))
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to({"action": "subscribe", **command})
+        reply = await communicator.receive_json_from()
+        await communicator.disconnect()
+        return reply
+
+    async def test_job_ids_need_no_token(self):
+        job_id = str(uuid.uuid4())
+        reply = await self.subscribe({"job_ids": [job_id]})
+        self.assertEqual(reply, {"event": "subscribed", "subscriptions": [f"job_{job_id}"]})
+
+    async def test_account_stream_is_refused_without_authorization(self):
+        reply = await self.subscribe({"account_id": "acct-1", "job_ids": [str(uuid.uuid4())]})
+        self.assertEqual(reply["event"], "error")
+        self.assertIn("not authorized", reply["error"])
+
+    async def test_token_grants_its_own_account_and_boards_only(self):
+        token = stream_tokens.issue("acct-1", ["board-1"])
+        reply = await self.subscribe({"account_id": "acct-1", "board_id": "board-1", "token": token})
+        self.assertEqual(reply["event"], "subscribed")
+        self.assertEqual(len(reply["subscriptions"]), 2)
+
+        for command in ({"account_id": "acct-2"}, {"board_id": "board-2"}):
+            reply = await self.subscribe({**command, "token": token})
+            self.assertEqual(reply["event"], "error")
+
+    async def test_forged_or_expired_tokens_are_refused(self):
+        forged = stream_tokens.issue("acct-1")[:-2] + "xx"
+        self.assertEqual((await self.subscribe({"account_id": "acct-1", "token": forged}))["event"], "error")
+        with self.settings(WS_TOKEN_MAX_AGE=-1):
+            token = stream_tokens.issue("acct-1")
+            self.assertEqual((await self.subscribe({"account_id": "acct-1", "token": token}))["event"], "error")
+
+    async def test_internal_secret_header_allows_any_stream(self):
+        reply = await self.subscribe({"account_id": "acct-9"}, headers=[(b"x-internal-secret", SECRET.encode())])
+        self.assertEqual(reply["event"], "subscribed")
+        reply = await self.subscribe({"account_id": "acct-9"}, headers=[(b"x-internal-secret", b"wrong")])
+        self.assertEqual(reply["event"], "error")
+
+
+@override_settings(
+    INTERNAL_API_SECRET="",
+    PUBLISH_PRESENCE_CHECK=False,
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    WS_BATCH_WINDOW=0.05,
+)
+class StreamBatchTests(SimpleTestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(JobStreamConsumer.as_asgi(), "/ws/jobs/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def command(self, communicator, **command):
+        await communicator.send_json_to({"action": "subscribe", **command})
+        return await communicator.receive_json_from()
+
+    @override_settings(WS_MAX_SUBSCRIPTIONS=2)
+    async def test_subscriptions_over_the_limit_are_refused(self):
+        communicator = await self.connect()
+        first, second, third = (str(uuid.uuid4()) for _ in range(3))
+        self.assertEqual((await self.command(communicator, job_ids=[first, second]))["event"], "subscribed")
+
+        reply = await self.command(communicator, job_ids=[third])
+        self.assertEqual(reply, {"event": "error", "error": "at most 2 subscriptions per connection"})
+        reply = await self.command(communicator, job_ids=[first])  # already counted
+        self.assertEqual(reply["subscriptions"], sorted([f"job_{first}", f"job_{second}"]))
+        await communicator.disconnect()
+
+    async def test_updates_in_one_window_arrive_as_one_frame(self):
+        communicator = await self.connect()
+        job_id, other_id = str(uuid.uuid4()), str(uuid.uuid4())
+        await self.command(communicator, job_ids=[job_id], account_id="acct-1")
+        layer = get_channel_layer()
+
+        started = {"update_id": "u1", "job_id": job_id, "status": "running", "logs": [{"event_type": "execution_started"}]}
+        completed = {"update_id": "u2", "job_id": job_id, "status": "completed", "logs": [{"event_type": "execution_completed"}]}
+        await layer.group_send(f"job_{job_id}", {"type": "job_update", **started})
+        await layer.group_send(f"job_{job_id}", {"type": "job_update", **completed})
+        # The account batch repeats u2 (already delivered through job_{id}) and adds another job.
+        other = {"update_id": "u3", "job_id": other_id, "status": "queued", "logs": []}
+        await layer.group_send("account_acct-1", {"type": "job_updates", "updates": [completed, other]})
+
+        frame = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(frame, {
+            "event": "job_updates",
+            "updates": [
+                {"job_id": job_id, "status": "completed",
+                 "logs": [{"event_type": "execution_started"}, {"event_type": "execution_completed"}]},
+                {"job_id": other_id, "status": "queued", "logs": []},
+            ],
+        })
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await communicator.disconnect()
+
+
+class StreamTokenViewTests(JobServerTestCase):
+    def test_issues_a_token_behind_the_internal_secret(self):
+        client = APIClient()
+        body = {"account_id": "acct-1", "board_ids": ["board-1"]}
+        with self.settings(INTERNAL_API_SECRET=SECRET):
+            self.assertEqual(client.post("/api/jobs/stream-token", body, format="json").status_code, 401)
+            response = client.post("/api/jobs/stream-token", body, format="json", HTTP_X_INTERNAL_SECRET=SECRET)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(stream_tokens.grants(response.json()["token"]), ("acct-1", {"board-1"}))
+
+    def test_rejects_a_missing_account(self):
+        response = APIClient().post("/api/jobs/stream-token", {"board_ids": []}, format="json")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,165 @@
+import datetime
+from collections import OrderedDict
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from common import cron, job_state, metrics
+from common.models import Job, JobStatus, ScheduleType
+from common.tasks import _complete_job, enqueue_due_cron_jobs
+from common.tests.base import JobServerTestCase, job_item
+
+
+class EnqueueDueCronJobsTests(JobServerTestCase):
+    def make_cron_job(self, expression="*/5 * * * *", due=True):
+        offset = datetime.timedelta(minutes=1)
+        return self.make_job(
+            schedule_type=ScheduleType.CRON,
+            cron_expression=expression,
+            scheduled_at=timezone.now() - offset if due else timezone.now() + offset,
+        )
+
+    def published_ids(self):
+        return [kwargs["args"][0] for kwargs in self.published]
+
+    def test_due_jobs_are_enqueued_once_and_rescheduled(self):
+        due = self.make_cron_job()
+        later = self.make_cron_job(due=False)
+
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 1)
+        self.assertEqual(self.published_ids(), [str(due.id)])
+        due.refresh_from_db()
+        self.assertGreater(due.scheduled_at, timezone.now())
+        self.assertEqual(due.scheduled_at, cron.next_run("*/5 * * * *", due.scheduled_at - datetime.timedelta(minutes=5)))
+
+        # An overlapping tick finds nothing left to claim.
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 0)
+        self.assertEqual(len(self.published), 1)
+        later.refresh_from_db()
+        self.assertIsNone(later.claim_token)
+
+    def test_every_chunk_is_claimed(self):
+        jobs = [self.make_cron_job() for _ in range(5)]
+        with self.settings(CRON_SCAN_CHUNK_SIZE=2):
+            self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 5)
+        self.assertEqual(sorted(self.published_ids()), sorted(str(job.id) for job in jobs))
+
+    def test_unparseable_expression_is_unscheduled(self):
+        job = self.make_cron_job()
+        Job.objects.filter(id=job.id).update(cron_expression="not a cron")
+
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 0)
+        job.refresh_from_db()
+        self.assertIsNone(job.scheduled_at)
+
+    def test_missing_croniter_fails_without_touching_jobs(self):
+        job = self.make_cron_job()
+        with mock.patch.object(cron, "croniter", None):
+            with self.assertRaises(ImproperlyConfigured):
+                enqueue_due_cron_jobs()
+            with self.assertRaises(ImproperlyConfigured):
+                cron.validate("*/5 * * * *")
+        job.refresh_from_db()
+        self.assertIsNotNone(job.scheduled_at)
+        self.assertIsNone(job.claim_token)
+        self.assertEqual(self.published, [])
+
+    def test_a_run_still_retrying_is_not_claimed_again(self):
+        job = self.make_cron_job()
+        enqueue_due_cron_jobs()
+        job.refresh_from_db()
+        job_state.transition(job, JobStatus.RUNNING)
+        job_state.transition(job, JobStatus.QUEUED)  # failed; its retry is waiting in the broker
+        Job.objects.filter(id=job.id).update(scheduled_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 0)
+
+        job.refresh_from_db()
+        job_state.transition(job, JobStatus.RUNNING)
+        _complete_job(job, 2, None)  # the retry succeeded
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.QUEUED)
+        self.assertIsNone(job.claim_token)
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 1)
+        self.assertEqual(self.published_ids(), [str(job.id), str(job.id)])
+
+    @override_settings(CRON_CLAIM_TIMEOUT=3600)
+    def test_a_lost_run_is_claimed_again_after_the_timeout(self):
+        job = self.make_cron_job()
+        enqueue_due_cron_jobs()
+        due = timezone.now() - datetime.timedelta(seconds=1)
+        Job.objects.filter(id=job.id).update(scheduled_at=due, updated_at=timezone.now() - datetime.timedelta(minutes=59))
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 0)
+
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - datetime.timedelta(minutes=61))
+        self.assertEqual(enqueue_due_cron_jobs()["enqueued"], 1)
+
+    def test_tick_is_measured(self):
+        self.make_cron_job()
+        self.make_cron_job()
+        ticks = sum(metrics.CRON_TICK.values.get((), [0])[:-1])  # bucket counts; the last entry is the sum
+        enqueued = metrics.CRON_ENQUEUED.values.get((), 0)
+
+        enqueue_due_cron_jobs()
+
+        self.assertEqual(sum(metrics.CRON_TICK.values[()][:-1]), ticks + 1)
+        self.assertEqual(metrics.CRON_ENQUEUED.values[()], enqueued + 2)
+
+
+@override_settings(CRON_CACHE_SIZE=2)
+class CronCacheTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(cron, "_compiled", OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(cron, "croniter", wraps=cron.croniter)
+        self.croniter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_an_expression_is_parsed_once(self):
+        base = timezone.now().replace(second=0, microsecond=0)
+        cron.validate("0 * * * *")
+        first = cron.next_run("0 * * * *", base)
+        self.assertEqual(cron.next_run("0 * * * *", base), first)
+        self.assertEqual(cron.next_run("0 * * * *", base + datetime.timedelta(seconds=30)), first)
+        self.assertEqual(self.croniter.call_count, 1)
+        self.assertGreater(first, base)
+        self.assertEqual(first.minute, 0)
+
+    def test_next_runs_computes_each_distinct_expression_once(self):
+        base = timezone.now()
+        with mock.patch.object(cron, "next_run", wraps=cron.next_run) as next_run:
+            runs = cron.next_runs(["0 * * * *"] * 50 + ["*/5 * * * *"] * 50 + ["nope"], base)
+        self.assertEqual(next_run.call_count, 3)
+        self.assertEqual(runs["0 * * * *"], cron.next_run("0 * * * *", base))
+        self.assertIsNone(runs["nope"])
+
+    def test_cache_is_bounded_least_recently_used_first(self):
+        for expression in ("0 * * * *", "*/5 * * * *", "0 * * * *", "0 0 * * *"):
+            cron.validate(expression)
+        self.assertEqual(list(cron._compiled), ["0 * * * *", "0 0 * * *"])
+        self.assertEqual(cron.cache_info(), {"size": 2, "max_size": 2})
+
+
+class CronValidationTests(JobServerTestCase):
+    def create(self, schedule):
+        body = job_item(task_type="scheduled_cron_task", schedule=schedule)
+        return self.client.post("/api/jobs/create", body, content_type="application/json")
+
+    def test_invalid_expressions_are_rejected_with_400(self):
+        for expression in ("not a cron", "61 * * * *", "* * *", 5):
+            response = self.create({"type": "cron", "expression": expression})
+            self.assertEqual(response.status_code, 400, expression)
+            self.assertIn("schedule", response.json())
+        self.assertEqual(self.create({"type": "cron"}).status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_valid_expression_creates_a_scheduled_job(self):
+        response = self.create({"type": "cron", "expression": "*/5 * * * *"})
+        self.assertEqual(response.status_code, 201)
+        job = Job.objects.get(id=response.json()["id"])
+        self.assertEqual(job.schedule_type, ScheduleType.CRON)
+        self.assertGreater(job.scheduled_at, timezone.now())
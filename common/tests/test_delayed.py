@@ -0,0 +1,69 @@
+import time
+from unittest import mock
+
+import redis
+from django.test import override_settings
+
+from common import delayed
+from common.tasks import _run_later, dispatch_delayed_jobs, run_job
+from common.tests.base import JobServerTestCase, job_item
+
+
+@override_settings(DELAYED_STORE_ENABLED=True, DELAYED_MIN_SECONDS=5, DELAYED_DISPATCH_BATCH=2)
+class DelayedStoreTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = time.time()
+        clock = mock.Mock(time=lambda: self.now)
+        self.patch(mock.patch.object(delayed, "time", clock))
+
+    def create_delayed(self, seconds):
+        item = job_item(task_type="delayed_archive", schedule={"type": "delay_from_now", "duration_seconds": seconds})
+        response = self.client.post("/api/jobs/create", item, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def test_long_delays_wait_in_redis_until_due(self):
+        job_id = self.create_delayed(600)
+        self.assertEqual(self.published, [])
+        self.assertEqual(delayed.pending(), 1)
+
+        self.assertEqual(dispatch_delayed_jobs(), 0)
+        self.now += 601
+        self.assertEqual(dispatch_delayed_jobs(), 1)
+        self.assertEqual(delayed.pending(), 0)
+        message = self.published[0]
+        self.assertEqual(message["args"], [job_id])
+        self.assertNotIn("countdown", message)
+        self.assertNotIn("eta", message)
+        self.assertEqual(message["queue"], "jobs.short")
+
+    def test_short_waits_use_a_broker_countdown(self):
+        job = self.make_job()
+        _run_later(job, 2, "polling")
+        self.assertEqual(delayed.pending(), 0)
+        self.assertEqual(self.published[0]["countdown"], 2)
+
+    def test_due_runs_go_out_in_batches_oldest_first(self):
+        jobs = [self.make_job() for _ in range(5)]
+        for offset, job in enumerate(jobs):
+            self.assertTrue(delayed.hold([(job.id, self.now + 10 + offset, {"queue": "jobs.default"})]))
+        self.now += 100
+        self.assertEqual(dispatch_delayed_jobs(), 5)
+        self.assertEqual([m["args"][0] for m in self.published], [str(job.id) for job in jobs])
+
+    def test_failed_publish_puts_the_runs_back(self):
+        job = self.make_job()
+        delayed.hold([(job.id, self.now + 10, {"queue": "jobs.default"})])
+        self.now += 10
+        with mock.patch.object(run_job, "apply_async", side_effect=ConnectionError("broker down")):
+            with self.assertRaises(ConnectionError):
+                dispatch_delayed_jobs()
+        self.assertEqual(delayed.pending(), 1)
+        self.assertEqual(dispatch_delayed_jobs(), 1)
+
+    def test_redis_down_falls_back_to_a_countdown(self):
+        job = self.make_job()
+        with mock.patch.object(delayed.redis_client, "zadd", side_effect=redis.ConnectionError("down")):
+            _run_later(job, 600, "retry")
+        self.assertEqual(self.published[0]["countdown"], 600)
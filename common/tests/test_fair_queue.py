@@ -0,0 +1,85 @@
+from unittest import mock
+
+import redis
+from django.test import override_settings
+
+from common import fair_queue, tasks
+from common.models import Job
+from common.tests.base import JobServerTestCase, job_item
+
+QUEUE = "jobs.default"
+
+
+@override_settings(FAIR_DISPATCH_ENABLED=True, FAIR_QUANTUM=2, FAIR_APP_WEIGHTS={}, FAIR_QUEUE_TARGET_DEPTH=10)
+class FairQueueTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch(mock.patch.object(fair_queue, "_hold_skip_until", 0.0))
+
+    def hold(self, account_id, count, app_name="app_a"):
+        names = [f"{account_id}-{i}" for i in range(count)]
+        self.assertTrue(fair_queue.hold([(name, app_name, account_id, {"queue": QUEUE}) for name in names]))
+        return names
+
+    def popped(self, budget):
+        return [job_id for job_id, _ in fair_queue.pop(QUEUE, budget)]
+
+    def test_deficit_round_robin_shares_the_budget(self):
+        self.hold("big", 20)
+        self.hold("small", 3)
+        self.assertEqual(self.popped(10), [
+            "big-0", "big-1", "small-0", "small-1", "big-2", "big-3", "small-2", "big-4", "big-5", "big-6",
+        ])
+        self.assertEqual(fair_queue.pending(QUEUE), {fair_queue.flow_key(QUEUE, "app_a", "big"): 13})
+
+    def test_a_new_account_waits_at_most_one_round(self):
+        self.hold("big", 20)
+        self.assertEqual(self.popped(4), ["big-0", "big-1", "big-2", "big-3"])
+        self.hold("late", 1)
+        self.assertEqual(self.popped(3), ["big-4", "big-5", "late-0"])
+
+    def test_app_weights_scale_the_quantum(self):
+        self.hold("a", 10, app_name="app_a")
+        self.hold("b", 10, app_name="app_b")
+        with self.settings(FAIR_APP_WEIGHTS={"app_b": 2}):
+            popped = self.popped(12)
+        self.assertEqual(sum(job_id.startswith("b-") for job_id in popped), 8)
+
+    def test_dispatch_tops_the_broker_queue_up_and_kicks_again(self):
+        self.hold("acct-1", 15)
+        with mock.patch.object(tasks, "_broker_depth", return_value=4):
+            self.assertEqual(tasks.dispatch_fair_queue(), 6)
+        self.assertEqual([kwargs["args"] for kwargs in self.published], [[f"acct-1-{i}"] for i in range(6)])
+        self.assertTrue(all(kwargs["queue"] == QUEUE for kwargs in self.published))
+        tasks.dispatch_fair_queue.apply_async.assert_called_once_with(countdown=mock.ANY)
+
+    def test_created_jobs_are_held_until_dispatched(self):
+        response = self.client.post("/api/jobs/create", job_item(), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.published, [])
+        with mock.patch.object(tasks, "_broker_depth", return_value=0):
+            tasks.dispatch_fair_queue()
+        self.assertEqual([kwargs["args"] for kwargs in self.published], [[response.json()["id"]]])
+
+    def test_redis_down_publishes_directly(self):
+        with mock.patch.object(fair_queue, "_push", side_effect=redis.ConnectionError("down")):
+            response = self.client.post("/api/jobs/create", job_item(), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([kwargs["args"] for kwargs in self.published], [[response.json()["id"]]])
+        self.assertTrue(Job.objects.filter(id=response.json()["id"]).exists())
+
+    def test_hold_skips_redis_for_the_backoff_after_an_error(self):
+        entries = [("job-1", "app_a", "acct-1", {"queue": QUEUE})]
+        with self.settings(FAIR_HOLD_BACKOFF_SECONDS=5), \
+                mock.patch.object(fair_queue, "time") as clock, \
+                mock.patch.object(fair_queue, "_push", side_effect=redis.TimeoutError("timed out")) as push:
+            clock.monotonic.return_value = 100.0
+            self.assertFalse(fair_queue.hold(entries))
+            clock.monotonic.return_value = 104.9
+            self.assertFalse(fair_queue.hold(entries))
+            self.assertEqual(push.call_count, 1)
+
+            push.side_effect = None
+            clock.monotonic.return_value = 105.0
+            self.assertTrue(fair_queue.hold(entries))
+            self.assertEqual(push.call_count, 2)
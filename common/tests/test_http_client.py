@@ -0,0 +1,94 @@
+import io
+import json
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from common import http_client
+from common.models import Job, JobLogErrorType, JobStatus, ScheduleType
+from common.tasks import run_job
+from common.tests.base import JobServerTestCase
+
+DEFAULTS = {"CALLBACK_CONNECT_TIMEOUT": 5, "CALLBACK_READ_TIMEOUT": 30}
+
+
+@override_settings(**DEFAULTS)
+class HostTimeoutTests(SimpleTestCase):
+    def test_host_key_fills_in_the_default_port(self):
+        self.assertEqual(http_client.host_key("https://API.example.com/x?y=1"), "https://api.example.com:443")
+        self.assertEqual(http_client.host_key("http://api.example.com:8080/x"), "http://api.example.com:8080")
+
+    @override_settings(CALLBACK_HOST_TIMEOUTS={"api.example.com": {"connect": 2, "read": 60}})
+    def test_bare_host_covers_both_schemes_on_their_default_ports(self):
+        for url in ("http://api.example.com/a", "https://api.example.com/a", "https://api.example.com:443/a"):
+            self.assertEqual(http_client.get_timeout(url), (2, 60), url)
+        self.assertEqual(http_client.get_timeout("https://api.example.com:8443/a"), (5, 30))
+        self.assertEqual(http_client.get_timeout("https://other.example.com/a"), (5, 30))
+
+    @override_settings(CALLBACK_HOST_TIMEOUTS={"localhost:3000": {"read": 90}})
+    def test_bare_host_and_port(self):
+        self.assertEqual(http_client.get_timeout("http://localhost:3000/cb"), (5, 90))
+        self.assertEqual(http_client.get_timeout("http://localhost/cb"), (5, 30))
+
+    @override_settings(
+        CALLBACK_HOST_TIMEOUTS={
+            "https://api.example.com": {"read": 120},
+            "api.example.com": {"read": 60},
+        }
+    )
+    def test_scheme_entry_wins_over_bare_host(self):
+        self.assertEqual(http_client.get_timeout("https://api.example.com/a"), (5, 120))
+        self.assertEqual(http_client.get_timeout("http://api.example.com/a"), (5, 60))
+
+    def test_pool_is_shared_per_host_key(self):
+        a = http_client.get_session("https://api.example.com/a")
+        self.assertIs(a, http_client.get_session("https://api.example.com:443/b"))
+        self.assertIsNot(a, http_client.get_session("http://api.example.com/a"))
+
+
+def callback_response(body, headers=None):
+    """A stream=True style response whose body is read from memory."""
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.url = "http://callbacks.test/done"
+    resp.headers.update(headers or {})
+    resp.raw = io.BytesIO(body)
+    return resp
+
+
+@override_settings(CALLBACK_MAX_RESPONSE_BYTES=1024, POLLING_STATE_MAX_BYTES=64)
+class SizeLimitTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job(
+            task_type="polling_task", schedule_type=ScheduleType.POLLING, polling_interval=60,
+            polling_state={"cursor": 1},
+        )
+
+    def run_with(self, resp):
+        with mock.patch.object(http_client, "post", return_value=resp):
+            run_job.apply(args=[str(self.job.id)])
+        return Job.objects.get(id=self.job.id)
+
+    def assertFailedPermanently(self, job, message):
+        self.assertEqual(job.status, JobStatus.FAILED)
+        failure = job.logs.get(event_type="execution_failed")
+        self.assertEqual(failure.error_type, JobLogErrorType.PERMANENT)
+        self.assertIn(message, failure.metadata["message"])
+        self.assertEqual(job.logs.filter(event_type="execution_started").count(), 1)  # not retried
+        self.assertEqual(self.published, [])
+
+    def test_declared_oversize_body_fails_without_retry(self):
+        resp = callback_response(b"{}", headers={"Content-Length": "4096"})
+        self.assertFailedPermanently(self.run_with(resp), "CALLBACK_MAX_RESPONSE_BYTES")
+
+    def test_streamed_oversize_body_fails_without_retry(self):
+        body = json.dumps({"done": False, "pad": "x" * 4096}).encode()
+        self.assertFailedPermanently(self.run_with(callback_response(body)), "CALLBACK_MAX_RESPONSE_BYTES")
+
+    def test_oversize_polling_state_fails_without_retry(self):
+        body = json.dumps({"done": False, "polling_state": {"cursor": "x" * 128}}).encode()
+        job = self.run_with(callback_response(body))
+        self.assertFailedPermanently(job, "POLLING_STATE_MAX_BYTES")
+        self.assertEqual(job.polling_state, {"cursor": 1})
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from unittest import mock
+
+import redis
+from django.test import override_settings
+from django.utils import timezone
+
+from common import idempotency
+from common.models import Job
+from common.redis_client import redis_client
+from common.tests.base import JobServerTestCase, job_item
+
+
+@override_settings(IDEMPOTENCY_KEY_TTL=3600)
+class IdempotentCreateTests(JobServerTestCase):
+    def create(self, key, **overrides):
+        return self.client.post(
+            "/api/jobs/create", job_item(**overrides), content_type="application/json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_a_replay_returns_the_original_job(self):
+        first = self.create("order-1")
+        self.assertEqual(first.status_code, 201)
+        replay = self.create("order-1", data={"rows": 2})
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json()["id"], first.json()["id"])
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(len(self.published), 1)
+
+    def test_keys_are_scoped_per_app_and_body_field_works_too(self):
+        first = self.create("order-1")
+        body = job_item(idempotency_key="order-2")
+        second = self.client.post("/api/jobs/create", body, content_type="application/json")
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(idempotency.lookup("app_a", "order-2"), second.json()["id"])
+        self.assertIsNone(idempotency.lookup("app_b", "order-1"))
+
+    def test_replays_are_answered_from_the_db_without_redis(self):
+        job_id = self.create("order-1").json()["id"]
+        self.redis.flushall()
+        self.assertEqual(idempotency.lookup("app_a", "order-1"), job_id)
+        self.assertEqual(self.redis.get("idem:app_a:order-1").decode(), job_id)  # cached again
+
+        with mock.patch.object(redis_client, "get", side_effect=redis.ConnectionError("down")):
+            self.assertEqual(self.create("order-1").json()["id"], job_id)
+
+    def test_a_race_past_the_lookup_still_replays(self):
+        job_id = self.create("order-1").json()["id"]
+        lookup = idempotency.lookup
+        missed = []
+
+        def miss_first(*args):
+            # The view's lookup misses, as if the first request had not committed yet.
+            if not missed:
+                missed.append(args)
+                return None
+            return lookup(*args)
+
+        with mock.patch.object(idempotency, "lookup", side_effect=miss_first):
+            replay = self.create("order-1")
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()["id"], job_id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_an_expired_key_can_be_used_again(self):
+        old_id = self.create("order-1").json()["id"]
+        Job.objects.filter(id=old_id).update(created_at=timezone.now() - timedelta(hours=2))
+        self.redis.flushall()
+
+        fresh = self.create("order-1")
+        self.assertEqual(fresh.status_code, 201)
+        self.assertNotEqual(fresh.json()["id"], old_id)
+        self.assertIsNone(Job.objects.get(id=old_id).idempotency_key)
+
+    def test_bulk_looks_up_every_key_in_one_round_trip(self):
+        cached = self.create("order-1").json()["id"]
+        from_db = self.create("order-2").json()["id"]
+        self.redis.delete("idem:app_a:order-2")
+        items = [job_item(idempotency_key=key) for key in ("order-1", "order-2", "order-3", "order-3")]
+
+        with mock.patch.object(redis_client, "mget", wraps=redis_client.mget) as mget:
+            response = self.client.post("/api/jobs/bulk", items, content_type="application/json")
+
+        mget.assert_called_once()
+        self.assertEqual(len(mget.call_args.args[0]), 3)
+        results = response.json()["results"]
+        self.assertEqual([(r["id"], r.get("duplicate", False)) for r in results[:2]], [(cached, True), (from_db, True)])
+        self.assertEqual([r.get("duplicate", False) for r in results[2:]], [False, True])
+        self.assertEqual(results[2]["id"], results[3]["id"])
+        self.assertEqual(self.redis.get("idem:app_a:order-2").decode(), from_db)  # refilled from the DB
@@ -0,0 +1,112 @@
+from django.test import override_settings
+from django.utils import timezone
+
+from common import job_state
+from common.models import Job, JobLog, JobLogErrorType, JobStatus, ScheduleType
+from common.tasks import recover_stuck_jobs, run_job
+from common.tests.base import JobServerTestCase
+
+
+class TransitionTests(JobServerTestCase):
+    def test_moves_the_job_and_records_its_log(self):
+        job = self.make_job()
+        log = {"event_type": "execution_started", "idempotency_key": f"{job.id}::started::1", "attempt_number": 1}
+
+        self.assertTrue(job_state.transition(job, JobStatus.RUNNING, log=log))
+
+        self.assertEqual(job.status, JobStatus.RUNNING)
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.RUNNING)
+        self.assertEqual(list(JobLog.objects.values_list("event_type", "attempt_number")), [("execution_started", 1)])
+
+    def test_rejects_edges_the_state_machine_does_not_have(self):
+        job = self.make_job(status=JobStatus.COMPLETED)
+        with self.assertRaises(job_state.InvalidTransition):
+            job_state.transition(job, JobStatus.RUNNING)
+        with self.assertRaises(job_state.InvalidTransition):
+            job_state.transition(job, JobStatus.COMPLETED, from_statuses=(JobStatus.PENDING,))
+
+    def test_loses_to_a_writer_that_moved_the_job_first(self):
+        job = self.make_job()
+        Job.objects.filter(id=job.id).update(status=JobStatus.CANCELLED)
+
+        log = {"event_type": "execution_started", "idempotency_key": f"{job.id}::started::1"}
+        self.assertFalse(job_state.transition(job, JobStatus.RUNNING, log=log))
+
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.CANCELLED)
+        self.assertFalse(JobLog.objects.exists())
+
+    def test_where_adds_conditions_on_the_row(self):
+        job = self.make_job(status=JobStatus.RUNNING)
+        past = timezone.now() - timezone.timedelta(hours=1)
+        self.assertFalse(job_state.transition(job, JobStatus.QUEUED, where={"updated_at__lt": past}))
+        self.assertTrue(job_state.transition(job, JobStatus.QUEUED, where={"updated_at__gt": past}))
+
+    def test_repeated_log_key_is_kept_once(self):
+        job = self.make_job(status=JobStatus.RUNNING)
+        log = {"event_type": "execution_failed", "idempotency_key": f"{job.id}::failure::1"}
+        job_state.transition(job, JobStatus.QUEUED, log=log)
+        job_state.transition(job, JobStatus.RUNNING)
+        job_state.transition(job, JobStatus.QUEUED, log=log)
+        self.assertEqual(JobLog.objects.count(), 1)
+
+
+class RunJobClaimTests(JobServerTestCase):
+    def test_runs_a_queued_job_once(self):
+        job = self.make_job(payload={"data": {}})  # no callback: completes straight away
+
+        run_job.apply(args=[str(job.id)])
+        run_job.apply(args=[str(job.id)])  # a second delivery of the same message
+
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.COMPLETED)
+        self.assertEqual(JobLog.objects.filter(event_type="execution_started").count(), 1)
+
+    def test_does_not_claim_a_running_job(self):
+        job = self.make_job(status=JobStatus.RUNNING, payload={"data": {}})
+        run_job.apply(args=[str(job.id)])
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.RUNNING)
+        self.assertFalse(JobLog.objects.exists())
+
+
+@override_settings(RUNNING_RECOVERY_SECONDS=300)
+class RecoverStuckJobsTests(JobServerTestCase):
+    def make_stuck(self, attempt_number=1, age_seconds=600, **fields):
+        job = self.make_job(status=JobStatus.RUNNING, **fields)
+        JobLog.objects.create(
+            job=job,
+            event_type="execution_started",
+            attempt_number=attempt_number,
+            idempotency_key=f"{job.id}::started::{attempt_number}",
+        )
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timezone.timedelta(seconds=age_seconds))
+        return job
+
+    def test_requeues_a_stuck_job_as_its_next_attempt(self):
+        job = self.make_stuck(attempt_number=2)
+
+        self.assertEqual(recover_stuck_jobs(), 1)
+
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.QUEUED)
+        lost = JobLog.objects.get(idempotency_key=f"{job.id}::lost::2")
+        self.assertEqual((lost.event_type, lost.error_type), ("execution_failed", JobLogErrorType.TRANSIENT))
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(self.published[0]["args"], [str(job.id)])
+        self.assertEqual(self.published[0]["retries"], 2)  # next run is attempt 3
+
+    def test_fails_a_stuck_job_that_used_its_last_attempt(self):
+        job = self.make_stuck(attempt_number=4, payload={"max_retries": 3})
+
+        recover_stuck_jobs()
+
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.FAILED)
+        self.assertEqual(self.published, [])
+
+    def test_leaves_recent_running_jobs_alone(self):
+        job = self.make_stuck(age_seconds=60)
+        self.assertEqual(recover_stuck_jobs(), 0)
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.RUNNING)
+
+    def test_recovers_a_job_whose_started_log_was_lost(self):
+        job = self.make_job(status=JobStatus.RUNNING, schedule_type=ScheduleType.POLLING)
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(recover_stuck_jobs(), 1)
+        self.assertEqual(self.published[0]["retries"], 1)
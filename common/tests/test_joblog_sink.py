@@ -0,0 +1,111 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import override_settings
+from django.utils import timezone
+
+from common import job_state, joblog_sink, tasks
+from common.joblog_sink import JobLogBuffer
+from common.models import JobLog, JobStatus
+from common.tests.base import JobServerTestCase
+
+
+class JobLogBufferTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job()
+
+    def buffer(self, **options):
+        options = {"max_size": 100, "max_delay": 3600, "enabled": True, "retry_seconds": 0, **options}
+        return JobLogBuffer(**options)
+
+    def record(self, sink, key):
+        sink.record(self.job.id, event_type="execution_started", idempotency_key=key)
+
+    def test_flush_writes_and_dedups_by_key(self):
+        sink = self.buffer()
+        self.record(sink, "a")
+        self.record(sink, "a")
+        self.record(sink, "b")
+        self.assertEqual(sink.flush(), 2)
+        self.assertEqual(sorted(JobLog.objects.values_list("idempotency_key", flat=True)), ["a", "b"])
+        self.assertEqual(sink.pending(), 0)
+
+    def test_failed_write_keeps_events_for_the_next_flush(self):
+        sink = self.buffer()
+        self.record(sink, "a")
+        self.record(sink, "b")
+        with mock.patch.object(sink, "_bulk_create", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                sink.flush()
+        self.assertEqual(sink.pending(), 2)
+        self.record(sink, "c")
+
+        self.assertEqual(sink.flush(), 3)
+        self.assertEqual(list(JobLog.objects.order_by("id").values_list("idempotency_key", flat=True)), ["a", "b", "c"])
+
+    def test_requeued_events_are_capped_oldest_first(self):
+        sink = self.buffer(max_pending=2)
+        for key in ("a", "b", "c"):
+            self.record(sink, key)
+        with mock.patch.object(sink, "_bulk_create", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                sink.flush()
+        sink.flush()
+        self.assertEqual(sorted(JobLog.objects.values_list("idempotency_key", flat=True)), ["b", "c"])
+
+    def test_a_full_buffer_does_not_retry_before_the_backoff(self):
+        sink = self.buffer(max_size=1, max_delay=0, retry_seconds=60)
+        with mock.patch.object(sink, "_bulk_create", side_effect=OperationalError("database is locked")) as write:
+            self.record(sink, "a")  # fails inside record(), which does not raise
+            self.record(sink, "b")
+            sink.flush_if_due()
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(sink.pending(), 2)
+
+    def test_rows_carry_the_record_time_not_the_flush_time(self):
+        sink = self.buffer()
+        recorded_at = timezone.now() - timedelta(minutes=5)
+        with mock.patch("common.joblog_sink.timezone.now", return_value=recorded_at):
+            self.record(sink, "a")
+        sink.flush()
+        self.assertEqual(JobLog.objects.get().created_at, recorded_at)
+
+
+@override_settings(JOBLOG_BUFFER_ENABLED=True)
+class BufferedTransitionTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job()
+        self.sink = JobLogBuffer(max_size=1, max_delay=3600, enabled=True, retry_seconds=0)
+        self.patch(mock.patch.object(joblog_sink, "_sink", self.sink))
+
+    def transition(self):
+        return job_state.transition(
+            self.job, JobStatus.RUNNING, from_statuses=[JobStatus.QUEUED],
+            log={"event_type": "execution_started", "idempotency_key": "start"},
+        )
+
+    def test_event_is_buffered_only_after_the_transaction_commits(self):
+        with mock.patch.object(self.sink, "_bulk_create", wraps=self.sink._bulk_create) as write:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertTrue(self.transition())
+            write.assert_not_called()
+            self.assertEqual(self.sink.pending(), 0)
+            for callback in callbacks:
+                callback()
+            write.assert_called_once()
+
+        self.job.refresh_from_db()
+        self.assertEqual(JobLog.objects.get().created_at, self.job.updated_at)
+
+    def test_task_postrun_flushes_the_buffer(self):
+        self.sink.max_size = 100
+        with self.captureOnCommitCallbacks(execute=True):
+            self.transition()
+        self.assertEqual(self.sink.pending(), 1)
+
+        tasks._flush_job_logs()
+        self.assertEqual(self.sink.pending(), 0)
+        self.assertEqual(JobLog.objects.count(), 1)
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from common import metrics
+
+SECRET = "s3cret"
+
+
+@override_settings(METRICS_ENABLED=True)
+class RenderTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(metrics, "_registry", [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counter_and_histogram_text_format(self):
+        counter = metrics.Counter("test_runs", "Runs.", ["outcome"])
+        histogram = metrics.Histogram("test_seconds", "Durations.", buckets=(0.1, 1.0))
+        counter.inc(outcome='say "hi"\n')
+        counter.inc(2, outcome='say "hi"\n')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(metrics.render().splitlines(), [
+            "# HELP test_runs Runs.",
+            "# TYPE test_runs counter",
+            'test_runs_total{outcome="say \\"hi\\"\\n"} 3',
+            "# HELP test_seconds Durations.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1.0"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            "test_seconds_sum 5.55",
+            "test_seconds_count 3",
+        ])
+
+    def test_nothing_is_recorded_when_disabled(self):
+        counter = metrics.Counter("test_runs", "Runs.")
+        histogram = metrics.Histogram("test_seconds", "Durations.")
+        with self.settings(METRICS_ENABLED=False):
+            counter.inc()
+            histogram.observe(1)
+            with metrics.timed(histogram):
+                pass
+        self.assertEqual(counter.values, {})
+        self.assertEqual(histogram.values, {})
+
+
+@override_settings(METRICS_ENABLED=True, INTERNAL_API_SECRET="", METRICS_ALLOWED_IPS=[])
+class MetricsViewTests(SimpleTestCase):
+    def test_serves_the_text_format(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn("# TYPE jobserver_run_job counter", response.content.decode())
+
+    def test_disabled_metrics_are_not_found(self):
+        with self.settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_secret_guards_the_endpoint(self):
+        with self.settings(INTERNAL_API_SECRET=SECRET):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_X_INTERNAL_SECRET="wrong").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_X_INTERNAL_SECRET=SECRET).status_code, 200)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION=f"Bearer {SECRET}").status_code, 200)
+
+    def test_allowlisted_addresses_need_no_secret(self):
+        with self.settings(INTERNAL_API_SECRET=SECRET, METRICS_ALLOWED_IPS=["10.0.0.0/8", "::1"]):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 200)
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="::1").status_code, 200)
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="192.168.1.1").status_code, 403)
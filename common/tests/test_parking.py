@@ -0,0 +1,62 @@
+from unittest import mock
+
+import redis
+from django.test import override_settings
+
+from common import parking, rate_limiter
+from common.models import Job, JobStatus
+from common.tasks import _pause_rate_limited, release_parked_jobs
+from common.tests.base import JobServerTestCase
+
+
+@override_settings(
+    RATE_LIMIT_DEFAULT={"capacity": 61, "per_seconds": 60, "burst": 1},  # one token a second
+    RATE_LIMIT_OVERRIDES={},
+    RATE_LIMIT_PARKING_ENABLED=True,
+    DELAYED_STORE_ENABLED=False,
+)
+class ParkingTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = self.use_fake_clock()
+        self.bucket = rate_limiter.bucket_key("acct-1")
+        # Empty the bucket so parked jobs come out one per second.
+        self.assertTrue(rate_limiter.check_rate_limit("acct-1")["allowed"])
+
+    def pause(self):
+        job = self.make_job(status=JobStatus.RUNNING)
+        _pause_rate_limited(job, 1, {"allowed": False, "retry_after_seconds": 1, "bucket": self.bucket})
+        return job
+
+    def released_ids(self):
+        return [kwargs["args"][0] for kwargs in self.published if kwargs.get("kwargs") == {"rate_token": True}]
+
+    def test_parked_jobs_are_released_in_order_as_tokens_refill(self):
+        first, second = self.pause(), self.pause()
+        self.assertEqual(Job.objects.get(id=first.id).status, JobStatus.PAUSED_RATE_LIMITED)
+        self.assertEqual(parking.queue_position("acct-1", None, second.id), 2)
+
+        self.assertEqual(release_parked_jobs(), 0)
+        self.clock.advance(1)
+        self.assertEqual(release_parked_jobs(), 1)
+        self.clock.advance(1)
+        self.assertEqual(release_parked_jobs(), 1)
+        self.assertEqual(self.released_ids(), [str(first.id), str(second.id)])
+
+    def test_a_failed_park_requeues_the_job_after_the_wait(self):
+        with mock.patch.object(parking, "park", side_effect=redis.ConnectionError("down")):
+            job = self.pause()
+        self.assertEqual(Job.objects.get(id=job.id).status, JobStatus.PAUSED_RATE_LIMITED)
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(self.published[0]["args"], [str(job.id)])
+        self.assertEqual(self.published[0]["countdown"], 1)
+
+    def test_jobs_no_longer_paused_are_dropped_without_using_tokens(self):
+        cancelled, waiting = self.pause(), self.pause()
+        Job.objects.filter(id=cancelled.id).update(status=JobStatus.CANCELLED)
+
+        self.clock.advance(1)
+        self.assertEqual(release_parked_jobs(), 1)
+        self.assertEqual(self.released_ids(), [str(waiting.id)])
+        self.assertIsNone(parking.queue_position("acct-1", None, cancelled.id))
+        self.assertFalse(self.redis.hexists(parking.PARKED_BUCKETS_KEY, self.bucket))
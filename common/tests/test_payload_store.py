@@ -0,0 +1,55 @@
+import json
+import tempfile
+
+from django.test import override_settings
+
+from common import payload_store
+from common.models import Job
+from common.tests.base import JobServerTestCase, job_item
+
+
+class PayloadStoreTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(PAYLOAD_STORE_DIR=directory.name, PAYLOAD_INLINE_MAX_BYTES=1024)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def big_data(self, seed="x"):
+        return {"rows": [{"name": f"{seed}-{i}", "value": i} for i in range(200)]}
+
+    def test_small_payloads_stay_inline(self):
+        payload = {"data": {"rows": 1}, "callback_url": "http://callbacks.test/done"}
+        self.assertIsNone(payload_store.offload(payload))
+        self.assertEqual(payload["data"], {"rows": 1})
+
+    def test_large_payloads_are_stored_once_per_content(self):
+        first = {"data": self.big_data(), "callback_url": "http://callbacks.test/done"}
+        second = {"data": self.big_data(), "callback_url": "http://callbacks.test/other"}
+        ref = payload_store.offload(first)
+        self.assertIsNotNone(ref)
+        self.assertNotIn("data", first)
+        self.assertEqual(payload_store.offload(second), ref)
+        self.assertEqual(payload_store.get(ref), self.big_data())
+        self.assertLess(payload_store._path(ref).stat().st_size, 1024)  # compressed
+        self.assertNotEqual(payload_store.offload({"data": self.big_data("y")}), ref)
+
+    def test_callback_body_streams_the_stored_data_in(self):
+        ref = payload_store.offload({"data": self.big_data()})
+        body = {"idempotency_key": "k_1", "payload": {"callback_url": "http://callbacks.test/done", "data": None}}
+        streamed = payload_store.callback_body(body, ref)
+        for _ in range(2):  # every iteration is a fresh read, so retries resend the same body
+            sent = json.loads(b"".join(streamed))
+            self.assertEqual(sent["payload"]["data"], self.big_data())
+            self.assertEqual(sent["idempotency_key"], "k_1")
+        self.assertIs(payload_store.callback_body(body, None), body)
+
+    def test_created_jobs_keep_only_the_ref(self):
+        response = self.client.post("/api/jobs/create", job_item(data=self.big_data()), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        job = Job.objects.get(id=response.json()["id"])
+        self.assertIsNotNone(job.payload_ref)
+        self.assertNotIn("data", job.payload)
+        self.assertEqual(payload_store.get(job.payload_ref), self.big_data())
@@ -0,0 +1,56 @@
+import bisect
+
+from django.test import override_settings
+
+from common import rate_limiter
+from common.tests.base import JobServerTestCase
+
+LIMIT = {"capacity": 90, "per_seconds": 60, "burst": 5}
+
+
+@override_settings(RATE_LIMIT_DEFAULT=LIMIT, RATE_LIMIT_OVERRIDES={}, RATE_LIMIT_LEASE_SIZE=1)
+class RateLimiterTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = self.use_fake_clock()
+
+    def allowed_times(self, seconds, step, account_id="acct-1"):
+        """Call the limiter every step seconds for seconds; the clock times of the calls it allowed."""
+        allowed = []
+        for _ in range(int(seconds / step)):
+            if rate_limiter.check_rate_limit(account_id)["allowed"]:
+                allowed.append(self.clock.now)
+            self.clock.advance(step)
+        return allowed
+
+    def max_in_window(self, times, window):
+        return max(bisect.bisect_right(times, t + window) - i for i, t in enumerate(times))
+
+    def test_no_rolling_window_exceeds_the_limit(self):
+        # Idle first so the bucket is full, then hammer it across several window boundaries.
+        rate_limiter.check_rate_limit("acct-1")
+        self.clock.advance(120)
+        times = self.allowed_times(seconds=300, step=0.1)
+        self.assertLessEqual(self.max_in_window(times, 60), 90)
+        self.assertGreaterEqual(len(times), 5 * 85)  # sustained rate is capacity - burst per window
+
+    def test_a_full_bucket_allows_only_the_burst_at_once(self):
+        results = [rate_limiter.check_rate_limit("acct-1") for _ in range(10)]
+        self.assertEqual(sum(r["allowed"] for r in results), 5)
+        self.assertEqual(results[-1]["retry_after_seconds"], 1)  # 85 per minute: next token in < 1s
+        self.assertTrue(results[-1]["bucket"].startswith("rate_limit:acct-1"))
+
+    def test_burst_is_clamped_below_the_capacity(self):
+        overrides = {"accounts": {"acct-2": {"capacity": 3, "per_seconds": 60, "burst": 50}}}
+        with self.settings(RATE_LIMIT_OVERRIDES=overrides):
+            self.assertEqual(rate_limiter.get_limit("acct-2")[:3], (3, 60.0, 2))
+            times = self.allowed_times(seconds=600, step=1, account_id="acct-2")
+        self.assertLessEqual(self.max_in_window(times, 60), 3)
+
+    def test_task_type_limits_use_their_own_bucket(self):
+        overrides = {"task_types": {"polling_task": {"capacity": 10, "per_seconds": 60, "burst": 2}}}
+        with self.settings(RATE_LIMIT_OVERRIDES=overrides):
+            self.assertEqual(rate_limiter.bucket_key("acct-1", "polling_task"), "rate_limit:acct-1:polling_task")
+            allowed = sum(rate_limiter.check_rate_limit("acct-1", "polling_task")["allowed"] for _ in range(5))
+            self.assertEqual(allowed, 2)
+            self.assertTrue(rate_limiter.check_rate_limit("acct-1")["allowed"])
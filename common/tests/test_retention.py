@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from common import retention
+from common.models import JobLog, JobLogSummary
+from common.tests.base import JobServerTestCase
+
+
+@override_settings(JOBLOG_RETENTION_DAYS=30, JOBLOG_RETENTION_OVERRIDES={})
+class CompactJobLogsTests(JobServerTestCase):
+    def log(self, job, days_old, event_type="execution_started", **fields):
+        row = JobLog.objects.create(job=job, event_type=event_type, **fields)
+        JobLog.objects.filter(id=row.id).update(created_at=timezone.now() - timedelta(days=days_old))
+        return row
+
+    def test_rolls_up_expired_rows_into_the_summary(self):
+        job = self.make_job()
+        self.log(job, 40)
+        self.log(job, 35, "execution_failed", error_type="TRANSIENT", metadata={"status_code": 503})
+        kept = self.log(job, 1)
+
+        self.assertEqual(retention.compact_job_logs(), {"default": 2})
+        self.assertEqual(list(job.logs.values_list("id", flat=True)), [kept.id])
+        summary = JobLogSummary.objects.get(job=job)
+        self.assertEqual(summary.event_counts, {"execution_started": 1, "execution_failed": 1})
+        self.assertEqual(summary.last_error["metadata"], {"status_code": 503})
+
+        self.log(job, 31)  # a later run merges into the same summary
+        retention.compact_job_logs()
+        summary.refresh_from_db()
+        self.assertEqual(summary.event_counts, {"execution_started": 2, "execution_failed": 1})
+
+    def test_jobs_without_a_registered_handler_are_compacted(self):
+        job = self.make_job(app_name="app_retired", task_type="legacy_task")
+        self.log(job, 40)
+        self.assertEqual(retention.compact_job_logs(), {"default": 1})
+        self.assertFalse(job.logs.exists())
+
+    def test_overrides_apply_most_specific_first(self):
+        overrides = {"app_a": 90, "app_a:polling_task": 7, "app_b": 0}
+        polling = self.make_job(task_type="polling_task")
+        bulk = self.make_job()
+        other_app = self.make_job(app_name="app_b")
+        unlisted = self.make_job(app_name="app_c")
+        for job in (polling, bulk, other_app, unlisted):
+            self.log(job, 40)
+
+        with self.settings(JOBLOG_RETENTION_OVERRIDES=overrides):
+            self.assertEqual(retention.compact_job_logs(), {"app_a:polling_task": 1, "default": 1})
+        self.assertFalse(polling.logs.exists())
+        self.assertTrue(bulk.logs.exists())  # app_a keeps 90 days
+        self.assertTrue(other_app.logs.exists())  # 0: forever
+        self.assertFalse(unlisted.logs.exists())
+
+    def test_stops_after_max_batches(self):
+        job = self.make_job()
+        for _ in range(5):
+            self.log(job, 40)
+        self.assertEqual(retention.compact_job_logs(batch_size=2, max_batches=2), {"default": 4})
+        self.assertEqual(job.logs.count(), 1)
@@ -0,0 +1,64 @@
+import datetime
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from common import tasks
+from common.models import ScheduleType
+from common.routing import PRIORITIES, get_handler, run_options
+from common.tests.base import JobServerTestCase, job_item
+
+
+@override_settings(JOB_QUEUES=["jobs.default", "jobs.short", "jobs.bulk"])
+class RunOptionsTests(SimpleTestCase):
+    def test_queue_follows_the_task_type(self):
+        for task_type, queue in (
+            ("bulk_excel_insert", "jobs.bulk"),
+            ("delayed_archive", "jobs.short"),
+            ("scheduled_cron_task", "jobs.default"),
+            ("polling_task", "jobs.default"),
+        ):
+            self.assertEqual(run_options("app_a", task_type, "immediate")["queue"], queue, task_type)
+
+    def test_unregistered_task_type_falls_back_to_the_first_queue(self):
+        with self.settings(JOB_QUEUES=["jobs.other", "jobs.default"]):
+            self.assertEqual(run_options("app_b", "unknown", "retry"), {"queue": "jobs.other", "priority": 6})
+
+    def test_priority_follows_the_kind_of_run(self):
+        self.assertEqual(
+            {kind: run_options("app_a", "bulk_excel_insert", kind)["priority"] for kind in PRIORITIES},
+            {"immediate": 9, "retry": 6, "polling": 3, "cron": 0},
+        )
+        with self.assertRaises(KeyError):
+            run_options("app_a", "bulk_excel_insert", "someday")
+
+    def test_get_handler(self):
+        self.assertEqual(get_handler("app_a", "polling_task").__name__, "polling_task")
+        with self.assertRaisesMessage(ValueError, "No handler registered"):
+            get_handler("app_a", "unknown")
+
+
+class PublishedRoutingTests(JobServerTestCase):
+    def routes(self):
+        return [(kwargs["queue"], kwargs["priority"]) for kwargs in self.published]
+
+    def test_created_job_goes_to_its_queue_first_in_line(self):
+        response = self.client.post("/api/jobs/create", job_item(), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.routes(), [("jobs.bulk", 9)])
+
+    def test_retry_and_polling_runs(self):
+        job = self.make_job(task_type="polling_task", schedule_type=ScheduleType.POLLING, polling_interval=1)
+        tasks.enqueue_run_jobs([(job.id, job.app_name, job.task_type)], "retry")
+        tasks._run_later(job, 1, "polling")
+        self.assertEqual(self.routes(), [("jobs.default", 6), ("jobs.default", 3)])
+
+    def test_cron_runs_go_last(self):
+        self.make_job(
+            task_type="scheduled_cron_task",
+            schedule_type=ScheduleType.CRON,
+            cron_expression="*/5 * * * *",
+            scheduled_at=timezone.now() - datetime.timedelta(minutes=1),
+        )
+        tasks.enqueue_due_cron_jobs()
+        self.assertEqual(self.routes(), [("jobs.default", 0)])
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from unittest import mock
+
+import redis
+from django.test import override_settings
+from django.utils import timezone
+
+from common import archive, job_state, status_cache
+from common.models import Job, JobLog, JobStatus
+from common.tests.base import JobServerTestCase
+
+
+class StatusCacheTests(JobServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job()
+        JobLog.objects.create(job=self.job, event_type="job_created")
+
+    def status(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(f"/api/jobs/{self.job.id}/status", **headers)
+
+    def test_a_filled_snapshot_is_served_without_the_db(self):
+        first = self.status()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(self.redis.exists(f"job_status:{self.job.id}"))
+
+        with self.assertNumQueries(0):
+            second = self.status()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_a_matching_etag_gets_304(self):
+        etag = self.status()["ETag"]
+        response = self.status(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.status('"stale"').status_code, 200)
+
+    def test_a_transition_updates_the_snapshot_and_its_etag(self):
+        etag = self.status()["ETag"]
+        job_state.transition(
+            self.job, JobStatus.RUNNING, from_statuses=[JobStatus.QUEUED],
+            log={"event_type": "execution_started", "attempt_number": 1},
+        )
+
+        with self.assertNumQueries(0):
+            response = self.status(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        body = response.json()
+        self.assertEqual(body["status"], JobStatus.RUNNING)
+        self.assertEqual([log["event_type"] for log in body["logs"]], ["execution_started", "job_created"])
+
+    def test_invalidate_drops_the_snapshot(self):
+        self.status()
+        Job.objects.filter(id=self.job.id).update(scheduled_at=timezone.now() + timedelta(hours=1))
+        status_cache.invalidate([self.job.id])
+        self.assertFalse(self.redis.exists(f"job_status:{self.job.id}"))
+        self.assertIsNotNone(self.status().json()["scheduled_at"])
+
+    @override_settings(STATUS_CACHE_ENABLED=False)
+    def test_disabled_cache_serves_from_the_db(self):
+        self.assertEqual(self.status().json()["status"], JobStatus.QUEUED)
+        self.assertEqual(self.redis.keys("job_status*"), [])
+        Job.objects.filter(id=self.job.id).update(status=JobStatus.COMPLETED)
+        self.assertEqual(self.status().json()["status"], JobStatus.COMPLETED)
+
+    def test_redis_down_serves_from_the_db(self):
+        with mock.patch.object(status_cache.redis_client, "pipeline", side_effect=redis.ConnectionError("down")):
+            response = self.status()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], JobStatus.QUEUED)
+
+    @override_settings(JOB_ARCHIVE_AFTER_DAYS=14)
+    def test_a_cold_cache_falls_back_to_the_archive(self):
+        Job.objects.filter(id=self.job.id).update(
+            status=JobStatus.COMPLETED, updated_at=timezone.now() - timedelta(days=30),
+        )
+        self.assertEqual(archive.archive_terminal_jobs(), 1)
+
+        response = self.status()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], JobStatus.COMPLETED)
+        self.assertEqual([log["event_type"] for log in response.json()["logs"]], ["job_created"])
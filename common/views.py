@@ -1,18 +1,36 @@
+import uuid
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser
-from common.models import Job, JobLog
+import redis
+from common import idempotency, metrics, parking, status_cache, stream_tokens
+from common.models import ArchivedJob, ArchivedJobLog, Job, JobLog, JobLogSummary, JobStatus
 from common.serializers import JobCreateSerializer
 from common.routing import get_handler
+from common.scheduling import bulk_scheduling
+
+LOG_FIELDS = ("event_type", "attempt_number", "error_type", "metadata", "created_at")
+# Selectable in the batch status endpoint; job_id is always returned.
+STATUS_FIELDS = ("status", "task_type", "created_at", "scheduled_at", "logs", "queue_position")
+# Also selectable, but only returned when asked for.
+EXTRA_STATUS_FIELDS = ("log_summary",)
 
 
 class JobCreateView(APIView):
+    """
+    POST /api/jobs/create – create a job. With an Idempotency-Key header (or "idempotency_key" field)
+    a repeated request returns the original job id with 200 and Idempotent-Replayed: true.
+    """
     parser_classes = [JSONParser]
 
     def post(self, request):
-        serializer = JobCreateSerializer(data=request.data)
+        serializer = JobCreateSerializer(data=_with_idempotency_header(request))
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         data = serializer.validated_data
@@ -22,31 +40,300 @@ class JobCreateView(APIView):
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
+        labels = {"app_name": data["app_name"], "task_type": data["task_type"]}
+        key = data.get("idempotency_key")
+        existing = key and idempotency.lookup(data["app_name"], key)
+        if existing:
+            metrics.JOBS_CREATED.inc(outcome="replayed", **labels)
+            return _replayed(existing)
         try:
             job_id = handler(data)
+        except idempotency.DuplicateJob as e:
+            metrics.JOBS_CREATED.inc(outcome="replayed", **labels)
+            return _replayed(e.job_id)
         except ValueError as e:
+            metrics.JOBS_CREATED.inc(outcome="rejected", **labels)
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        metrics.JOBS_CREATED.inc(outcome="created", **labels)
         return Response({"id": job_id}, status=status.HTTP_201_CREATED)
 
 
+def _with_idempotency_header(request):
+    key = request.headers.get("Idempotency-Key")
+    if key and isinstance(request.data, dict):
+        return {**request.data, "idempotency_key": key}
+    return request.data
+
+
+def _replayed(job_id):
+    return Response({"id": job_id}, status=status.HTTP_200_OK, headers={"Idempotent-Replayed": "true"})
+
+
+class JobBulkCreateView(APIView):
+    """POST /api/jobs/bulk – create many jobs in one request; results are reported per item."""
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        items = request.data.get("jobs") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "body must be a non-empty array of jobs (or {\"jobs\": [...]})"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_items = settings.BULK_CREATE_MAX_ITEMS
+        if len(items) > max_items:
+            return Response(
+                {"error": f"at most {max_items} jobs per bulk request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializers = [JobCreateSerializer(data=item) for item in items]
+        valid = [s.validated_data for s in serializers if s.is_valid()]
+        # Keys already taken, looked up for the whole request at once.
+        taken = idempotency.lookup_many(
+            (data["app_name"], data["idempotency_key"]) for data in valid if data.get("idempotency_key")
+        )
+
+        results = []
+        seen = {}  # (app_name, idempotency_key) -> job id, for repeats within this request
+        with bulk_scheduling() as batch:
+            for index, serializer in enumerate(serializers):
+                if serializer.errors:
+                    results.append({"index": index, "errors": serializer.errors})
+                    continue
+                data = serializer.validated_data
+                key = data.get("idempotency_key") and (data["app_name"], data["idempotency_key"])
+                labels = {"app_name": data["app_name"], "task_type": data["task_type"]}
+                existing = key and (seen.get(key) or taken.get(key))
+                if existing:
+                    metrics.JOBS_CREATED.inc(outcome="replayed", **labels)
+                    results.append({"index": index, "id": existing, "duplicate": True})
+                    continue
+                try:
+                    handler = get_handler(data["app_name"], data["task_type"])
+                    job_id = handler(data)
+                except ValueError as e:
+                    metrics.JOBS_CREATED.inc(outcome="rejected", **labels)
+                    results.append({"index": index, "errors": {"error": str(e)}})
+                    continue
+                if key:
+                    seen[key] = job_id
+                metrics.JOBS_CREATED.inc(outcome="created", **labels)
+                results.append({"index": index, "id": job_id})
+
+        # Keys taken by a concurrent request between the lookup and the insert.
+        for result in results:
+            if result.get("id") in batch.duplicates:
+                result.update(id=batch.duplicates[result["id"]], duplicate=True)
+        created = sum(1 for r in results if "id" in r and not r.get("duplicate"))
+        duplicates = sum(1 for r in results if r.get("duplicate"))
+        return Response(
+            {
+                "created": created,
+                "duplicates": duplicates,
+                "failed": len(results) - created - duplicates,
+                "results": results,
+            },
+            status=status.HTTP_201_CREATED if created or duplicates else status.HTTP_400_BAD_REQUEST,
+        )
+
+
 class JobStatusView(APIView):
-    """GET /api/jobs/{job_id}/status – job row + latest job_logs."""
+    """
+    GET /api/jobs/{job_id}/status – job row + latest job_logs.
+    Served from the Redis snapshot (common.status_cache) when present, else from the DB
+    (jobs, then the archive – common.archive).
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
+    """
 
     def get(self, request, job_id):
-        job = get_object_or_404(Job, id=job_id)
-        logs = (
-            JobLog.objects.filter(job=job)
-            .order_by("-created_at")[:20]
-            .values("event_type", "attempt_number", "error_type", "metadata", "created_at")
-        )
-        created_at = job.created_at.isoformat() if job.created_at else None
-        scheduled_at = job.scheduled_at.isoformat() if job.scheduled_at else None
+        try:
+            job_id = str(uuid.UUID(job_id))
+        except ValueError:
+            raise Http404
+        body = status_cache.get(job_id)
+        if body is not None:
+            etag = body.pop("etag")
+            account_id = body.pop("account_id")
+        else:
+            job = Job.objects.filter(id=job_id).first() or get_object_or_404(ArchivedJob, id=job_id)
+            logs = (
+                job.logs.all()
+                .order_by("-created_at")[: settings.STATUS_CACHE_LOGS]
+                .values(*LOG_FIELDS)
+            )
+            body = _status_body(job, list(logs))
+            account_id = job.account_id
+            etag = status_cache.fill(body, account_id)
+
+        if body["status"] == JobStatus.PAUSED_RATE_LIMITED:
+            body["queue_position"] = _queue_position(account_id, body["task_type"], job_id)
+            etag = f"{etag}-{body['queue_position']}"
+
+        etag = f'"{etag}"'
+        if etag in _parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(body, headers={"ETag": etag})
+
+
+class JobBatchStatusView(APIView):
+    """
+    POST /api/jobs/status – status of many jobs at once:
+    {"ids": [...], "fields": [...], "log_limit": n} -> {"jobs": {id: body}, "missing": [...]}.
+    One query for the jobs and one windowed query for their latest logs (plus the same two
+    on the archive for ids not in jobs). "log_summary"
+    (the rollup of logs removed by retention) is only included when listed in fields.
+    """
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {"ids": request.data}
+        ids = data.get("ids")
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {"error": "ids must be a non-empty array of job ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_ids = settings.BATCH_STATUS_MAX_IDS
+        if len(ids) > max_ids:
+            return Response(
+                {"error": f"at most {max_ids} ids per status request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        fields = data.get("fields") or list(STATUS_FIELDS)
+        if not isinstance(fields, list) or set(fields) - set(STATUS_FIELDS + EXTRA_STATUS_FIELDS):
+            return Response(
+                {"error": f"fields must be a subset of {list(STATUS_FIELDS + EXTRA_STATUS_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        log_limit = data.get("log_limit", settings.STATUS_CACHE_LOGS)
+        if not isinstance(log_limit, int) or isinstance(log_limit, bool) or not 0 <= log_limit <= 100:
+            return Response(
+                {"error": "log_limit must be an integer between 0 and 100"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        job_ids = set()
+        missing = []
+        for job_id in ids:
+            try:
+                job_ids.add(str(uuid.UUID(str(job_id))))
+            except ValueError:
+                missing.append(job_id)
+
+        jobs = Job.objects.filter(id__in=job_ids)
+        if "log_summary" in fields:
+            jobs = jobs.select_related("log_summary")
+        jobs = list(jobs)
+        archived = []
+        if len(jobs) < len(job_ids):
+            found = {str(job.id) for job in jobs}
+            archived = list(ArchivedJob.objects.filter(id__in=job_ids - found))
+        logs = {}
+        if "logs" in fields and log_limit:
+            logs.update(_latest_logs(JobLog, jobs, log_limit))
+            logs.update(_latest_logs(ArchivedJobLog, archived, log_limit))
+
+        result = {}
+        for job in jobs + archived:
+            body = _status_body(job, logs.get(str(job.id), []))
+            if "queue_position" in fields and job.status == JobStatus.PAUSED_RATE_LIMITED:
+                body["queue_position"] = _queue_position(job.account_id, job.task_type, job.id)
+            if "log_summary" in fields:
+                body["log_summary"] = _log_summary(job)
+            result[body["job_id"]] = {
+                name: value for name, value in body.items() if name == "job_id" or name in fields
+            }
+        missing.extend(job_id for job_id in job_ids if job_id not in result)
+        return Response({"jobs": result, "missing": missing})
+
+
+class StreamTokenView(APIView):
+    """
+    POST /api/jobs/stream-token – {"account_id": ..., "board_ids": [...]} returns a token that
+    lets a /ws/jobs/ socket subscribe to that account's and boards' streams (common.stream_tokens).
+    """
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        account_id = request.data.get("account_id") if isinstance(request.data, dict) else None
+        board_ids = request.data.get("board_ids", []) if isinstance(request.data, dict) else None
+        if not isinstance(account_id, (str, int)) or account_id == "":
+            return Response({"error": "account_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(board_ids, list) or not all(isinstance(b, (str, int)) for b in board_ids):
+            return Response({"error": "board_ids must be a list of ids"}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
-            "job_id": str(job.id),
-            "status": job.status,
-            "task_type": job.task_type,
-            "created_at": created_at,
-            "scheduled_at": scheduled_at,
-            "logs": list(logs),
-        })
\ No newline at end of file
+            "token": stream_tokens.issue(account_id, board_ids),
+            "expires_in": settings.WS_TOKEN_MAX_AGE,
+        })
+
+
+def _latest_logs(log_model, jobs, limit):
+    """{job_id: its latest `limit` logs, newest first} in one ROW_NUMBER() query."""
+    if not jobs:
+        return {}
+    latest = (
+        log_model.objects.filter(job_id__in=[job.id for job in jobs])
+        .annotate(
+            row=Window(
+                RowNumber(),
+                partition_by=F("job_id"),
+                order_by=F("created_at").desc(),
+            )
+        )
+        .filter(row__lte=limit)
+        .order_by("job_id", "row")
+        .values("job_id", *LOG_FIELDS)
+    )
+    logs = {}
+    for log in latest:
+        logs.setdefault(str(log.pop("job_id")), []).append(log)
+    return logs
+
+
+def _status_body(job, logs):
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "task_type": job.task_type,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "scheduled_at": job.scheduled_at.isoformat() if job.scheduled_at else None,
+        "logs": logs,
+    }
+
+
+def _log_summary(job):
+    """Rollup of the job's logs removed by retention (common.retention), or None."""
+    if isinstance(job, ArchivedJob):
+        return job.log_summary
+    try:
+        summary = job.log_summary
+    except JobLogSummary.DoesNotExist:
+        return None
+    return {
+        "event_counts": summary.event_counts,
+        "first_at": summary.first_at,
+        "last_at": summary.last_at,
+        "last_error": summary.last_error,
+    }
+
+
+def _parse_etags(header):
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+def _queue_position(account_id, task_type, job_id):
+    try:
+        return parking.queue_position(account_id, task_type, job_id)
+    except redis.RedisError:
+        return None
+
+
+def metrics_view(request):
+    """GET /metrics – this process's metrics in the Prometheus text format, for allowed scrapers only."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not metrics.scrape_allowed(request.META.get("REMOTE_ADDR"), request.headers):
+        return HttpResponse("Forbidden", status=403)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -1,16 +1,51 @@
 from celery import Celery
 from celery.schedules import crontab
+from datetime import timedelta
+from kombu import Queue
 import os
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
+from django.conf import settings
+
 app = Celery("config")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
+# "celery" keeps the periodic/maintenance tasks; run_job goes to the JOB_QUEUES (common.routing).
+app.conf.task_default_queue = "celery"
+app.conf.task_queues = [Queue("celery")] + [
+    Queue(name, routing_key=name, queue_arguments={"x-max-priority": 9})
+    for name in settings.JOB_QUEUES
+]
+
 app.conf.beat_schedule = {
     "enqueue-due-cron-jobs": {
         "task": "common.tasks.enqueue_due_cron_jobs",
         "schedule": crontab(minute="*"),  # every minute
     },
+    "release-parked-jobs": {
+        "task": "common.tasks.release_parked_jobs",
+        "schedule": timedelta(seconds=settings.PARKED_RELEASE_INTERVAL),
+    },
+    "dispatch-fair-queue": {
+        "task": "common.tasks.dispatch_fair_queue",
+        "schedule": timedelta(seconds=settings.FAIR_DISPATCH_INTERVAL),
+    },
+    "dispatch-delayed-jobs": {
+        "task": "common.tasks.dispatch_delayed_jobs",
+        "schedule": timedelta(seconds=settings.DELAYED_DISPATCH_INTERVAL),
+    },
+    "compact-job-logs": {
+        "task": "common.tasks.compact_job_logs",
+        "schedule": timedelta(seconds=settings.JOBLOG_RETENTION_INTERVAL),
+    },
+    "recover-stuck-jobs": {
+        "task": "common.tasks.recover_stuck_jobs",
+        "schedule": timedelta(seconds=settings.RUNNING_RECOVERY_INTERVAL),
+    },
+    "archive-terminal-jobs": {
+        "task": "common.tasks.archive_terminal_jobs",
+        "schedule": timedelta(seconds=settings.JOB_ARCHIVE_INTERVAL),
+    },
 }
\ No newline at end of file
@@ -1,6 +1,7 @@
 from django.urls import path
-from common.consumers import JobStatusConsumer
+from common.consumers import JobStatusConsumer, JobStreamConsumer
 
 websocket_urlpatterns = [
+    path("ws/jobs/", JobStreamConsumer.as_asgi()),
     path("ws/jobs/<uuid:job_id>/", JobStatusConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
+    "common.middleware.MetricsMiddleware",
     "common.middleware.InternalApiSecretMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -88,6 +90,27 @@ ASGI_APPLICATION = "config.asgi.application"
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+# Socket timeout (seconds, no retries) for Redis calls on the create path that can fall back.
+REDIS_FAST_TIMEOUT = float(os.getenv("REDIS_FAST_TIMEOUT", "0.1"))
+
+# Rate limiting (common.rate_limiter): at most `capacity` calls in any `per_seconds` window,
+# kept below Monday's actual limit as a safety margin. Up to `burst` of them may go at once;
+# the rest are spread over the window. RATE_LIMIT_OVERRIDES (JSON):
+# {"task_types": {"bulk_excel_insert": {"capacity": 30, "per_seconds": 60}}, "accounts": {"<id>": {...}}}
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_DEFAULT = {
+    "capacity": int(os.getenv("RATE_LIMIT_CAPACITY", "90")),
+    "per_seconds": float(os.getenv("RATE_LIMIT_PER_SECONDS", "60")),
+    "burst": RATE_LIMIT_BURST,
+}
+RATE_LIMIT_OVERRIDES = json.loads(os.getenv("RATE_LIMIT_OVERRIDES", "{}"))
+# Tokens a worker claims per Redis call and may spend locally within RATE_LIMIT_LEASE_TTL seconds
+RATE_LIMIT_LEASE_SIZE = int(os.getenv("RATE_LIMIT_LEASE_SIZE", "1"))
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "1.0"))
+# Refused jobs wait in a per-bucket queue (common.parking) released by release_parked_jobs
+RATE_LIMIT_PARKING_ENABLED = env_bool("RATE_LIMIT_PARKING_ENABLED", True)
+PARKED_RELEASE_INTERVAL = float(os.getenv("PARKED_RELEASE_INTERVAL", "1.0"))
+PARKED_RELEASE_BATCH = int(os.getenv("PARKED_RELEASE_BATCH", "500"))
 
 CHANNEL_LAYERS = {
     "default": {
@@ -98,6 +121,17 @@ CHANNEL_LAYERS = {
     },
 }
 
+# WebSocket job updates (common.channel_utils): updates per job within the window are merged,
+# and jobs with no connected consumer are skipped
+PUBLISH_JOB_UPDATES = env_bool("PUBLISH_JOB_UPDATES", True)
+PUBLISH_COALESCE_WINDOW = float(os.getenv("PUBLISH_COALESCE_WINDOW", "0.05"))
+PUBLISH_PRESENCE_CHECK = env_bool("PUBLISH_PRESENCE_CHECK", True)
+# Multiplexed socket /ws/jobs/ (common.consumers.JobStreamConsumer)
+WS_MAX_SUBSCRIPTIONS = int(os.getenv("WS_MAX_SUBSCRIPTIONS", "1000"))
+WS_BATCH_WINDOW = float(os.getenv("WS_BATCH_WINDOW", "0.1"))
+# Lifetime of account/board stream tokens from /api/jobs/stream-token (common.stream_tokens)
+WS_TOKEN_MAX_AGE = int(os.getenv("WS_TOKEN_MAX_AGE", "3600"))
+
 
 # Database
 SQLITE_PATH = os.getenv("SQLITE_PATH", str(BASE_DIR / "db.sqlite3"))
@@ -151,4 +185,139 @@ CELERY_RESULT_BACKEND = os.getenv(
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+# run_job queues (common.routing assigns one per app/task_type; the first is the fallback).
+# Declared as priority queues in config/celery.py; fetch one message at a time per worker
+# thread so priorities are honoured.
+JOB_QUEUES = env_list("JOB_QUEUES", "jobs.default,jobs.short,jobs.bulk")
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_WORKER_PREFETCH_MULTIPLIER", "1"))
+
+# Fair-share dispatch of first runs across accounts (common.fair_queue): keep at most
+# TARGET_DEPTH messages waiting per job queue; each account gets QUANTUM × its app's weight
+# (FAIR_APP_WEIGHTS, e.g. {"app_a": 2}) jobs per round.
+FAIR_DISPATCH_ENABLED = env_bool("FAIR_DISPATCH_ENABLED", True)
+FAIR_QUEUE_TARGET_DEPTH = int(os.getenv("FAIR_QUEUE_TARGET_DEPTH", "100"))
+FAIR_QUANTUM = int(os.getenv("FAIR_QUANTUM", "10"))
+FAIR_APP_WEIGHTS = json.loads(os.getenv("FAIR_APP_WEIGHTS", "{}"))
+FAIR_MAX_ROUNDS = 100
+FAIR_DISPATCH_INTERVAL = float(os.getenv("FAIR_DISPATCH_INTERVAL", "1"))
+FAIR_KICK_INTERVAL = float(os.getenv("FAIR_KICK_INTERVAL", "0.2"))
+# After a Redis error, creates publish directly for this long before trying the fair queue again.
+FAIR_HOLD_BACKOFF_SECONDS = float(os.getenv("FAIR_HOLD_BACKOFF_SECONDS", "5"))
+
+
+# Delayed runs (common.delayed): runs due DELAYED_MIN_SECONDS or more ahead wait in a Redis sorted
+# set instead of as broker eta/countdown messages held by workers; dispatch_delayed_jobs publishes
+# the due ones every DELAYED_DISPATCH_INTERVAL seconds.
+DELAYED_STORE_ENABLED = env_bool("DELAYED_STORE_ENABLED", True)
+DELAYED_MIN_SECONDS = float(os.getenv("DELAYED_MIN_SECONDS", "5"))
+DELAYED_DISPATCH_INTERVAL = float(os.getenv("DELAYED_DISPATCH_INTERVAL", "1"))
+DELAYED_DISPATCH_BATCH = int(os.getenv("DELAYED_DISPATCH_BATCH", "1000"))
+DELAYED_DISPATCH_MAX_BATCHES = 50
+
+
+# Metrics (common.metrics): GET /metrics on the web process, and a listener per worker process
+# on the first free port from METRICS_WORKER_PORT (0 = none). METRICS_ENABLED=0 records nothing.
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+METRICS_WORKER_PORT = int(os.getenv("METRICS_WORKER_PORT", "9540"))
+# Who may scrape: a client in METRICS_ALLOWED_IPS (addresses or CIDR networks), or one sending the
+# internal secret (X-Internal-Secret or Authorization: Bearer). Neither configured: anyone (dev).
+METRICS_ALLOWED_IPS = env_list("METRICS_ALLOWED_IPS", "")
+
+
+# Jobs API
+BULK_CREATE_MAX_ITEMS = int(os.getenv("BULK_CREATE_MAX_ITEMS", "5000"))
+BATCH_STATUS_MAX_IDS = int(os.getenv("BATCH_STATUS_MAX_IDS", "1000"))
+# Seconds an Idempotency-Key keeps answering with its original job (common.idempotency)
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+# Job data larger than this (serialized bytes) goes to the payload store (common.payload_store)
+PAYLOAD_INLINE_MAX_BYTES = int(os.getenv("PAYLOAD_INLINE_MAX_BYTES", "65536"))
+PAYLOAD_STORE_DIR = os.getenv("PAYLOAD_STORE_DIR", str(Path(SQLITE_PATH).parent / "payloads"))
+PAYLOAD_COMPRESSION_LEVEL = int(os.getenv("PAYLOAD_COMPRESSION_LEVEL", "6"))
+# Redis status snapshots (common.status_cache): TTL after a transition, TTL when filled from the DB
+STATUS_CACHE_ENABLED = env_bool("STATUS_CACHE_ENABLED", True)
+STATUS_CACHE_TTL = int(os.getenv("STATUS_CACHE_TTL", "86400"))
+STATUS_CACHE_FILL_TTL = int(os.getenv("STATUS_CACHE_FILL_TTL", "30"))
+STATUS_CACHE_LOGS = 20
+
+
+# enqueue_due_cron_jobs: rows claimed per UPDATE, and the tick duration that logs a warning
+CRON_SCAN_CHUNK_SIZE = int(os.getenv("CRON_SCAN_CHUNK_SIZE", "1000"))
+CRON_TICK_WARN_SECONDS = float(os.getenv("CRON_TICK_WARN_SECONDS", "30"))
+# A claimed cron run (retrying, deferred) is not claimed again until it completes, or until
+# its row has not changed for this long (the run was lost). Longer than the 1h retry cap.
+CRON_CLAIM_TIMEOUT = int(os.getenv("CRON_CLAIM_TIMEOUT", "7200"))
+# Distinct cron expressions kept parsed per process (common.cron)
+CRON_CACHE_SIZE = int(os.getenv("CRON_CACHE_SIZE", "1024"))
+
+
+# Buffered JobLog writes (common.joblog_sink): flushed at MAX_SIZE events or MAX_DELAY seconds
+JOBLOG_BUFFER_ENABLED = env_bool("JOBLOG_BUFFER_ENABLED", True)
+JOBLOG_BUFFER_MAX_SIZE = int(os.getenv("JOBLOG_BUFFER_MAX_SIZE", "200"))
+JOBLOG_BUFFER_MAX_DELAY = float(os.getenv("JOBLOG_BUFFER_MAX_DELAY", "1.0"))
+# After a failed write: seconds before the next attempt, and events kept until it succeeds
+JOBLOG_BUFFER_RETRY_SECONDS = float(os.getenv("JOBLOG_BUFFER_RETRY_SECONDS", "5"))
+JOBLOG_BUFFER_MAX_PENDING = int(os.getenv("JOBLOG_BUFFER_MAX_PENDING", "10000"))
+
+# JobLog retention (common.retention): days to keep rows before rolling them up into
+# JobLogSummary; overrides per app or app:task_type, e.g. {"app_a": 30, "app_a:polling_task": 2}
+JOBLOG_RETENTION_DAYS = int(os.getenv("JOBLOG_RETENTION_DAYS", "30"))
+JOBLOG_RETENTION_OVERRIDES = json.loads(os.getenv("JOBLOG_RETENTION_OVERRIDES", "{}"))
+JOBLOG_RETENTION_INTERVAL = int(os.getenv("JOBLOG_RETENTION_INTERVAL", "3600"))
+JOBLOG_RETENTION_BATCH_SIZE = int(os.getenv("JOBLOG_RETENTION_BATCH_SIZE", "5000"))
+JOBLOG_RETENTION_MAX_BATCHES = int(os.getenv("JOBLOG_RETENTION_MAX_BATCHES", "20"))
+
+# Archival (common.archive): completed/failed/cancelled jobs untouched for this many days
+# move to jobs_archive with their logs (0 = never)
+JOB_ARCHIVE_AFTER_DAYS = int(os.getenv("JOB_ARCHIVE_AFTER_DAYS", "14"))
+JOB_ARCHIVE_INTERVAL = int(os.getenv("JOB_ARCHIVE_INTERVAL", "3600"))
+JOB_ARCHIVE_BATCH_SIZE = int(os.getenv("JOB_ARCHIVE_BATCH_SIZE", "1000"))
+JOB_ARCHIVE_MAX_BATCHES = int(os.getenv("JOB_ARCHIVE_MAX_BATCHES", "20"))
+
+
+# Stuck-job recovery (common.tasks.recover_stuck_jobs): jobs RUNNING for longer than
+# RUNNING_RECOVERY_SECONDS lost their run (worker crash, lost async callback) and are retried
+# or failed. Keep it above the longest callback (connect + read timeout + CALLBACK_PARSE_TIMEOUT).
+RUNNING_RECOVERY_SECONDS = int(os.getenv("RUNNING_RECOVERY_SECONDS", "300"))
+RUNNING_RECOVERY_INTERVAL = int(os.getenv("RUNNING_RECOVERY_INTERVAL", "60"))
+RUNNING_RECOVERY_BATCH = int(os.getenv("RUNNING_RECOVERY_BATCH", "500"))
+
+# Job callbacks (common.http_client): one keep-alive pool per callback host per worker process.
+# CALLBACK_HOST_TIMEOUTS overrides timeouts per host, keyed "https://api.example.com[:port]" for one scheme
+# or "api.example.com[:port]" for both (default ports when none), e.g. {"api.example.com": {"connect": 2, "read": 60}}
+CALLBACK_POOL_MAXSIZE = int(os.getenv("CALLBACK_POOL_MAXSIZE", "20"))
+CALLBACK_POOL_BLOCK = env_bool("CALLBACK_POOL_BLOCK", False)
+CALLBACK_KEEP_ALIVE = env_bool("CALLBACK_KEEP_ALIVE", True)
+CALLBACK_CONNECT_TIMEOUT = float(os.getenv("CALLBACK_CONNECT_TIMEOUT", "5"))
+CALLBACK_READ_TIMEOUT = float(os.getenv("CALLBACK_READ_TIMEOUT", "30"))
+CALLBACK_HOST_TIMEOUTS = json.loads(os.getenv("CALLBACK_HOST_TIMEOUTS", "{}"))
+# Callback responses: largest body read (bigger is a permanent failure for polling jobs),
+# seconds allowed to read it, and largest polling_state stored from it
+CALLBACK_MAX_RESPONSE_BYTES = int(os.getenv("CALLBACK_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+CALLBACK_PARSE_TIMEOUT = float(os.getenv("CALLBACK_PARSE_TIMEOUT", "10"))
+POLLING_STATE_MAX_BYTES = int(os.getenv("POLLING_STATE_MAX_BYTES", str(64 * 1024)))
+
+# Per-host circuit breaker and AIMD concurrency limit for callbacks (common.circuit_breaker).
+# Opens when FAILURE_RATIO of at least MIN_CALLS calls in a WINDOW-second window failed, stays
+# open OPEN_SECONDS, then lets HALF_OPEN_PROBES calls through. Refused jobs wait until the
+# circuit half-opens, or until a probe or in-flight slot is freed at the latest, without using
+# a retry attempt.
+CIRCUIT_BREAKER_ENABLED = env_bool("CIRCUIT_BREAKER_ENABLED", True)
+CIRCUIT_BREAKER_WINDOW = float(os.getenv("CIRCUIT_BREAKER_WINDOW", "30"))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", "20"))
+CIRCUIT_BREAKER_FAILURE_RATIO = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATIO", "0.5"))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "30"))
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "3"))
+# Callbacks in flight per host, across workers: +INCREASE per round of successes up to MAX,
+# ×DECREASE on a failure down to MIN
+CALLBACK_CONCURRENCY_MIN = float(os.getenv("CALLBACK_CONCURRENCY_MIN", "4"))
+CALLBACK_CONCURRENCY_MAX = float(os.getenv("CALLBACK_CONCURRENCY_MAX", "200"))
+CALLBACK_CONCURRENCY_INCREASE = float(os.getenv("CALLBACK_CONCURRENCY_INCREASE", "1"))
+CALLBACK_CONCURRENCY_DECREASE = float(os.getenv("CALLBACK_CONCURRENCY_DECREASE", "0.5"))
+
+# Task types whose callback phase runs on the per-worker asyncio engine (common.async_engine)
+ASYNC_CALLBACK_TASK_TYPES = env_list("ASYNC_CALLBACK_TASK_TYPES", "")
+ASYNC_CALLBACK_MAX_IN_FLIGHT = int(os.getenv("ASYNC_CALLBACK_MAX_IN_FLIGHT", "500"))
+# Seconds run_job waits for room on a full engine before requeueing the message unclaimed
+ASYNC_CALLBACK_SUBMIT_TIMEOUT = float(os.getenv("ASYNC_CALLBACK_SUBMIT_TIMEOUT", "10"))
+ASYNC_CALLBACK_DRAIN_TIMEOUT = float(os.getenv("ASYNC_CALLBACK_DRAIN_TIMEOUT", "30"))
\ No newline at end of file
@@ -1,9 +1,20 @@
 from django.contrib import admin
 from django.urls import path
-from common.views import JobCreateView, JobStatusView
+from common.views import (
+    JobBatchStatusView,
+    JobBulkCreateView,
+    JobCreateView,
+    JobStatusView,
+    StreamTokenView,
+    metrics_view,
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("api/jobs/create", JobCreateView.as_view(), name="job-create"),
+    path("api/jobs/bulk", JobBulkCreateView.as_view(), name="job-bulk-create"),
+    path("api/jobs/status", JobBatchStatusView.as_view(), name="job-batch-status"),
+    path("api/jobs/stream-token", StreamTokenView.as_view(), name="job-stream-token"),
     path("api/jobs/<str:job_id>/status", JobStatusView.as_view(), name="job-status"),
 ]
\ No newline at end of file
@@ -1,71 +1,243 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import json
+"""
+Mock callback server (stands in for the Node app) for local testing and load tests.
+
+Polling callbacks (bodies with "polling_state") upload the CSV at payload.data.file_path
+(default sample_test_data.csv) in batches of --batch-size rows. The cursor in polling_state
+is a byte offset, so each poll seeks straight to its batch instead of re-reading the file:
+{"offset": <bytes>, "last_row_index": <rows done>}. A state with only last_row_index (from
+an older mock) is scanned once and continues by offset. Rows are read line by line, so
+quoted fields must not contain newlines. Other callbacks are answered with 200 at once.
+
+Faults for load tests: --latency adds a delay drawn from a distribution to every response,
+and --error-rate answers that fraction of requests with a fault from --faults (5xx codes,
+429 with Retry-After, "timeout": hold the request for --timeout-seconds and close without
+answering, "reset": close at once). GET /stats returns the request counters as JSON.
+
+    python mockserver.py
+    python mockserver.py --host 0.0.0.0 --latency lognormal:3.5,0.6 --error-rate 0.05 \\
+        --faults 500:2,503:1,429:1,timeout:1
+"""
+import argparse
 import csv
-import itertools
-
-class MondayUploadMockHandler(BaseHTTPRequestHandler):
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        
-        try:
-            request_json = json.loads(post_data.decode('utf-8'))
-        except json.JSONDecodeError:
-            request_json = {}
-
-        # 1. Extract payload and state
-        payload = request_json.get('payload', {})
-        file_path = payload.get('data', {}).get('file_path', 'sample_test_data.csv')
-        board_id = payload.get('board_id', 'Unknown Board')
-        
-        polling_state = request_json.get('polling_state', {})
-        current_row = polling_state.get('last_row_index', 0)
-        
-        BATCH_SIZE = 500  # Process 500 rows at a time
-        
-        print(f"\n--- MONDAY.COM UPLOAD JOB ---")
-        print(f"Target Board: {board_id}")
-        
-        # 2. Read the specific chunk from the CSV
-        rows_processed = 0
-        try:
-            with open(file_path, 'r') as file:
-                reader = csv.reader(file)
-                # Skip the header and the rows we already processed
-                start_index = current_row + 1 if current_row == 0 else current_row
-                
-                # Grab exactly the next BATCH_SIZE rows
-                batch = list(itertools.islice(reader, start_index, start_index + BATCH_SIZE))
-                rows_processed = len(batch)
-                
-                if rows_processed > 0:
-                    print(f"Uploading Rows {start_index} to {start_index + rows_processed - 1}...")
-                    # In reality, this is where your Node app calls the Monday.com GraphQL API
-                    print(f"Sample data being uploaded: {batch[0]}") 
-                
-        except FileNotFoundError:
-            print(f"ERROR: Could not find file {file_path}")
-            rows_processed = 0
-
-        # 3. Calculate new state and completion
-        new_row_index = current_row + rows_processed
-        is_done = rows_processed == 0 or rows_processed < BATCH_SIZE
-
-        print(f"Status: {'FINISHED' if is_done else 'POLLING'}")
-        print("-----------------------------\n")
-
-        # 4. Respond to Django
-        response_dict = {
-            "status": "success",
-            "polling_state": {"last_row_index": new_row_index},
-            "done": is_done
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FILE = "sample_test_data.csv"
+
+
+def parse_latency(spec):
+    """
+    "50" or "fixed:50", "uniform:10,200", "normal:100,20", "exp:50" (mean), "lognormal:mu,sigma"
+    (of ln ms). Returns a function giving a delay in seconds; all values are milliseconds.
+    """
+    kind, _, params = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    args = [float(p) for p in params.split(",") if p]
+    draw = {
+        "fixed": lambda: args[0],
+        "uniform": lambda: random.uniform(args[0], args[1]),
+        "normal": lambda: random.gauss(args[0], args[1]),
+        "exp": lambda: random.expovariate(1 / args[0]),
+        "lognormal": lambda: random.lognormvariate(args[0], args[1]),
+    }.get(kind)
+    if draw is None:
+        raise argparse.ArgumentTypeError(f"unknown latency distribution {kind!r}")
+    return lambda: max(0.0, draw()) / 1000
+
+
+def parse_faults(spec):
+    """"500:2,429:1,timeout:1" -> ([fault, ...], [weight, ...]). A weight defaults to 1."""
+    faults, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition(":")
+        if name not in ("timeout", "reset") and not name.isdigit():
+            raise argparse.ArgumentTypeError(f"fault must be an HTTP status, timeout or reset: {name!r}")
+        faults.append(name)
+        weights.append(float(weight or 1))
+    return faults, weights
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.in_flight = 0
+        self.started = time.time()
+
+    def add(self, **counts):
+        with self.lock:
+            self.counts.update(counts)
+
+    def snapshot(self):
+        with self.lock:
+            counts = dict(self.counts)
+            in_flight = self.in_flight
+        elapsed = time.time() - self.started
+        return {
+            "uptime_seconds": round(elapsed, 1),
+            "requests_per_second": round(counts.get("requests", 0) / elapsed, 1) if elapsed else 0,
+            "in_flight": in_flight,
+            **dict(sorted(counts.items())),
         }
 
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response_dict).encode('utf-8'))
 
-print("Starting Mock Monday.com Uploader on port 3000...")
-httpd = HTTPServer(('127.0.0.1', 3000), MondayUploadMockHandler)
-httpd.serve_forever()
\ No newline at end of file
+def read_batch(file_path, state, batch_size):
+    """(rows, new polling_state) for the batch after the cursor in state."""
+    offset = state.get("offset")
+    done_rows = state.get("last_row_index", 0)
+    rows = []
+    with open(file_path, "rb") as f:
+        if offset is None:
+            f.readline()  # header
+            for _ in range(done_rows):  # legacy row cursor: one scan, then byte offsets
+                if not f.readline():
+                    break
+        else:
+            f.seek(offset)
+        for _ in range(batch_size):
+            line = f.readline()
+            if not line:
+                break
+            rows.append(line)
+        offset = f.tell()
+    rows = list(csv.reader(line.decode("utf-8") for line in rows))
+    return rows, {"offset": offset, "last_row_index": done_rows + len(rows)}
+
+
+def make_handler(args, stats):
+    faults, weights = args.faults
+    latency = args.latency
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/stats":
+                self._send(404, {"error": "not found"})
+                return
+            self._send(200, stats.snapshot())
+
+        def do_POST(self):
+            with stats.lock:
+                stats.in_flight += 1
+            try:
+                self._handle_post()
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+
+        def _handle_post(self):
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                body = self._read_chunked()  # large job data is streamed by the workers
+            else:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            stats.add(requests=1, **{f"path {self.path}": 1})
+            if latency:
+                time.sleep(latency())
+
+            if args.error_rate and random.random() < args.error_rate:
+                fault = random.choices(faults, weights)[0]
+                stats.add(**{f"fault {fault}": 1})
+                if fault == "timeout":
+                    time.sleep(args.timeout_seconds)
+                if fault in ("timeout", "reset"):
+                    self.close_connection = True
+                    return
+                headers = {"Retry-After": str(args.retry_after)} if fault == "429" else {}
+                self._send(int(fault), {"error": "injected fault"}, headers)
+                return
+
+            try:
+                request_json = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                request_json = {}
+            if "polling_state" not in request_json:
+                self._send(200, {"status": "success"})
+                return
+
+            payload = request_json.get("payload") or {}
+            file_path = (payload.get("data") or {}).get("file_path", DEFAULT_FILE)
+            try:
+                rows, state = read_batch(file_path, request_json.get("polling_state") or {}, args.batch_size)
+            except FileNotFoundError:
+                stats.add(missing_file=1)
+                if args.verbose:
+                    print(f"ERROR: Could not find file {file_path}")
+                rows, state = [], request_json.get("polling_state") or {}
+            done = len(rows) < args.batch_size
+            stats.add(rows_uploaded=len(rows), polls=1, polls_done=int(done))
+            if args.verbose:
+                print(
+                    f"board {payload.get('board_id', 'Unknown Board')}: {len(rows)} rows "
+                    f"up to row {state.get('last_row_index')} ({'FINISHED' if done else 'POLLING'})"
+                )
+            self._send(200, {"status": "success", "polling_state": state, "done": done})
+
+        def _read_chunked(self):
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+
+        def _send(self, status, obj, headers=None):
+            out = json.dumps(obj).encode()
+            stats.add(**{f"status {status}": 1})
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args_):
+            pass
+
+    return Handler
+
+
+def report(stats, interval):
+    while True:
+        time.sleep(interval)
+        print(json.dumps(stats.snapshot()), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept callbacks from Docker")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--batch-size", type=int, default=500, help="CSV rows per poll")
+    parser.add_argument("--latency", type=parse_latency, default=None,
+                        help="per-request delay in ms: 50, uniform:10,200, normal:100,20, exp:50, lognormal:mu,sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of POSTs answered with a fault")
+    parser.add_argument("--faults", type=parse_faults, default=parse_faults("500,503,429,timeout"),
+                        help="weighted faults, e.g. 500:2,503:1,429:1,timeout:1,reset:1")
+    parser.add_argument("--timeout-seconds", type=float, default=35.0,
+                        help="how long a timeout fault holds the request (above the worker's read timeout)")
+    parser.add_argument("--retry-after", type=int, default=5, help="Retry-After seconds sent with 429")
+    parser.add_argument("--stats-interval", type=float, default=0, help="print counters every N seconds")
+    parser.add_argument("--verbose", action="store_true", help="print a line per poll")
+    args = parser.parse_args()
+
+    stats = Stats()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, stats))
+    server.daemon_threads = True
+    if args.stats_interval:
+        threading.Thread(target=report, args=(stats, args.stats_interval), daemon=True).start()
+    print(f"Mock callback server on {args.host}:{args.port} (GET /stats for counters)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(stats.snapshot()))
+
+
+if __name__ == "__main__":
+    main()